@@ -0,0 +1,173 @@
+"""API endpoints пакетного выполнения запросов"""
+from typing import List, Optional, AsyncIterator, Dict, Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+from app.models.chat import ChatCompletionRequest
+from app.services.batch import BatchRunner, BatchJob
+from app.storage.contexts import ContextStorage
+from app.storage.prompts import PromptStorage
+from app.api.dependencies import get_batch_runner, get_context_storage, get_prompt_storage
+from app.utils import fastjson
+
+router = APIRouter()
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class BatchPromptsRequest(BaseModel):
+    """Задание из промптов: каждый промпт отправляется как сообщение user после сообщений контекста"""
+    prompts: List[str]
+    context: Optional[str] = None  # Имя сохраненного контекста
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+
+
+def _parse_jsonl(data: bytes) -> List[ChatCompletionRequest]:
+    """Разобрать JSONL файл запросов (пустые строки пропускаются)"""
+    requests = []
+    for number, line in enumerate(data.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            requests.append(ChatCompletionRequest.model_validate(fastjson.loads(line)))
+        except (fastjson.JSONDecodeError, ValidationError) as e:
+            raise HTTPException(status_code=400, detail=f"Строка {number}: некорректный запрос: {e}")
+    return requests
+
+
+def _prompt_requests(
+    spec: BatchPromptsRequest,
+    prompt_storage: PromptStorage,
+    context_storage: ContextStorage
+) -> List[ChatCompletionRequest]:
+    """Запросы из промптов и контекста"""
+    messages: List[Dict[str, Any]] = []
+    if spec.context:
+        context = context_storage.get_context(spec.context)
+        if context is None:
+            raise HTTPException(status_code=404, detail=f"Контекст '{spec.context}' не найден")
+        messages = context.get("messages") or []
+    requests = []
+    for name in spec.prompts:
+        prompt = prompt_storage.get_prompt(name)
+        if prompt is None:
+            raise HTTPException(status_code=404, detail=f"Промпт '{name}' не найден")
+        requests.append(ChatCompletionRequest(
+            model=spec.model,
+            messages=[*messages, {"role": "user", "content": prompt}],
+            temperature=spec.temperature,
+            max_tokens=spec.max_tokens
+        ))
+    return requests
+
+
+async def _ndjson(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """События задания в формате NDJSON"""
+    async for event in events:
+        yield fastjson.dumps(event) + b"\n"
+
+
+def _run_response(runner: BatchRunner, job: BatchJob, stream: bool):
+    """Ответ на запуск задания: поток событий NDJSON или состояние задания"""
+    if not stream:
+        return job.summary()
+    return StreamingResponse(
+        _ndjson(runner.subscribe(job)),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _get_job(runner: BatchRunner, job_id: str) -> BatchJob:
+    """Задание по идентификатору (404, если не найдено)"""
+    job = runner.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задание '{job_id}' не найдено")
+    return job
+
+
+@router.post("")
+async def create_batch(
+    request: Request,
+    concurrency: Optional[int] = Query(default=None, ge=1, description="Количество одновременных запросов"),
+    requests_per_minute: Optional[float] = Query(default=None, gt=0, description="Ограничение частоты запросов"),
+    stream: bool = Query(default=True, description="Передавать результаты в формате NDJSON по мере выполнения"),
+    runner: BatchRunner = Depends(get_batch_runner),
+    prompt_storage: PromptStorage = Depends(get_prompt_storage),
+    context_storage: ContextStorage = Depends(get_context_storage)
+):
+    """
+    Создать и запустить задание пакетного выполнения
+
+    Тело запроса: JSONL файл запросов chat completion (multipart поле file или тело
+    запроса application/x-ndjson) либо JSON {"prompts": [...], "context": "..."} -
+    промпты из папки промптов, каждый после сообщений сохраненного контекста.
+    Результаты сохраняются в stats_dir/batches/<id>; события передаются построчно:
+    job (состояние), result (index, status, response, metadata или error), summary.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Не передан файл запросов (поле file)")
+        requests = _parse_jsonl(await upload.read())
+    elif content_type.startswith("application/json"):
+        try:
+            spec = BatchPromptsRequest.model_validate(fastjson.loads(await request.body()))
+        except (fastjson.JSONDecodeError, ValidationError) as e:
+            raise HTTPException(status_code=400, detail=f"Некорректное задание: {e}")
+        requests = _prompt_requests(spec, prompt_storage, context_storage)
+    else:
+        requests = _parse_jsonl(await request.body())
+
+    try:
+        job = runner.create_job(requests, concurrency, requests_per_minute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    runner.start(job)
+    return _run_response(runner, job, stream)
+
+
+@router.get("")
+async def list_batches(runner: BatchRunner = Depends(get_batch_runner)):
+    """Получить список заданий с их состоянием"""
+    return runner.list_jobs()
+
+
+@router.get("/{job_id}")
+async def get_batch(job_id: str, runner: BatchRunner = Depends(get_batch_runner)):
+    """Получить состояние задания"""
+    return _get_job(runner, job_id).summary()
+
+
+@router.get("/{job_id}/results")
+async def get_batch_results(job_id: str, runner: BatchRunner = Depends(get_batch_runner)):
+    """Получить последние результаты запросов задания (NDJSON в порядке запросов)"""
+    job = _get_job(runner, job_id)
+    return StreamingResponse(
+        iter([fastjson.dumps(result) + b"\n" for result in job.ordered_results()]),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@router.post("/{job_id}/resume")
+async def resume_batch(
+    job_id: str,
+    retry_failed: bool = Query(default=True, description="Повторить запросы, завершившиеся ошибкой"),
+    stream: bool = Query(default=True, description="Передавать результаты в формате NDJSON по мере выполнения"),
+    runner: BatchRunner = Depends(get_batch_runner)
+):
+    """
+    Продолжить задание: выполнить запросы без результата (и с ошибкой, если retry_failed)
+
+    Если задание уже выполняется, передаются его оставшиеся результаты.
+    """
+    job = _get_job(runner, job_id)
+    if not job.running and job.pending(retry_failed):
+        runner.start(job, retry_failed)
+    return _run_response(runner, job, stream)
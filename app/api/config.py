@@ -1,26 +1,13 @@
 """API endpoints для управления конфигурацией"""
 import yaml
-from fastapi import APIRouter, HTTPException
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 
 from app.config.manager import ConfigManager
+from app.api.dependencies import CONFIG_PATH, get_config_manager, reload_container
 
 router = APIRouter()
 
-# Глобальный экземпляр менеджера конфигурации
-_config_manager: ConfigManager = None
-
-
-def get_config_manager() -> ConfigManager:
-    """Получить экземпляр менеджера конфигурации"""
-    global _config_manager
-    if _config_manager is None:
-        config_path = Path("config/config.yaml")
-        _config_manager = ConfigManager(config_path)
-    return _config_manager
-
-
 class ConfigData(BaseModel):
     """Модель для данных конфигурации"""
     model_config_path: str
@@ -31,9 +18,8 @@ class ConfigData(BaseModel):
 
 
 @router.get("")
-async def get_config():
+async def get_config(config_manager: ConfigManager = Depends(get_config_manager)):
     """Получить текущую конфигурацию"""
-    config_manager = get_config_manager()
     app_config = config_manager.app_config
     
     return {
@@ -46,9 +32,9 @@ async def get_config():
 
 
 @router.post("")
-async def save_config(config_data: ConfigData):
+async def save_config(config_data: ConfigData, request: Request):
     """Сохранить конфигурацию"""
-    config_path = Path("config/config.yaml")
+    config_path = CONFIG_PATH
     
     # Формируем данные для сохранения
     data = {
@@ -65,8 +51,7 @@ async def save_config(config_data: ConfigData):
             yaml.dump(data, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
         
         # Перезагружаем конфигурацию
-        global _config_manager
-        _config_manager = ConfigManager(config_path)
+        await reload_container(request.app)
         
         return {"message": "Конфигурация сохранена"}
     except Exception as e:
@@ -76,7 +61,7 @@ async def save_config(config_data: ConfigData):
 @router.get("/raw")
 async def get_config_raw():
     """Получить сырое содержимое конфигурационного файла"""
-    config_path = Path("config/config.yaml")
+    config_path = CONFIG_PATH
     
     if not config_path.exists():
         raise HTTPException(status_code=404, detail="Конфигурационный файл не найден")
@@ -89,9 +74,9 @@ async def get_config_raw():
 
 
 @router.post("/raw")
-async def save_config_raw(content_data: dict):
+async def save_config_raw(content_data: dict, request: Request):
     """Сохранить сырое содержимое конфигурационного файла"""
-    config_path = Path("config/config.yaml")
+    config_path = CONFIG_PATH
     content = content_data.get("content", "")
     
     if not content:
@@ -105,8 +90,7 @@ async def save_config_raw(content_data: dict):
         config_path.write_text(content, encoding='utf-8')
         
         # Перезагружаем конфигурацию
-        global _config_manager
-        _config_manager = ConfigManager(config_path)
+        await reload_container(request.app)
         
         return {"message": "Конфигурация сохранена"}
     except yaml.YAMLError as e:
@@ -121,9 +105,9 @@ class SystemPromptPathUpdate(BaseModel):
 
 
 @router.post("/system-prompt-path")
-async def update_system_prompt_path(path_data: SystemPromptPathUpdate):
+async def update_system_prompt_path(path_data: SystemPromptPathUpdate, request: Request):
     """Обновить путь к системному промпту в конфигурации"""
-    config_path = Path("config/config.yaml")
+    config_path = CONFIG_PATH
     
     if not config_path.exists():
         raise HTTPException(status_code=404, detail="Конфигурационный файл не найден")
@@ -152,8 +136,7 @@ async def update_system_prompt_path(path_data: SystemPromptPathUpdate):
         config_path.write_text(updated_content, encoding='utf-8')
         
         # Перезагружаем конфигурацию
-        global _config_manager
-        _config_manager = ConfigManager(config_path)
+        await reload_container(request.app)
         
         return {"message": "Путь к системному промпту обновлен", "path": new_path}
     except Exception as e:
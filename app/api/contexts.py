@@ -1,28 +1,14 @@
 """API endpoints для управления контекстами"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Union, Dict, Any
 
 from app.storage.contexts import ContextStorage
 from app.models.message import Message
-from app.config.manager import ConfigManager
-from pathlib import Path
+from app.api.dependencies import get_context_storage
 
 router = APIRouter()
 
-# Инициализация хранилища контекстов (будет инициализирована при первом запросе)
-_context_storage: ContextStorage = None
-
-
-def get_context_storage() -> ContextStorage:
-    """Получить экземпляр хранилища контекстов"""
-    global _context_storage
-    if _context_storage is None:
-        config_manager = ConfigManager(Path("config/config.yaml"))
-        _context_storage = ContextStorage(config_manager.app_config.contexts_dir)
-    return _context_storage
-
-
 class ContextData(BaseModel):
     """Модель для данных контекста"""
     name: Optional[str] = None
@@ -34,17 +20,21 @@ class RenameRequest(BaseModel):
     new_name: str
 
 
-@router.get("", response_model=List[str])
-async def list_contexts():
-    """Получить список доступных контекстов"""
-    storage = get_context_storage()
+@router.get("", response_model=Union[List[str], List[Dict[str, Any]]])
+async def list_contexts(details: bool = False, storage: ContextStorage = Depends(get_context_storage)):
+    """
+    Получить список доступных контекстов
+    
+    При details=true возвращается индекс: имя, количество сообщений, размер и время изменения.
+    """
+    if details:
+        return storage.list_context_info()
     return storage.list_contexts()
 
 
 @router.get("/{name}")
-async def get_context(name: str):
+async def get_context(name: str, storage: ContextStorage = Depends(get_context_storage)):
     """Загрузить контекст по имени"""
-    storage = get_context_storage()
     context = storage.get_context(name)
     if context is None:
         raise HTTPException(status_code=404, detail=f"Контекст '{name}' не найден")
@@ -52,10 +42,8 @@ async def get_context(name: str):
 
 
 @router.post("/{name}")
-async def save_context(name: str, context_data: ContextData):
+async def save_context(name: str, context_data: ContextData, storage: ContextStorage = Depends(get_context_storage)):
     """Сохранить контекст"""
-    storage = get_context_storage()
-    
     # Преобразуем словари в объекты Message
     messages = [Message(**msg) for msg in context_data.messages]
     
@@ -67,9 +55,8 @@ async def save_context(name: str, context_data: ContextData):
 
 
 @router.delete("/{name}")
-async def delete_context(name: str):
+async def delete_context(name: str, storage: ContextStorage = Depends(get_context_storage)):
     """Удалить контекст"""
-    storage = get_context_storage()
     deleted = storage.delete_context(name)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Контекст '{name}' не найден")
@@ -77,9 +64,8 @@ async def delete_context(name: str):
 
 
 @router.post("/{name}/rename")
-async def rename_context(name: str, rename_request: RenameRequest):
+async def rename_context(name: str, rename_request: RenameRequest, storage: ContextStorage = Depends(get_context_storage)):
     """Переименовать контекст"""
-    storage = get_context_storage()
     renamed = storage.rename_context(name, rename_request.new_name)
     if not renamed:
         raise HTTPException(status_code=404, detail=f"Контекст '{name}' не найден")
@@ -1,5 +1,5 @@
 """API endpoints для текущего состояния"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 
@@ -10,29 +10,18 @@ from app.storage.stats import StatsStorage
 from app.models.message import Message
 from app.models.metadata import ResponseMetadata
 from app.config.manager import ConfigManager
-from pathlib import Path
+from app.storage.sessions import SessionStore, DEFAULT_SESSION
+from app.api.dependencies import (
+    get_config_manager,
+    get_context_storage,
+    get_current_storage,
+    get_session_id,
+    get_session_store,
+    get_stats_storage,
+)
 
 router = APIRouter()
 
-# Инициализация хранилищ (будут инициализированы при первом запросе)
-_prompt_storage: PromptStorage = None
-_context_storage: ContextStorage = None
-_current_storage: CurrentDataStorage = None
-_stats_storage: StatsStorage = None
-
-
-def get_storages():
-    """Получить экземпляры всех хранилищ"""
-    global _prompt_storage, _context_storage, _current_storage, _stats_storage
-    if _prompt_storage is None:
-        config_manager = ConfigManager(Path("config/config.yaml"))
-        _prompt_storage = PromptStorage(config_manager.app_config.prompts_dir)
-        _context_storage = ContextStorage(config_manager.app_config.contexts_dir)
-        _current_storage = CurrentDataStorage(config_manager.app_config.contexts_dir)
-        _stats_storage = StatsStorage(config_manager.app_config.stats_dir)
-    return _prompt_storage, _context_storage, _current_storage, _stats_storage
-
-
 class CurrentPrompt(BaseModel):
     """Модель для текущего промпта"""
     content: str
@@ -68,7 +57,6 @@ class CurrentToolCall(BaseModel):
 @router.get("/prompt")
 async def get_current_prompt():
     """Получить текущий промпт"""
-    prompt_storage, _, _, _ = get_storages()
     # В реальной реализации нужно хранить текущий промпт в памяти или файле
     # Пока возвращаем пустую строку
     return {"content": ""}
@@ -83,9 +71,8 @@ async def set_current_prompt(prompt: CurrentPrompt):
 
 # Endpoints для системного промпта
 @router.get("/system-prompt")
-async def get_current_system_prompt():
+async def get_current_system_prompt(config_manager: ConfigManager = Depends(get_config_manager)):
     """Получить текущий системный промпт"""
-    config_manager = ConfigManager(Path("config/config.yaml"))
     # Используем путь из основного конфига, если указан, иначе из конфига модели
     system_prompt_path = config_manager.app_config.system_prompt_path
     if not system_prompt_path.exists():
@@ -120,9 +107,8 @@ async def set_current_tools(tools: CurrentTools):
 
 # Endpoints для контекста
 @router.get("/context")
-async def get_current_context():
+async def get_current_context(current_storage: CurrentDataStorage = Depends(get_current_storage)):
     """Получить текущий контекст"""
-    _, _, current_storage, _ = get_storages()
     current_context = current_storage.get_current_context()
     if current_context:
         return current_context
@@ -130,9 +116,12 @@ async def get_current_context():
 
 
 @router.post("/context")
-async def set_current_context(context: CurrentContext):
+async def set_current_context(
+    context: CurrentContext,
+    context_storage: ContextStorage = Depends(get_context_storage),
+    current_storage: CurrentDataStorage = Depends(get_current_storage)
+):
     """Установить текущий контекст"""
-    _, context_storage, current_storage, _ = get_storages()
     messages = [Message(**msg) for msg in context.messages]
     
     # Сохраняем в текущий контекст
@@ -146,12 +135,11 @@ async def set_current_context(context: CurrentContext):
 
 
 @router.delete("/context")
-async def clear_current_context():
+async def clear_current_context(current_storage: CurrentDataStorage = Depends(get_current_storage)):
     """Очистить текущий контекст"""
     import logging
     logger = logging.getLogger(__name__)
     
-    _, _, current_storage, _ = get_storages()
     result = current_storage.clear_current_context()
     if result:
         logger.info("Текущий контекст успешно очищен (файл удален)")
@@ -162,41 +150,45 @@ async def clear_current_context():
 
 # Endpoints для ответов
 @router.get("/content")
-async def get_current_content():
+async def get_current_content(current_storage: CurrentDataStorage = Depends(get_current_storage)):
     """Получить текущий content ответа"""
-    _, _, current_storage, _ = get_storages()
     content = current_storage.get_current_content()
     return {"content": content or ""}
 
 
 @router.post("/content")
-async def set_current_content(content: CurrentContent):
+async def set_current_content(content: CurrentContent, current_storage: CurrentDataStorage = Depends(get_current_storage)):
     """Установить текущий content ответа"""
-    _, _, current_storage, _ = get_storages()
     current_storage.save_current_content(content.content)
     return {"message": "Content сохранен"}
 
 
 @router.get("/tool-call")
-async def get_current_tool_call():
+async def get_current_tool_call(current_storage: CurrentDataStorage = Depends(get_current_storage)):
     """Получить текущий tool_call ответа"""
-    _, _, current_storage, _ = get_storages()
     tool_calls = current_storage.get_current_tool_call()
     return {"tool_calls": tool_calls or []}
 
 
 @router.post("/tool-call")
-async def set_current_tool_call(tool_call: CurrentToolCall):
+async def set_current_tool_call(tool_call: CurrentToolCall, current_storage: CurrentDataStorage = Depends(get_current_storage)):
     """Установить текущий tool_call ответа"""
-    _, _, current_storage, _ = get_storages()
     current_storage.save_current_tool_call(tool_call.tool_calls)
     return {"message": "Tool call сохранен"}
 
 
+@router.get("/session")
+async def get_current_session(
+    session_id: Optional[str] = Depends(get_session_id),
+    sessions: SessionStore = Depends(get_session_store)
+):
+    """Получить идентификатор текущей сессии и статистику сессий"""
+    return {"session_id": session_id or DEFAULT_SESSION, "sessions": sessions.stats()}
+
+
 @router.get("/stats")
-async def get_current_stats():
+async def get_current_stats(stats_storage: StatsStorage = Depends(get_stats_storage)):
     """Получить текущую статистику"""
-    _, _, _, stats_storage = get_storages()
     stats = stats_storage.get_current_stats()
     return stats or {}
 
@@ -0,0 +1,151 @@
+"""Зависимости FastAPI для доступа к сервисам приложения"""
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional
+from fastapi import Depends, FastAPI, HTTPException, Request
+
+from app.config.manager import ConfigManager
+from app.services.batch import BatchRunner
+from app.services.completion import CompletionService
+from app.services.container import ServiceContainer
+from app.services.llm_client import LLMClient
+from app.services.router import ProviderRouter
+from app.storage.prompts import PromptStorage
+from app.storage.contexts import ContextStorage
+from app.storage.current import CurrentDataStorage
+from app.storage.stats import StatsStorage
+from app.storage.sessions import SessionStore, SESSION_HEADER, SESSION_COOKIE
+from app.storage.timeseries import StatsHistory
+
+logger = logging.getLogger(__name__)
+
+# Путь к основному конфигурационному файлу
+CONFIG_PATH = Path("config/config.yaml")
+
+# Задачи остановки замененных контейнеров (храним ссылки, чтобы задачи не были собраны GC)
+_retiring_tasks: set = set()
+
+
+def get_container(request: Request) -> ServiceContainer:
+    """
+    Получить контейнер сервисов приложения
+
+    FastAPI кэширует результат в рамках одного запроса, поэтому все зависимости
+    обработчика получают сервисы из одного и того же контейнера.
+    """
+    return request.app.state.container
+
+
+def get_config_manager(container: ServiceContainer = Depends(get_container)) -> ConfigManager:
+    """Получить менеджер конфигурации"""
+    return container.config_manager
+
+
+def get_llm_client(container: ServiceContainer = Depends(get_container)) -> LLMClient:
+    """Получить клиент LLM провайдера"""
+    return container.llm_client
+
+
+def get_router(container: ServiceContainer = Depends(get_container)) -> ProviderRouter:
+    """Получить маршрутизатор запросов между провайдерами"""
+    return container.router
+
+
+def get_completion_service(container: ServiceContainer = Depends(get_container)) -> CompletionService:
+    """Получить сервис выполнения запросов chat completion"""
+    return container.completion_service
+
+
+def get_prompt_storage(container: ServiceContainer = Depends(get_container)) -> PromptStorage:
+    """Получить хранилище промптов"""
+    return container.prompt_storage
+
+
+def get_context_storage(container: ServiceContainer = Depends(get_container)) -> ContextStorage:
+    """Получить хранилище контекстов"""
+    return container.context_storage
+
+
+def get_session_id(request: Request) -> Optional[str]:
+    """
+    Получить идентификатор сессии из заголовка X-Session-Id или cookie приложения
+
+    Недопустимый заголовок - ошибка 400 (клиент явно указал сессию); недопустимое
+    значение cookie игнорируется (используется сессия по умолчанию).
+
+    Returns:
+        Идентификатор сессии или None (сессия по умолчанию)
+    """
+    session_id = request.headers.get(SESSION_HEADER)
+    if session_id:
+        try:
+            return SessionStore.validate_session_id(session_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        return None
+    try:
+        return SessionStore.validate_session_id(session_id)
+    except ValueError:
+        return None
+
+
+def get_session_store(container: ServiceContainer = Depends(get_container)) -> SessionStore:
+    """Получить хранилище сессий"""
+    return container.sessions
+
+
+def get_current_storage(
+    session_id: Optional[str] = Depends(get_session_id),
+    container: ServiceContainer = Depends(get_container)
+) -> CurrentDataStorage:
+    """Получить хранилище текущих данных сессии"""
+    return container.sessions.get(session_id).current
+
+
+def get_stats_storage(
+    session_id: Optional[str] = Depends(get_session_id),
+    container: ServiceContainer = Depends(get_container)
+) -> StatsStorage:
+    """Получить хранилище текущей статистики сессии"""
+    return container.sessions.get(session_id).stats
+
+
+def get_stats_history(container: ServiceContainer = Depends(get_container)) -> Optional[StatsHistory]:
+    """Получить историю статистики ответов (None, если отключена)"""
+    return container.stats_history
+
+
+def get_batch_runner(container: ServiceContainer = Depends(get_container)) -> BatchRunner:
+    """Получить исполнитель заданий пакетной обработки"""
+    return container.batch_runner
+
+
+async def reload_container(app: FastAPI) -> ServiceContainer:
+    """
+    Пересоздать контейнер сервисов после изменения конфигурации
+
+    Новый контейнер подменяет старый одним присваиванием, поэтому все роутеры
+    сразу видят новые клиенты провайдеров. Пул соединений провайдера пересоздается
+    только при изменении его параметров подключения; замененные пулы закрываются
+    в фоне после завершения начатых на них запросов.
+
+    Args:
+        app: Приложение FastAPI
+
+    Returns:
+        Новый контейнер сервисов
+    """
+    old_container = getattr(app.state, "container", None)
+    new_container = ServiceContainer.create(CONFIG_PATH, previous=old_container)
+    await new_container.start()
+    app.state.container = new_container
+    logger.info("Контейнер сервисов пересоздан после изменения конфигурации")
+
+    if old_container is not None:
+        task = asyncio.create_task(old_container.aclose_when_idle(successor=new_container))
+        _retiring_tasks.add(task)
+        task.add_done_callback(_retiring_tasks.discard)
+    return new_container
@@ -0,0 +1,84 @@
+"""Endpoint метрик в формате Prometheus"""
+from typing import List
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+
+from app.observability.metrics import MetricFamily, CONTENT_TYPE, render
+from app.services.container import ServiceContainer
+from app.api.dependencies import get_container
+
+router = APIRouter()
+
+
+def collect_container(container: ServiceContainer) -> List[MetricFamily]:
+    """
+    Метрики состояния сервисов контейнера (вычисляются при каждом сборе)
+
+    Счетчики провайдеров, кэша и объединения запросов хранятся в самих сервисах,
+    поэтому на пути запроса они не требуют дополнительной работы.
+    """
+    in_flight = MetricFamily("upstream_in_flight", "gauge", "Выполняющиеся запросы к провайдеру (включая открытые потоки)")
+    pool = MetricFamily(
+        "upstream_pool_utilization", "gauge", "Загрузка пула соединений провайдера (in_flight / max_connections)"
+    )
+    healthy = MetricFamily("upstream_healthy", "gauge", "Провайдер доступен для маршрутизации (1) или исключен (0)")
+    ewma = MetricFamily("upstream_ewma_latency_seconds", "gauge", "EWMA задержки провайдера до первого токена")
+    requests = MetricFamily("upstream_requests", "counter", "Запросы к провайдеру, учтенные маршрутизатором")
+    failures = MetricFamily("upstream_failures", "counter", "Отказы провайдера")
+    admission_active = MetricFamily("upstream_admission_active", "gauge", "Занятые слоты ограничения одновременных запросов")
+    admission_queue = MetricFamily("upstream_admission_queue_depth", "gauge", "Запросы в очереди ограничения одновременных запросов")
+    admission_rejected = MetricFamily("upstream_admission_rejected", "counter", "Запросы, отклоненные очередью провайдера")
+    for upstream in container.router.upstreams:
+        labels = {"provider": upstream.name}
+        client = upstream.client
+        in_flight.add(labels, client.in_flight)
+        pool.add(labels, client.in_flight / client.http_pool.max_connections)
+        stats = upstream.stats()
+        healthy.add(labels, 1 if stats["healthy"] else 0)
+        if stats["ewma_latency"] is not None:
+            ewma.add(labels, stats["ewma_latency"])
+        requests.add(labels, stats["total_requests"])
+        failures.add(labels, stats["total_failures"])
+        admission = stats["admission"]
+        if admission is not None:
+            admission_active.add(labels, admission["active"])
+            admission_queue.add(labels, admission["queue_depth"])
+            admission_rejected.add(labels, admission["rejected_queue_full"] + admission["rejected_timeout"])
+    families = [
+        in_flight, pool, healthy, ewma, requests, failures, admission_active, admission_queue, admission_rejected
+    ]
+
+    hedging = container.router.hedging_stats()
+    hedges = MetricFamily("hedges", "counter", "Дублирующие (hedged) запросы по результату")
+    hedges.add({"result": "fired"}, hedging["hedges_fired"])
+    hedges.add({"result": "won"}, hedging["hedges_won"])
+    families.append(hedges)
+
+    cache_stats = container.completion_service.cache_stats()
+    if cache_stats.get("enabled"):
+        lookups = MetricFamily("cache_lookups", "counter", "Поиски в кэше ответов по результату")
+        lookups.add({"result": "hit"}, cache_stats["hits"])
+        lookups.add({"result": "miss"}, cache_stats["misses"])
+        disk_hits = MetricFamily("cache_disk_hits", "counter", "Попадания в дисковый уровень кэша ответов")
+        disk_hits.add({}, cache_stats["disk_hits"])
+        memory = MetricFamily("cache_memory_bytes", "gauge", "Объем записей кэша ответов в памяти")
+        memory.add({}, cache_stats["memory_bytes"])
+        families.extend([lookups, disk_hits, memory])
+
+    coalescing = container.completion_service.coalescing_stats()
+    coalesced = MetricFamily("coalesced", "counter", "Запросы, объединенные с одинаковым выполняющимся запросом")
+    coalesced.add({"kind": "request"}, coalescing["coalesced_requests"])
+    coalesced.add({"kind": "stream"}, coalescing["coalesced_streams"])
+    families.append(coalesced)
+
+    sessions = MetricFamily("sessions_active", "gauge", "Сессии с текущими данными в памяти")
+    sessions.add({}, container.sessions.stats()["active_sessions"])
+    families.append(sessions)
+    return families
+
+
+@router.get("/metrics")
+async def metrics(container: ServiceContainer = Depends(get_container)):
+    """Метрики приложения в текстовом формате Prometheus"""
+    return Response(content=render(collect_container(container)), media_type=CONTENT_TYPE)
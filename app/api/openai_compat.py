@@ -1,57 +1,51 @@
 """OpenAI-совместимые API endpoints"""
 import logging
+import math
 import httpx
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse, Response
+from starlette.background import BackgroundTask
+from typing import Optional, AsyncIterator, Union
 
 from app.models.chat import ChatCompletionRequest, ChatCompletionResponse
-from app.config.manager import ConfigManager
-from app.services.llm_client import LLMClient
+from app.models.metadata import ResponseMetadata
+from app.services.completion import CompletionService
+from app.services.passthrough import RawCompletion
+from app.services.router import NoUpstreamAvailableError
+from app.services.limiter import AdmissionRejectedError
+from app.services.streaming import ChatCompletionStream
 from app.storage.current import CurrentDataStorage
 from app.storage.stats import StatsStorage
-from pathlib import Path
+from app.storage.timeseries import StatsHistory
+from app.observability.metrics import record_response
+from app.observability.tracing import tracer, current_span
+from app.api.responses import FastJSONResponse
+from app.api.dependencies import get_completion_service, get_current_storage, get_stats_storage, get_stats_history
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Глобальные экземпляры (инициализируются при первом запросе)
-_config_manager: Optional[ConfigManager] = None
-_llm_client: Optional[LLMClient] = None
-_current_storage: Optional[CurrentDataStorage] = None
-_stats_storage: Optional[StatsStorage] = None
-
-
-def get_services():
-    """Получить экземпляры всех сервисов"""
-    global _config_manager, _llm_client, _current_storage, _stats_storage
-    
-    if _config_manager is None:
-        _config_manager = ConfigManager(Path("config/config.yaml"))
-        _llm_client = LLMClient(_config_manager.model_config, _config_manager.app_config)
-        _current_storage = CurrentDataStorage(_config_manager.app_config.contexts_dir)
-        _stats_storage = StatsStorage(_config_manager.app_config.stats_dir)
-    
-    return _config_manager, _llm_client, _current_storage, _stats_storage
-
-
-@router.post("/chat/completions")
-async def chat_completions(request: ChatCompletionRequest):
-    """
-    OpenAI-совместимый endpoint для chat completions
-    """
-    logger.info(f"Получен запрос chat completion: model={request.model}, messages_count={len(request.messages)}")
-    config_manager, llm_client, current_storage, stats_storage = get_services()
-    
-    try:
-        # Отправляем запрос к LLM провайдеру
-        logger.debug(f"Отправка запроса к LLM провайдеру")
-        response, metadata = await llm_client.chat_completion(request)
-        logger.info(f"Получен ответ от LLM: tokens={metadata.response_tokens}, time={metadata.total_time:.2f}s")
+def _save_results(
+    response: Union[ChatCompletionResponse, RawCompletion],
+    metadata: ResponseMetadata,
+    current_storage: CurrentDataStorage,
+    stats_storage: StatsStorage,
+    stats_history: Optional[StatsHistory],
+    stream: bool
+):
+    """Сохранить content, tool_calls и статистику ответа"""
+    if isinstance(response, RawCompletion):
+        # tool_calls сохраняются в исходном виде, без разбора моделью
+        if response.has_choices:
+            with tracer.start_span("storage.current.save"):
+                content = response.content
+                if content:
+                    current_storage.save_current_content(content)
+                current_storage.save_current_tool_call(response.tool_calls)
+    elif response.choices and response.choices[0].message:
+        message = response.choices[0].message
         
-        # Сохраняем результаты
-        if response.choices and response.choices[0].message:
-            message = response.choices[0].message
-            
+        with tracer.start_span("storage.current.save"):
             # Сохраняем content
             if message.content:
                 current_storage.save_current_content(message.content)
@@ -66,14 +60,114 @@ async def chat_completions(request: ChatCompletionRequest):
             else:
                 # Сохраняем пустой массив, если tool_calls отсутствуют
                 current_storage.save_current_tool_call([])
-        
-        # Сохраняем статистику
+    
+    # Сохраняем статистику
+    record_response(metadata, stream)
+    with tracer.start_span("storage.stats.save"):
         stats_storage.save_current_stats(metadata)
+    if stats_history is not None:
+        stats_history.record(metadata)
+
+
+def _timing_extra(metadata: ResponseMetadata) -> dict:
+    """Поля таймингов запроса для структурированного (JSON) лога"""
+    return {
+        "provider": metadata.provider,
+        "model": metadata.model,
+        "latency": metadata.latency,
+        "ttft": metadata.time_to_first_token,
+        "total_time": metadata.total_time,
+        "context_tokens": metadata.context_tokens,
+        "response_tokens": metadata.response_tokens,
+        "cache_hit": metadata.cache_hit,
+    }
+
+
+async def _relay_stream(
+    stream: ChatCompletionStream,
+    current_storage: CurrentDataStorage,
+    stats_storage: StatsStorage,
+    stats_history: Optional[StatsHistory]
+) -> AsyncIterator[bytes]:
+    """Передать SSE события провайдера клиенту и сохранить собранный ответ после завершения потока"""
+    try:
+        async for event in stream:
+            yield event
+    except httpx.HTTPError as e:
+        logger.error("Ошибка при получении streaming ответа от LLM провайдера: %s: %s", type(e).__name__, e)
+    finally:
+        await stream.aclose()
+    
+    if not stream.completed:
+        return
+    
+    metadata = stream.metadata
+    logger.info(
+        "Получен streaming ответ от LLM: tokens=%d, ttft=%.2fs, time=%.2fs",
+        metadata.response_tokens, metadata.time_to_first_token, metadata.total_time,
+        extra=_timing_extra(metadata)
+    )
+    _save_results(stream.response, metadata, current_storage, stats_storage, stats_history, stream=True)
+
+
+@router.post("/chat/completions")
+async def chat_completions(
+    request: ChatCompletionRequest,
+    completion_service: CompletionService = Depends(get_completion_service),
+    current_storage: CurrentDataStorage = Depends(get_current_storage),
+    stats_storage: StatsStorage = Depends(get_stats_storage),
+    stats_history: Optional[StatsHistory] = Depends(get_stats_history)
+):
+    """
+    OpenAI-совместимый endpoint для chat completions
+    """
+    logger.info("Получен запрос chat completion: model=%s, messages_count=%d", request.model, len(request.messages))
+    root = current_span()
+    if root.recording:
+        # Получение тела и валидация запроса выполняются FastAPI до вызова обработчика
+        tracer.start_span("request.parse", start_ns=root.start_ns, messages=len(request.messages)).end()
+        root.set_attribute("llm.stream", bool(request.stream))
+    
+    try:
+        if request.stream:
+            # Открываем поток до ответа клиенту, чтобы ошибки провайдера вернулись с корректным статусом
+            logger.debug("Отправка streaming запроса к LLM провайдеру")
+            with tracer.start_span("completion.open_stream"):
+                stream = await completion_service.chat_completion_stream(request)
+            return StreamingResponse(
+                _relay_stream(stream, current_storage, stats_storage, stats_history),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
         
-        return response
+        # Отправляем запрос к LLM провайдеру
+        logger.debug("Отправка запроса к LLM провайдеру")
+        with tracer.start_span("completion") as span:
+            response, metadata = await completion_service.chat_completion(request)
+            span.set_attribute("llm.provider", metadata.provider or "")
+            span.set_attribute("llm.cache_hit", bool(metadata.cache_hit))
+        logger.info(
+            "Получен ответ от LLM: tokens=%d, time=%.2fs", metadata.response_tokens, metadata.total_time,
+            extra=_timing_extra(metadata)
+        )
+        
+        if isinstance(response, RawCompletion):
+            # Тело ответа провайдера передается без изменений, сохранение выполняется после отправки ответа
+            return Response(
+                content=response.body,
+                media_type="application/json",
+                background=BackgroundTask(
+                    _save_results, response, metadata, current_storage, stats_storage, stats_history, stream=False
+                )
+            )
+        
+        _save_results(response, metadata, current_storage, stats_storage, stats_history, stream=False)
+        
+        # Модель сериализуется напрямую в JSON, без jsonable_encoder
+        return FastJSONResponse(response)
         
     except httpx.HTTPStatusError as e:
-        logger.error(f"Ошибка LLM провайдера: {e.response.status_code} - {e.response.text}")
+        logger.error("Ошибка LLM провайдера: %s - %s", e.response.status_code, e.response.text)
         raise HTTPException(
             status_code=e.response.status_code,
             detail=f"Ошибка LLM провайдера: {e.response.text}"
@@ -85,7 +179,7 @@ async def chat_completions(request: ChatCompletionRequest):
             f"Сообщение: {str(e) if str(e) else 'Таймаут запроса'}"
         )
         logger.error(error_msg)
-        logger.debug(f"Детали ошибки таймаута: {repr(e)}")
+        logger.debug("Детали ошибки таймаута: %r", e)
         raise HTTPException(
             status_code=504,
             detail=error_msg
@@ -97,9 +191,9 @@ async def chat_completions(request: ChatCompletionRequest):
             f"Сообщение: {str(e) if str(e) else 'Не удалось установить соединение'}"
         )
         logger.error(error_msg)
-        logger.debug(f"Детали ошибки подключения: {repr(e)}")
+        logger.debug("Детали ошибки подключения: %r", e)
         if hasattr(e, 'request') and e.request:
-            logger.debug(f"URL запроса: {e.request.url}")
+            logger.debug("URL запроса: %s", e.request.url)
         raise HTTPException(
             status_code=503,
             detail=error_msg
@@ -111,15 +205,28 @@ async def chat_completions(request: ChatCompletionRequest):
             f"Сообщение: {str(e) if str(e) else 'Ошибка при выполнении запроса'}"
         )
         logger.error(error_msg)
-        logger.debug(f"Детали ошибки запроса: {repr(e)}")
+        logger.debug("Детали ошибки запроса: %r", e)
         if hasattr(e, 'request') and e.request:
-            logger.debug(f"URL запроса: {e.request.url}")
+            logger.debug("URL запроса: %s", e.request.url)
         raise HTTPException(
             status_code=503,
             detail=error_msg
         )
+    except AdmissionRejectedError as e:
+        logger.warning("Запрос отклонен: %s", e)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except NoUpstreamAvailableError as e:
+        logger.error(str(e))
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.exception(f"Внутренняя ошибка при обработке запроса: {str(e)}")
+        logger.exception("Внутренняя ошибка при обработке запроса: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Внутренняя ошибка: {str(e)}"
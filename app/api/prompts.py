@@ -1,27 +1,13 @@
 """API endpoints для управления промптами"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import List
 
 from app.storage.prompts import PromptStorage
-from app.config.manager import ConfigManager
-from pathlib import Path
+from app.api.dependencies import CONFIG_PATH, get_prompt_storage, reload_container
 
 router = APIRouter()
 
-# Инициализация хранилища промптов (будет инициализирована при первом запросе)
-_prompt_storage: PromptStorage = None
-
-
-def get_prompt_storage() -> PromptStorage:
-    """Получить экземпляр хранилища промптов"""
-    global _prompt_storage
-    if _prompt_storage is None:
-        config_manager = ConfigManager(Path("config/config.yaml"))
-        _prompt_storage = PromptStorage(config_manager.app_config.prompts_dir)
-    return _prompt_storage
-
-
 class PromptContent(BaseModel):
     """Модель для содержимого промпта"""
     content: str
@@ -29,16 +15,14 @@ class PromptContent(BaseModel):
 
 
 @router.get("", response_model=List[str])
-async def list_prompts():
+async def list_prompts(storage: PromptStorage = Depends(get_prompt_storage)):
     """Получить список доступных промптов"""
-    storage = get_prompt_storage()
     return storage.list_prompts()
 
 
 @router.get("/{name}")
-async def get_prompt(name: str):
+async def get_prompt(name: str, storage: PromptStorage = Depends(get_prompt_storage)):
     """Загрузить промпт по имени"""
-    storage = get_prompt_storage()
     content = storage.get_prompt(name)
     if content is None:
         raise HTTPException(status_code=404, detail=f"Промпт '{name}' не найден")
@@ -46,19 +30,17 @@ async def get_prompt(name: str):
 
 
 @router.post("/{name}")
-async def save_prompt(name: str, prompt: PromptContent):
+async def save_prompt(name: str, prompt: PromptContent, request: Request, storage: PromptStorage = Depends(get_prompt_storage)):
     """Сохранить промпт"""
-    from app.config.manager import ConfigManager
     import yaml
     from pathlib import Path
     
-    storage = get_prompt_storage()
     file_path = storage.save_prompt(name, prompt.content, prompt.extension)
     
     # Если сохраняется системный промпт, обновляем путь в основном конфиге
     # Проверяем, является ли это системным промптом (можно определить по имени или содержимому)
     # Для простоты, если имя файла совпадает с текущим системным промптом, обновляем путь
-    config_path = Path("config/config.yaml")
+    config_path = CONFIG_PATH
     if config_path.exists():
         try:
             config_data = yaml.safe_load(config_path.read_text(encoding='utf-8'))
@@ -81,7 +63,10 @@ async def save_prompt(name: str, prompt: PromptContent):
                     replacement = f'system_prompt_path: {str(new_path)}'
                     config_content = config_path.read_text(encoding='utf-8')
                     updated_content = re.sub(pattern, replacement, config_content)
-                    config_path.write_text(updated_content, encoding='utf-8')
+                    if updated_content != config_content:
+                        config_path.write_text(updated_content, encoding='utf-8')
+                        # Перезагружаем конфигурацию
+                        await reload_container(request.app)
         except Exception as e:
             # Игнорируем ошибки обновления конфига - промпт уже сохранен
             print(f"Warning: Failed to update config: {e}")
@@ -90,9 +75,8 @@ async def save_prompt(name: str, prompt: PromptContent):
 
 
 @router.delete("/{name}")
-async def delete_prompt(name: str):
+async def delete_prompt(name: str, storage: PromptStorage = Depends(get_prompt_storage)):
     """Удалить промпт"""
-    storage = get_prompt_storage()
     deleted = storage.delete_prompt(name)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Промпт '{name}' не найден")
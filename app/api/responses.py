@@ -0,0 +1,22 @@
+"""Классы HTTP ответов API"""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.utils import fastjson
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON ответ с сериализацией через app.utils.fastjson
+
+    Модели Pydantic сериализуются напрямую в JSON (без промежуточного словаря),
+    поэтому обработчик может вернуть FastJSONResponse(model) вместо модели и
+    обойти jsonable_encoder FastAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json(by_alias=True).encode("utf-8")
+        return fastjson.dumps(content)
@@ -0,0 +1,54 @@
+"""API endpoints для статистики работы провайдеров"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.services.completion import CompletionService
+from app.services.router import ProviderRouter
+from app.storage.timeseries import StatsHistory, parse_window
+from app.api.dependencies import get_router, get_completion_service, get_stats_history
+
+router = APIRouter()
+
+
+@router.get("/upstreams")
+async def get_upstreams_stats(provider_router: ProviderRouter = Depends(get_router)):
+    """Получить состояние провайдеров пула (задержка, нагрузка, здоровье) и статистику дублирующих запросов"""
+    return {
+        "upstreams": provider_router.stats(),
+        "hedging": provider_router.hedging_stats()
+    }
+
+
+@router.get("/cache")
+async def get_cache_stats(completion_service: CompletionService = Depends(get_completion_service)):
+    """Получить статистику кэша ответов (попадания, промахи, заполнение)"""
+    return completion_service.cache_stats()
+
+
+@router.get("/prompt-cache")
+async def get_prompt_cache_stats(provider_router: ProviderRouter = Depends(get_router)):
+    """Получить долю токенов контекста, полученных из кэша префиксов провайдеров, по моделям"""
+    return provider_router.prompt_cache_stats()
+
+
+@router.get("/coalescing")
+async def get_coalescing_stats(completion_service: CompletionService = Depends(get_completion_service)):
+    """Получить статистику объединения одинаковых одновременных запросов"""
+    return completion_service.coalescing_stats()
+
+
+@router.get("/summary")
+async def get_stats_summary(
+    window: str = Query(default="1h", description="Окно: 30s, 15m, 1h, 7d или число секунд"),
+    model: Optional[str] = Query(default=None, description="Только указанная модель"),
+    provider: Optional[str] = Query(default=None, description="Только указанный провайдер"),
+    stats_history: Optional[StatsHistory] = Depends(get_stats_history)
+):
+    """Получить перцентили задержки, TTFT, скорости и размера контекста за окно по моделям и провайдерам"""
+    if stats_history is None:
+        raise HTTPException(status_code=404, detail="История статистики отключена (stats_history.enabled: false)")
+    try:
+        seconds = parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"window": window, **stats_history.summary(seconds, model, provider)}
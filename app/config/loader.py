@@ -1,15 +1,50 @@
 """Загрузка и валидация конфигурационных файлов"""
 import yaml
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Tuple, Any
 from pydantic import ValidationError
 
 from app.models.config import AppConfig, ModelConfig
 
+# Отпечаток файла: (время изменения в наносекундах, размер)
+FileFingerprint = Tuple[int, int]
+
 
 class ConfigLoader:
     """Класс для загрузки конфигурации"""
     
+    # Кэш распарсенных конфигураций: путь -> (отпечаток файла, конфигурация)
+    _cache: Dict[Path, Tuple[FileFingerprint, Any]] = {}
+    
+    @staticmethod
+    def fingerprint(file_path: Path) -> Optional[FileFingerprint]:
+        """
+        Получить отпечаток файла (mtime и размер)
+        
+        Returns:
+            Отпечаток файла или None если файл не найден
+        """
+        try:
+            stat = Path(file_path).stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    @staticmethod
+    def _get_cached(file_path: Path) -> Optional[Any]:
+        """Получить конфигурацию из кэша, если файл не изменился с момента загрузки"""
+        key = Path(file_path).resolve()
+        cached = ConfigLoader._cache.get(key)
+        if cached is not None and cached[0] == ConfigLoader.fingerprint(file_path):
+            return cached[1]
+        return None
+    
+    @staticmethod
+    def _put_cached(file_path: Path, fingerprint: Optional[FileFingerprint], config: Any):
+        """Сохранить конфигурацию в кэш"""
+        if fingerprint is not None:
+            ConfigLoader._cache[Path(file_path).resolve()] = (fingerprint, config)
+    
     @staticmethod
     def load_yaml(file_path: Path) -> dict:
         """Загрузить YAML файл"""
@@ -22,6 +57,12 @@ class ConfigLoader:
         if not config_path.exists():
             raise FileNotFoundError(f"Конфигурационный файл не найден: {config_path}")
         
+        cached = ConfigLoader._get_cached(config_path)
+        if cached is not None:
+            return cached
+        
+        # Отпечаток берется до чтения, чтобы изменение во время чтения не потерялось
+        fingerprint = ConfigLoader.fingerprint(config_path)
         data = ConfigLoader.load_yaml(config_path)
         
         # Преобразуем строки путей в Path объекты
@@ -42,9 +83,12 @@ class ConfigLoader:
                 data['logging']['file'] = Path(data['logging']['file'])
         
         try:
-            return AppConfig(**data)
+            app_config = AppConfig(**data)
         except ValidationError as e:
             raise ValueError(f"Ошибка валидации конфигурации: {e}")
+        
+        ConfigLoader._put_cached(config_path, fingerprint, app_config)
+        return app_config
     
     @staticmethod
     def load_model_config(config_path: Path) -> ModelConfig:
@@ -52,6 +96,11 @@ class ConfigLoader:
         if not config_path.exists():
             raise FileNotFoundError(f"Конфигурационный файл модели не найден: {config_path}")
         
+        cached = ConfigLoader._get_cached(config_path)
+        if cached is not None:
+            return cached
+        
+        fingerprint = ConfigLoader.fingerprint(config_path)
         data = ConfigLoader.load_yaml(config_path)
         
         # Преобразуем строки путей в Path объекты
@@ -59,7 +108,9 @@ class ConfigLoader:
             data['system_prompt_path'] = Path(data['system_prompt_path'])
         
         try:
-            return ModelConfig(**data)
+            model_config = ModelConfig(**data)
         except ValidationError as e:
             raise ValueError(f"Ошибка валидации конфигурации модели: {e}")
-
+        
+        ConfigLoader._put_cached(config_path, fingerprint, model_config)
+        return model_config
@@ -1,54 +1,183 @@
 """Настройка логирования приложения"""
+import atexit
+import copy
 import logging
+import logging.handlers
+import queue
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
 
 from app.models.config import LoggingConfig
+from app.observability.tracing import current_span
+from app.utils import fastjson
+
+# Атрибуты LogRecord, которые не относятся к дополнительным полям (extra)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+# Фоновый поток записи логов (режим queue)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматтер JSON Lines
+
+    Кроме времени, уровня, логгера и сообщения в запись попадают дополнительные
+    поля, переданные через extra (например, тайминги запроса: latency, ttft, total_time),
+    и trace_id текущего трейса, если запрос трассируется.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return fastjson.dumps_str(data, default=str)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке
+
+    Стандартный QueueHandler форматирует сообщение перед постановкой в очередь,
+    то есть в event loop. Здесь форматирование (в том числе подстановка аргументов
+    %-стиля) выполняется в потоке QueueListener; в вызывающем потоке только
+    преобразуется traceback исключения (объекты кадров не передаются между потоками).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TraceContextFilter(logging.Filter):
+    """Добавить в запись trace_id текущего трейса (значение contextvar доступно только в вызывающем потоке)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        if span.recording:
+            record.trace_id = span.trace_id
+        return True
+
+
+def _file_handler(logging_config: LoggingConfig) -> logging.Handler:
+    """Создать обработчик файла логов с ротацией по размеру или времени"""
+    log_file = Path(logging_config.file)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    if logging_config.rotation == "size":
+        handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=logging_config.max_bytes,
+            backupCount=logging_config.backup_count,
+            encoding='utf-8'
+        )
+    elif logging_config.rotation == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file,
+            when=logging_config.when,
+            backupCount=logging_config.backup_count,
+            encoding='utf-8'
+        )
+    else:
+        # Определяем режим открытия файла: 'a' для добавления, 'w' для перезаписи
+        mode = 'a' if logging_config.append else 'w'
+        return logging.FileHandler(log_file, mode=mode, encoding='utf-8')
+
+    # С ротацией файл всегда открывается на добавление; вместо перезаписи
+    # предыдущий лог переносится в архивную копию
+    if not logging_config.append and log_file.exists() and log_file.stat().st_size > 0:
+        handler.doRollover()
+    return handler
 
 
 def setup_logging(logging_config: Optional[LoggingConfig] = None):
     """
     Настроить логирование приложения
-    
+
+    В режиме queue (по умолчанию) корневой логгер только ставит записи в очередь,
+    а форматирование и запись в консоль и файл выполняет фоновый поток QueueListener.
+
     Args:
         logging_config: Конфигурация логирования (если None, используются значения по умолчанию)
     """
     if logging_config is None:
         logging_config = LoggingConfig()
-    
+    level = getattr(logging, logging_config.level.upper(), logging.INFO)
+
+    # Останавливаем поток записи предыдущей настройки (с записью накопленных сообщений)
+    shutdown_logging()
+
     # Получаем корневой логгер
     root_logger = logging.getLogger()
-    root_logger.setLevel(getattr(logging, logging_config.level.upper(), logging.INFO))
-    
+    root_logger.setLevel(level)
+
     # Удаляем существующие обработчики
     root_logger.handlers.clear()
-    
+
     # Создаем форматтер
-    formatter = logging.Formatter(logging_config.format)
-    
+    if logging_config.json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(logging_config.format)
+
+    handlers: List[logging.Handler] = []
+
     # Добавляем обработчик для консоли, если включен
     if logging_config.console:
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(getattr(logging, logging_config.level.upper(), logging.INFO))
-        console_handler.setFormatter(formatter)
-        root_logger.addHandler(console_handler)
-    
+        handlers.append(logging.StreamHandler(sys.stdout))
+
     # Добавляем обработчик для файла, если указан
     if logging_config.file:
-        # Создаем директорию для логов, если не существует
-        log_file = Path(logging_config.file)
-        log_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Определяем режим открытия файла: 'a' для добавления, 'w' для перезаписи
-        mode = 'a' if logging_config.append else 'w'
-        file_handler = logging.FileHandler(log_file, mode=mode, encoding='utf-8')
-        file_handler.setLevel(getattr(logging, logging_config.level.upper(), logging.INFO))
-        file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
-    
+        handlers.append(_file_handler(logging_config))
+
+    for handler in handlers:
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+
+    if logging_config.queue and handlers:
+        global _listener
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = _LazyQueueHandler(log_queue)
+        if logging_config.json_format:
+            queue_handler.addFilter(_TraceContextFilter())
+        root_logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            if logging_config.json_format:
+                handler.addFilter(_TraceContextFilter())
+            root_logger.addHandler(handler)
+
     # Настраиваем логирование для uvicorn и других библиотек
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
+
+def shutdown_logging():
+    """Записать накопленные сообщения и остановить фоновый поток записи логов"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
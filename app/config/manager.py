@@ -1,7 +1,8 @@
 """Менеджер конфигурации приложения"""
 from pathlib import Path
-from app.config.loader import ConfigLoader
-from app.models.config import AppConfig, ModelConfig
+from typing import Optional, Tuple, List
+from app.config.loader import ConfigLoader, FileFingerprint
+from app.models.config import AppConfig, ModelConfig, ProviderConfig
 
 
 class ConfigManager:
@@ -14,10 +15,13 @@ class ConfigManager:
         Args:
             config_path: Путь к основному конфигурационному файлу
         """
-        self._app_config: AppConfig = ConfigLoader.load_app_config(config_path)
+        self.config_path = Path(config_path)
+        self._app_config: AppConfig = ConfigLoader.load_app_config(self.config_path)
         self._model_config: ModelConfig = ConfigLoader.load_model_config(
             self._app_config.model_config_path
         )
+        self._providers = self._load_providers(self._app_config, self._model_config)
+        self._fingerprint = self._loaded_fingerprint()
     
     @property
     def app_config(self) -> AppConfig:
@@ -29,10 +33,68 @@ class ConfigManager:
         """Получить конфигурацию модели"""
         return self._model_config
     
-    def reload(self, config_path: Path):
-        """Перезагрузить конфигурацию"""
-        self._app_config = ConfigLoader.load_app_config(config_path)
-        self._model_config = ConfigLoader.load_model_config(
-            self._app_config.model_config_path
+    @property
+    def providers(self) -> List[Tuple[ProviderConfig, ModelConfig]]:
+        """
+        Получить пул провайдеров
+        
+        Returns:
+            Список пар (параметры провайдера в пуле, конфигурация модели); первым идет основной провайдер
+        """
+        return self._providers
+    
+    @staticmethod
+    def _load_providers(app_config: AppConfig, model_config: ModelConfig) -> List[Tuple[ProviderConfig, ModelConfig]]:
+        """Загрузить конфигурации моделей всех провайдеров пула"""
+        primary_path = Path(app_config.model_config_path)
+        entries = list(app_config.providers or [])
+        primary_entry = next(
+            (entry for entry in entries if Path(entry.model_config_path) == primary_path),
+            None
         )
-
+        if primary_entry is None:
+            primary_entry = ProviderConfig(model_config_path=primary_path)
+        
+        providers = [(primary_entry, model_config)]
+        for entry in entries:
+            if entry is primary_entry:
+                continue
+            providers.append((entry, ConfigLoader.load_model_config(Path(entry.model_config_path))))
+        
+        # Имя провайдера по умолчанию - имя файла конфигурации модели
+        names = set()
+        for entry, _ in providers:
+            if not entry.name:
+                entry.name = Path(entry.model_config_path).stem
+            if entry.name in names:
+                raise ValueError(f"Имя провайдера '{entry.name}' указано несколько раз")
+            names.add(entry.name)
+        return providers
+    
+    def _loaded_fingerprint(self) -> Tuple[Optional[FileFingerprint], ...]:
+        """Отпечатки конфигурационных файлов, из которых загружена текущая конфигурация"""
+        return (ConfigLoader.fingerprint(self.config_path),) + tuple(
+            ConfigLoader.fingerprint(Path(entry.model_config_path))
+            for entry, _ in self._providers
+        )
+    
+    def files_fingerprint(self) -> Tuple[Optional[FileFingerprint], ...]:
+        """Текущие отпечатки конфигурационных файлов на диске"""
+        return self._loaded_fingerprint()
+    
+    def has_changed(self) -> bool:
+        """Проверить, изменились ли конфигурационные файлы с момента загрузки (по mtime и размеру)"""
+        return self.files_fingerprint() != self._fingerprint
+    
+    def reload(self, config_path: Optional[Path] = None):
+        """Перезагрузить конфигурацию"""
+        if config_path is not None:
+            self.config_path = Path(config_path)
+        app_config = ConfigLoader.load_app_config(self.config_path)
+        model_config = ConfigLoader.load_model_config(app_config.model_config_path)
+        providers = self._load_providers(app_config, model_config)
+        # Заменяем конфигурацию только после успешной валидации всех файлов
+        self._app_config = app_config
+        self._model_config = model_config
+        self._providers = providers
+        self._fingerprint = self._loaded_fingerprint()
@@ -0,0 +1,73 @@
+"""Отслеживание изменений конфигурационных файлов"""
+import asyncio
+import logging
+from typing import Callable, Awaitable, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigWatcher:
+    """
+    Фоновая задача, отслеживающая изменения конфигурационных файлов
+
+    Используется опрос mtime и размера файлов (работает одинаково на Linux и Windows
+    и не требует дополнительных зависимостей). Проверка сводится к двум вызовам stat(),
+    поэтому ее стоимость пренебрежимо мала даже при частом опросе.
+    """
+
+    def __init__(
+        self,
+        is_changed: Callable[[], bool],
+        get_fingerprint: Callable[[], Any],
+        on_change: Callable[[], Awaitable[None]],
+        interval: float = 2.0
+    ):
+        """
+        Инициализация наблюдателя
+
+        Args:
+            is_changed: Функция проверки, отличаются ли файлы от загруженной конфигурации
+            get_fingerprint: Функция получения текущих отпечатков файлов
+            on_change: Корутина, вызываемая при изменении файлов
+            interval: Интервал опроса в секундах
+        """
+        self._is_changed = is_changed
+        self._get_fingerprint = get_fingerprint
+        self._on_change = on_change
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запустить наблюдение"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Отслеживание изменений конфигурации запущено: interval={self.interval}s")
+
+    async def stop(self):
+        """Остановить наблюдение"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Цикл опроса"""
+        # Отпечаток файлов, которые не удалось применить (чтобы не перечитывать их на каждой итерации)
+        failed_fingerprint = None
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._is_changed():
+                continue
+            fingerprint = self._get_fingerprint()
+            if fingerprint == failed_fingerprint:
+                continue
+            logger.info("Обнаружено изменение конфигурационных файлов")
+            try:
+                await self._on_change()
+                failed_fingerprint = None
+            except Exception as e:
+                failed_fingerprint = fingerprint
+                logger.error(f"Ошибка применения новой конфигурации, используется прежняя: {str(e)}")
@@ -1,16 +1,22 @@
 """Главный файл FastAPI приложения"""
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
-from app.api import prompts, contexts, current, openai_compat, config as config_api
+from app.api import prompts, contexts, current, openai_compat, stats, metrics, batch, config as config_api
+from app.api.dependencies import CONFIG_PATH, reload_container
+from app.api.responses import FastJSONResponse
 from app.config.manager import ConfigManager
-from app.config.logging_config import setup_logging
+from app.config.logging_config import setup_logging, shutdown_logging
+from app.config.watcher import ConfigWatcher
+from app.services.container import ServiceContainer
+from app.observability.middleware import MetricsMiddleware, TracingMiddleware
 
 # Загрузка конфигурации для настройки логирования
-config_path = Path("config/config.yaml")
+config_path = CONFIG_PATH
 config_manager = ConfigManager(config_path)
 
 # Настройка логирования
@@ -19,8 +25,45 @@ setup_logging(config_manager.app_config.logging)
 logger = logging.getLogger(__name__)
 logger.info("Инициализация приложения LLM Chat Debugger")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Жизненный цикл приложения: создание и остановка контейнера сервисов"""
+    container = ServiceContainer(config_manager)
+    await container.start()
+    app.state.container = container
+    logger.info("Контейнер сервисов создан")
+    
+    # Отслеживание изменений конфигурационных файлов
+    watch_interval = config_manager.app_config.config_watch_interval
+    if watch_interval is None:
+        watch_interval = 2.0
+    watcher = None
+    if watch_interval > 0:
+        watcher = ConfigWatcher(
+            is_changed=lambda: app.state.container.config_manager.has_changed(),
+            get_fingerprint=lambda: app.state.container.config_manager.files_fingerprint(),
+            on_change=lambda: reload_container(app),
+            interval=watch_interval
+        )
+        watcher.start()
+    
+    yield
+    
+    if watcher is not None:
+        await watcher.stop()
+    await app.state.container.aclose()
+    logger.info("Приложение остановлено")
+    shutdown_logging()
+
+
 # Инициализация приложения
-app = FastAPI(title="LLM Chat Debugger", version="1.0.0")
+app = FastAPI(
+    title="LLM Chat Debugger",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
 
 # Настройка CORS для работы с фронтендом
 app.add_middleware(
@@ -33,12 +76,19 @@ app.add_middleware(
 
 logger.info("Настройка CORS завершена")
 
+# Учет HTTP запросов в метриках (/metrics) и корневые спаны трассировки
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Подключение роутеров
 app.include_router(openai_compat.router, prefix="/v1", tags=["OpenAI Compatible"])
 app.include_router(prompts.router, prefix="/api/prompts", tags=["Prompts"])
 app.include_router(contexts.router, prefix="/api/contexts", tags=["Contexts"])
 app.include_router(current.router, prefix="/api/current", tags=["Current State"])
 app.include_router(config_api.router, prefix="/api/config", tags=["Config"])
+app.include_router(stats.router, prefix="/api/stats", tags=["Stats"])
+app.include_router(batch.router, prefix="/api/batch", tags=["Batch"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 logger.info("Роутеры подключены")
 
@@ -1,6 +1,6 @@
 """Модели данных для запросов и ответов чата"""
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.models.message import Message, ToolCall
 
@@ -23,6 +23,7 @@ class ChatCompletionRequest(BaseModel):
     tools: Optional[List[Dict[str, Any]]] = None
     tool_choice: Optional[str] = None
     stream: Optional[bool] = False
+    stream_options: Optional[Dict[str, Any]] = None
 
 
 class ChoiceDelta(BaseModel):
@@ -41,11 +42,28 @@ class Choice(BaseModel):
 
 
 class Usage(BaseModel):
-    """Использование токенов"""
+    """Использование токенов (дополнительные поля провайдера сохраняются)"""
+    model_config = ConfigDict(extra="allow")
+
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
 
+    @property
+    def cached_tokens(self) -> Optional[int]:
+        """
+        Токены контекста, полученные из кэша префиксов провайдера
+
+        OpenAI: prompt_tokens_details.cached_tokens, DeepSeek: prompt_cache_hit_tokens.
+        None, если провайдер не сообщает об использовании кэша.
+        """
+        extra = self.model_extra or {}
+        details = extra.get("prompt_tokens_details")
+        if isinstance(details, dict) and isinstance(details.get("cached_tokens"), int):
+            return details["cached_tokens"]
+        hit_tokens = extra.get("prompt_cache_hit_tokens")
+        return hit_tokens if isinstance(hit_tokens, int) else None
+
 
 class ChatCompletionResponse(BaseModel):
     """Ответ от API chat completions"""
@@ -1,7 +1,7 @@
 """Модели данных для конфигурации приложения"""
 from pydantic import BaseModel, Field
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, Literal
 
 
 class LoggingConfig(BaseModel):
@@ -14,6 +14,90 @@ class LoggingConfig(BaseModel):
     file: Optional[Path] = Field(default=None, description="Путь к файлу логов (опционально)")
     console: bool = Field(default=True, description="Вывод логов в консоль")
     append: bool = Field(default=False, description="Добавлять логи в конец файла (true) или перезаписывать файл при запуске (false, по умолчанию)")
+    queue: bool = Field(default=True, description="Форматировать и записывать логи в фоновом потоке (QueueHandler/QueueListener), не блокируя event loop")
+    json_format: bool = Field(default=False, description="Формат JSON Lines с дополнительными полями (тайминги запроса, trace_id) вместо format")
+    rotation: Literal["none", "size", "time"] = Field(default="none", description="Ротация файла логов: none, size - по размеру (max_bytes), time - по времени (when)")
+    max_bytes: int = Field(default=10 * 1024 * 1024, ge=1, description="Размер файла логов для ротации по размеру (байты)")
+    when: str = Field(default="midnight", description="Интервал ротации по времени (значение when для TimedRotatingFileHandler: S, M, H, D, midnight, W0-W6)")
+    backup_count: int = Field(default=5, ge=0, description="Количество архивных файлов логов при ротации")
+
+
+class HttpPoolConfig(BaseModel):
+    """Конфигурация пула HTTP-соединений к LLM провайдеру"""
+    max_connections: int = Field(default=100, description="Максимальное количество одновременных соединений с провайдером")
+    max_keepalive_connections: int = Field(default=20, description="Максимальное количество keep-alive соединений в пуле")
+    keepalive_expiry: float = Field(default=30.0, description="Время жизни неиспользуемого keep-alive соединения в секундах")
+    http2: bool = Field(default=False, description="Использовать HTTP/2 (требуется пакет h2: pip install httpx[http2])")
+
+
+class ProviderConfig(BaseModel):
+    """Провайдер в пуле провайдеров"""
+    model_config_path: Path = Field(..., description="Путь к конфигурационному файлу модели")
+    name: Optional[str] = Field(default=None, description="Имя провайдера (по умолчанию - имя файла конфигурации модели)")
+    weight: float = Field(default=1.0, gt=0, description="Вес провайдера при балансировке нагрузки")
+    aliases: List[str] = Field(default_factory=list, description="Дополнительные имена модели; провайдеры с общим именем модели или псевдонимом считаются эквивалентными")
+
+
+class RoutingConfig(BaseModel):
+    """Конфигурация маршрутизации запросов между провайдерами"""
+    strategy: Literal["latency", "least_inflight"] = Field(
+        default="latency",
+        description="Выбор среди эквивалентных провайдеров: latency - минимальная EWMA задержка, least_inflight - минимум выполняющихся запросов"
+    )
+    ewma_alpha: float = Field(default=0.3, gt=0, le=1, description="Коэффициент сглаживания EWMA задержки")
+    failure_threshold: int = Field(default=3, ge=1, description="Количество ошибок подряд, после которого провайдер временно исключается")
+    cooldown: float = Field(default=30.0, ge=0, description="Время исключения неисправного провайдера в секундах")
+
+
+class HedgingConfig(BaseModel):
+    """Конфигурация дублирующих (hedged) запросов для снижения хвостовых задержек"""
+    enabled: bool = Field(default=False, description="Включить дублирующие запросы")
+    percentile: float = Field(default=95.0, gt=0, lt=100, description="Перцентиль задержки провайдера, после которого отправляется дублирующий запрос")
+    min_samples: int = Field(default=20, ge=1, description="Минимальное количество измерений задержки для расчета порога")
+    min_delay: float = Field(default=0.5, ge=0, description="Минимальная задержка перед дублирующим запросом в секундах")
+    max_delay: Optional[float] = Field(default=None, ge=0, description="Максимальная задержка перед дублирующим запросом в секундах")
+    allow_same_provider: bool = Field(default=True, description="Отправлять дублирующий запрос тому же провайдеру, если нет эквивалентного")
+
+
+class CacheConfig(BaseModel):
+    """Кэш ответов для детерминированных запросов"""
+    enabled: bool = Field(default=False, description="Включить кэш ответов")
+    ttl: float = Field(default=3600.0, gt=0, description="Время жизни записи в секундах")
+    max_entries: int = Field(default=1000, ge=1, description="Максимальное количество записей в памяти")
+    max_memory_bytes: int = Field(default=64 * 1024 * 1024, ge=0, description="Максимальный объем записей в памяти в байтах")
+    disk: bool = Field(default=False, description="Хранить записи на диске (SQLite в stats_dir)")
+    disk_max_entries: int = Field(default=100000, ge=1, description="Максимальное количество записей на диске")
+    max_temperature: float = Field(default=0.0, ge=0, description="Кэшировать только запросы с температурой не выше указанной")
+
+
+class TracingConfig(BaseModel):
+    """Конфигурация трассировки запросов"""
+    enabled: bool = Field(default=False, description="Включить трассировку")
+    sample_rate: float = Field(default=1.0, ge=0, le=1, description="Доля трассируемых запросов без входящего traceparent")
+    exporter: Literal["json", "otlp"] = Field(default="json", description="Экспорт: json - файл JSON Lines, otlp - OTLP коллектор (HTTP/JSON)")
+    json_path: Optional[Path] = Field(default=None, description="Файл JSON экспорта (по умолчанию stats_dir/traces.jsonl)")
+    otlp_endpoint: str = Field(default="http://localhost:4318/v1/traces", description="URL приема спанов OTLP коллектора")
+    service_name: str = Field(default="llm-chat-debugger", description="Имя сервиса в OTLP экспорте")
+    flush_interval: float = Field(default=2.0, gt=0, description="Интервал экспорта накопленных спанов в секундах")
+
+
+class StatsHistoryConfig(BaseModel):
+    """Конфигурация истории статистики ответов"""
+    enabled: bool = Field(default=True, description="Записывать статистику каждого ответа в журнал (stats_dir/timeseries)")
+    retention_days: int = Field(default=7, ge=1, description="Срок хранения агрегатов в памяти (дни)")
+
+
+class CoalescingConfig(BaseModel):
+    """Объединение одинаковых одновременных запросов (single-flight)"""
+    enabled: bool = Field(default=True, description="Объединять одинаковые одновременные запросы в один запрос к провайдеру")
+    max_temperature: float = Field(default=0.0, ge=0, description="Объединять только запросы с температурой не выше указанной")
+
+
+class BatchConfig(BaseModel):
+    """Пакетное выполнение запросов (/api/batch)"""
+    max_concurrency: int = Field(default=4, ge=1, description="Количество одновременно выполняемых запросов задания (по умолчанию)")
+    requests_per_minute: Optional[float] = Field(default=None, gt=0, description="Ограничение частоты запросов задания (по умолчанию без ограничения; квоты rate_limit провайдера действуют всегда)")
+    max_items: int = Field(default=10000, ge=1, description="Максимальное количество запросов в задании")
 
 
 class AppConfig(BaseModel):
@@ -21,14 +105,74 @@ class AppConfig(BaseModel):
     model_config_path: Path = Field(..., description="Путь к конфигурационному файлу модели")
     contexts_dir: Path = Field(..., description="Путь к папке контекстов")
     stats_dir: Path = Field(..., description="Путь к папке статистики")
+    max_sessions: int = Field(default=256, ge=1, description="Максимальное количество сессий с текущими данными в памяти")
+    response_passthrough: bool = Field(default=False, description="Передавать клиенту исходное тело ответа провайдера без валидации и повторной сериализации (ответы без streaming)")
     prompts_dir: Path = Field(..., description="Путь к папке с промптами")
+    context_storage: Literal["json", "sqlite"] = Field(default="json", description="Хранилище контекстов: json - файл на контекст, sqlite - база данных в contexts_dir с дозаписью сообщений")
+    import_json_contexts: bool = Field(default=False, description="Однократно скопировать существующие файлы контекстов *.json в базу sqlite (исходные файлы не изменяются)")
     system_prompt_path: Path = Field(..., description="Путь к файлу системного промпта")
     temperature: Optional[float] = Field(default=None, description="Температура (приоритет над значением из конфигурации модели)")
     max_tokens: Optional[int] = Field(default=None, description="Максимальная длина ответа (приоритет над значением из конфигурации модели)")
     timeout: Optional[float] = Field(default=None, description="Таймаут запроса к LLM провайдеру в секундах")
     host: Optional[str] = Field(default=None, description="Хост для запуска сервера (по умолчанию 0.0.0.0)")
     port: Optional[int] = Field(default=None, description="Порт для запуска сервера (по умолчанию 8080)")
+    reload: Optional[bool] = Field(default=None, description="Перезапуск сервера при изменении кода (для разработки, по умолчанию false)")
+    config_watch_interval: Optional[float] = Field(default=None, description="Интервал проверки изменений конфигурационных файлов в секундах (по умолчанию 2, 0 - отключить)")
     logging: Optional[LoggingConfig] = Field(default=None, description="Конфигурация логирования")
+    http_pool: Optional[HttpPoolConfig] = Field(default=None, description="Конфигурация пула HTTP-соединений к LLM провайдеру")
+    providers: Optional[List[ProviderConfig]] = Field(default=None, description="Дополнительные провайдеры (model_config_path используется как основной)")
+    routing: Optional[RoutingConfig] = Field(default=None, description="Конфигурация маршрутизации запросов между провайдерами")
+    hedging: Optional[HedgingConfig] = Field(default=None, description="Конфигурация дублирующих запросов (по умолчанию отключены)")
+    cache: Optional[CacheConfig] = Field(default=None, description="Конфигурация кэша ответов (по умолчанию отключен)")
+    coalescing: Optional[CoalescingConfig] = Field(default=None, description="Объединение одинаковых одновременных запросов (по умолчанию включено)")
+    stats_history: Optional[StatsHistoryConfig] = Field(default=None, description="История статистики ответов (по умолчанию включена)")
+    tracing: Optional[TracingConfig] = Field(default=None, description="Трассировка запросов (по умолчанию выключена)")
+    batch: Optional[BatchConfig] = Field(default=None, description="Пакетное выполнение запросов (параметры по умолчанию)")
+
+
+class RetryConfig(BaseModel):
+    """Политика повторных запросов к LLM провайдеру"""
+    max_attempts: int = Field(default=3, ge=1, description="Максимальное количество попыток (включая первую)")
+    backoff_base: float = Field(default=0.5, ge=0, description="Задержка перед первым повтором в секундах")
+    backoff_multiplier: float = Field(default=2.0, ge=1, description="Множитель задержки для каждого следующего повтора")
+    backoff_max: float = Field(default=10.0, ge=0, description="Максимальная задержка между попытками в секундах")
+    jitter: Literal["full", "equal", "none"] = Field(default="full", description="Случайный разброс задержки: full - от 0 до задержки, equal - от половины до задержки, none - без разброса")
+    retry_statuses: List[int] = Field(default_factory=lambda: [429, 500, 502, 503, 504], description="HTTP статусы, при которых запрос повторяется")
+    respect_retry_after: bool = Field(default=True, description="Учитывать заголовок Retry-After провайдера")
+    retry_after_max: float = Field(default=60.0, ge=0, description="Максимальная задержка по Retry-After в секундах")
+    failover_after: Optional[int] = Field(default=None, ge=1, description="Количество неудачных попыток, после которого запрос передается другому провайдеру (по умолчанию - после исчерпания max_attempts)")
+    failover_providers: List[str] = Field(default_factory=list, description="Имена провайдеров для переключения помимо эквивалентных")
+
+
+class ConcurrencyConfig(BaseModel):
+    """Ограничение одновременных запросов к провайдеру с очередью ожидания"""
+    max_concurrency: int = Field(..., ge=1, description="Максимальное количество одновременных запросов к провайдеру")
+    max_queue: int = Field(default=100, ge=0, description="Максимальное количество запросов в очереди ожидания (при переполнении - 429)")
+    queue_timeout: float = Field(default=30.0, gt=0, description="Максимальное время ожидания в очереди в секундах (при превышении - 429)")
+
+
+class RateLimitConfig(BaseModel):
+    """Квоты провайдера на количество запросов и токенов в минуту"""
+    requests_per_minute: Optional[int] = Field(default=None, gt=0, description="Квота запросов в минуту (RPM)")
+    tokens_per_minute: Optional[int] = Field(default=None, gt=0, description="Квота токенов в минуту (TPM), включая контекст и ответ")
+    max_wait: float = Field(default=30.0, ge=0, description="Максимальное время ожидания квоты в секундах (при превышении - 429)")
+
+
+class ContextWindowConfig(BaseModel):
+    """Бюджет токенов контекста запроса к провайдеру"""
+    max_context_tokens: int = Field(..., gt=0, description="Бюджет токенов контекста (сообщения и описание инструментов) по локальной оценке")
+    policy: Literal["drop_oldest", "summarize"] = Field(default="drop_oldest", description="При превышении бюджета: drop_oldest - удалить старые сообщения, summarize - заменить их кратким содержанием")
+    min_recent_messages: int = Field(default=1, ge=1, description="Количество последних сообщений, которые никогда не удаляются")
+    summary_max_tokens: int = Field(default=512, gt=0, description="Максимальная длина краткого содержания (токены)")
+    summary_target_ratio: float = Field(default=0.75, gt=0, le=1, description="Доля бюджета, до которой сокращается контекст при суммаризации (запас, чтобы краткое содержание использовалось в следующих запросах)")
+    summary_prompt: str = Field(
+        default=(
+            "Кратко перескажи предыдущую часть диалога: факты, решения, результаты вызовов инструментов "
+            "и открытые вопросы, необходимые для продолжения. Отвечай только пересказом."
+        ),
+        description="Системный промпт запроса краткого содержания"
+    )
+    summary_cache_size: int = Field(default=128, ge=1, description="Количество кратких содержаний в кэше")
 
 
 class ModelConfig(BaseModel):
@@ -39,4 +183,9 @@ class ModelConfig(BaseModel):
     temperature: float = Field(..., description="Температура")
     max_tokens: int = Field(..., description="Максимальная длина ответа")
     system_prompt_path: Path = Field(..., description="Путь к файлу системного промпта по умолчанию")
+    retry: Optional[RetryConfig] = Field(default=None, description="Политика повторных запросов (по умолчанию без повторов)")
+    concurrency: Optional[ConcurrencyConfig] = Field(default=None, description="Ограничение одновременных запросов (по умолчанию без ограничения)")
+    rate_limit: Optional[RateLimitConfig] = Field(default=None, description="Квоты провайдера RPM/TPM (по умолчанию без ограничения)")
+    context_window: Optional[ContextWindowConfig] = Field(default=None, description="Бюджет токенов контекста (по умолчанию без ограничения)")
+    canonical_requests: bool = Field(default=True, description="Стабильная форма запроса для кэша префиксов провайдера (порядок инструментов и ключей их описания; сообщения и схемы параметров не изменяются)")
 
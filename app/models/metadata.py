@@ -15,5 +15,14 @@ class ResponseMetadata(BaseModel):
     avg_token_length: float  # Средняя длина токена в символах
     avg_word_tokens: float  # Средняя длина слова в токенах
     context_tokens: int  # Количество токенов в контексте
+    cached_tokens: Optional[int] = None  # Токены контекста из кэша префиксов провайдера (None - провайдер не сообщает)
     inference_speed: float  # Скорость инференса (tokens/sec)
+    inter_token_latency: Optional[float] = None  # Средняя задержка между чанками при streaming (секунды)
+    provider: Optional[str] = None  # Имя провайдера, выполнившего запрос
+    model: Optional[str] = None  # Название модели, выполнившей запрос
+    attempts: Optional[int] = None  # Количество попыток запроса к провайдеру (включая повторы)
+    hedged: Optional[bool] = None  # Ответ получен от дублирующего (hedged) запроса
+    cache_hit: Optional[bool] = None  # Ответ получен из кэша ответов
+    coalesced: Optional[bool] = None  # Ответ получен от одинакового одновременного запроса (single-flight)
+    context_trimmed: Optional[int] = None  # Сообщения контекста, удаленные или замененные кратким содержанием по бюджету токенов
 
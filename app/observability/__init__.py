@@ -0,0 +1,15 @@
+"""Модуль наблюдаемости: метрики и трассировка"""
+from app.observability.metrics import REGISTRY, MetricFamily, record_response, render
+from app.observability.tracing import tracer, current_span
+from app.observability.middleware import MetricsMiddleware, TracingMiddleware
+
+__all__ = [
+    "REGISTRY",
+    "MetricFamily",
+    "MetricsMiddleware",
+    "TracingMiddleware",
+    "tracer",
+    "current_span",
+    "record_response",
+    "render",
+]
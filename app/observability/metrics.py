@@ -0,0 +1,351 @@
+"""Метрики приложения в текстовом формате Prometheus (OpenMetrics-совместимом)"""
+import bisect
+import math
+import time
+from typing import Dict, List, Tuple, Iterable, Sequence
+
+# Content-Type текстового формата экспозиции Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Префикс имен метрик приложения
+PREFIX = "llm_debugger_"
+
+# Границы корзин гистограмм (секунды): от быстрых ответов кэша до долгих генераций
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Границы корзин длительности записи хранилищ (секунды)
+STORAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Границы корзин количества токенов
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    """Экранировать значение метки"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Значение в формате экспозиции"""
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Метки в формате экспозиции"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    """
+    Базовый класс метрики с метками
+
+    Значения обновляются без блокировок: метрики изменяются в потоке event loop
+    (и в отдельных случаях в фоновых потоках записи), а для статистики допустима
+    редкая потеря инкремента при одновременном обновлении из разных потоков.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Значение метрики для набора меток (создается при первом обращении)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        """Увеличить счетчик без меток"""
+        self._children[()].value += amount
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in list(self._children.items()):
+            yield self.name + "_total", dict(zip(self.labelnames, key)), child.value
+
+
+class _GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """Текущее значение"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def inc(self, amount: float = 1.0):
+        """Увеличить значение без меток"""
+        self._children[()].value += amount
+
+    def dec(self, amount: float = 1.0):
+        """Уменьшить значение без меток"""
+        self._children[()].value -= amount
+
+    def set(self, value: float):
+        """Установить значение без меток"""
+        self._children[()].value = value
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in list(self._children.items()):
+            yield self.name, dict(zip(self.labelnames, key)), child.value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с фиксированными границами"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Добавить значение без меток"""
+        self._children[()].observe(value)
+
+    def time(self, *values: str) -> "_Timer":
+        """Контекстный менеджер, измеряющий длительность блока"""
+        return _Timer(self.labels(*values) if values else self._children[()])
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), list(child.counts)):
+                cumulative += count
+                yield self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield self.name + "_sum", labels, child.sum
+            yield self.name + "_count", labels, cumulative
+
+
+class _Timer:
+    """Измерение длительности блока для гистограммы"""
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: _HistogramValue):
+        self._child = child
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class MetricFamily:
+    """Метрика, значения которой вычисляются при сборе (состояние сервисов)"""
+
+    def __init__(self, name: str, type_name: str, documentation: str):
+        self.name = PREFIX + name
+        self.type_name = type_name
+        self.documentation = documentation
+        self._samples: List[Sample] = []
+
+    def add(self, labels: Dict[str, str], value: float):
+        """Добавить значение с метками"""
+        suffix = "_total" if self.type_name == "counter" else ""
+        self._samples.append((self.name + suffix, labels, value))
+
+    def samples(self) -> Iterable[Sample]:
+        return self._samples
+
+
+class Registry:
+    """Реестр метрик"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Зарегистрировать метрику (повторная регистрация имени возвращает существующую)"""
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self, extra: Iterable[MetricFamily] = ()) -> str:
+        """
+        Все метрики в текстовом формате экспозиции
+
+        Args:
+            extra: Метрики состояния, вычисленные при сборе
+        """
+        lines: List[str] = []
+        for family in [*self._metrics.values(), *extra]:
+            # В формате 0.0.4 имя семейства счетчика совпадает с именем значения (_total)
+            name = family.name + "_total" if family.type_name == "counter" else family.name
+            lines.append(f"# HELP {name} {family.documentation}")
+            lines.append(f"# TYPE {name} {family.type_name}")
+            for name, labels, value in family.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Создать и зарегистрировать счетчик"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    """Создать и зарегистрировать метрику текущего значения"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS
+) -> Histogram:
+    """Создать и зарегистрировать гистограмму"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Метрики HTTP запросов к приложению
+HTTP_REQUESTS = counter("http_requests", "HTTP запросы к приложению", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "Длительность обработки HTTP запроса (включая передачу потока)", ("method", "route")
+)
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "Выполняющиеся HTTP запросы")
+
+# Метрики ответов LLM провайдеров
+UPSTREAM_LATENCY = histogram(
+    "upstream_latency_seconds", "Задержка ответа провайдера до начала ответа", ("provider", "model", "stream")
+)
+UPSTREAM_TTFT = histogram(
+    "upstream_time_to_first_token_seconds", "Время до первого токена", ("provider", "model", "stream")
+)
+UPSTREAM_TOTAL_TIME = histogram(
+    "upstream_total_time_seconds", "Полное время ответа провайдера", ("provider", "model", "stream")
+)
+TOKENS = counter(
+    "tokens",
+    "Токены запросов (in - контекст, cached - контекст из кэша префиксов провайдера) и ответов (out)",
+    ("provider", "model", "direction")
+)
+CONTEXT_TOKENS = histogram(
+    "context_tokens", "Размер контекста запроса в токенах", ("provider", "model"), buckets=TOKEN_BUCKETS
+)
+RESPONSES = counter(
+    "responses", "Ответы chat completion по источнику (upstream, cache, coalesced)", ("provider", "model", "source")
+)
+
+# Длительность записи хранилищ
+STORAGE_WRITE_DURATION = histogram(
+    "storage_write_duration_seconds", "Длительность записи хранилищ", ("storage",), buckets=STORAGE_BUCKETS
+)
+
+
+def record_response(metadata, stream: bool):
+    """
+    Учесть ответ chat completion
+
+    Args:
+        metadata: Метаданные ответа (ResponseMetadata)
+        stream: Streaming ответ
+    """
+    provider = metadata.provider or ""
+    model = metadata.model or ""
+    if metadata.cache_hit:
+        source = "cache"
+    elif metadata.coalesced:
+        source = "coalesced"
+    else:
+        source = "upstream"
+    RESPONSES.labels(provider, model, source).inc()
+    TOKENS.labels(provider, model, "in").inc(metadata.context_tokens)
+    TOKENS.labels(provider, model, "out").inc(metadata.response_tokens)
+    if metadata.cached_tokens:
+        TOKENS.labels(provider, model, "cached").inc(metadata.cached_tokens)
+    if source != "upstream":
+        return  # Задержки провайдера учитываются только для запросов, действительно отправленных ему
+    mode = "true" if stream else "false"
+    UPSTREAM_LATENCY.labels(provider, model, mode).observe(metadata.latency)
+    UPSTREAM_TTFT.labels(provider, model, mode).observe(metadata.time_to_first_token)
+    UPSTREAM_TOTAL_TIME.labels(provider, model, mode).observe(metadata.total_time)
+    CONTEXT_TOKENS.labels(provider, model).observe(metadata.context_tokens)
+
+
+def render(extra: Iterable[MetricFamily] = ()) -> str:
+    """Все метрики реестра по умолчанию в текстовом формате"""
+    return REGISTRY.render(extra)
@@ -0,0 +1,110 @@
+"""ASGI middleware учета HTTP запросов в метриках и трассировке"""
+import time
+
+from app.observability.metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_IN_FLIGHT
+from app.observability.tracing import tracer
+
+
+def _route_template(scope) -> str:
+    """
+    Шаблон пути маршрута запроса
+
+    В зависимости от версии FastAPI route.path содержит полный путь или путь
+    без префикса подключенного роутера; префикс восстанавливается по фактическому пути.
+    """
+    route_path = getattr(scope.get("route"), "path", None)
+    if route_path is None:
+        return "unmatched"
+    path = scope["path"]
+    try:
+        concrete = route_path.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return route_path
+    if path.endswith(concrete):
+        return path[:len(path) - len(concrete)] + route_path
+    return route_path
+
+
+class MetricsMiddleware:
+    """
+    Учет HTTP запросов: количество по статусу, длительность, выполняющиеся запросы
+
+    Реализовано как ASGI middleware (без BaseHTTPMiddleware), чтобы не добавлять
+    промежуточную задачу и буферизацию потоковых ответов. Метка route - шаблон пути
+    маршрута (например /api/contexts/{name}), а не фактический путь.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = _route_template(scope)
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route, status).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - start)
+
+
+class TracingMiddleware:
+    """
+    Корневой спан трассировки для каждого HTTP запроса
+
+    Контекст принимается из заголовка traceparent (W3C Trace Context); для
+    трассируемых запросов traceparent корневого спана возвращается в ответе,
+    чтобы клиент мог найти трейс запроса.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        span = tracer.start_root_span(
+            "http.request", traceparent, **{"http.method": scope["method"], "http.target": scope["path"]}
+        )
+        if not span.recording:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_error(f"HTTP {message['status']}")
+                headers = list(message.get("headers", []))
+                headers.append((b"traceparent", span.traceparent.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = _route_template(scope)
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute("http.route", route)
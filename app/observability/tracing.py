@@ -0,0 +1,434 @@
+"""Трассировка запросов: спаны с W3C trace context и экспорт в JSON файл или OTLP"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Deque
+
+import httpx
+
+from app.models.config import TracingConfig
+from app.utils import fastjson
+
+logger = logging.getLogger(__name__)
+
+# Заголовок W3C Trace Context
+TRACEPARENT_HEADER = "traceparent"
+# Имя файла JSON экспорта по умолчанию (в stats_dir)
+DEFAULT_TRACES_FILE = "traces.jsonl"
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Спан трассировки
+
+    Используется как контекстный менеджер: на время блока спан становится текущим
+    (дочерние спаны, в том числе в созданных задачах asyncio, ссылаются на него),
+    по выходу фиксируется время окончания и спан передается на экспорт.
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+        "attributes", "error", "_token", "_tracer"
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        attributes: Optional[Dict[str, Any]] = None,
+        start_ns: Optional[int] = None
+    ):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def recording(self) -> bool:
+        """Спан записывается (не заглушка)"""
+        return True
+
+    def set_attribute(self, key: str, value: Any):
+        """Установить атрибут"""
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        """Отметить спан как завершившийся ошибкой"""
+        self.error = message
+
+    @property
+    def traceparent(self) -> str:
+        """Значение заголовка traceparent для дочерних запросов"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None and self.error is None and not isinstance(exc, GeneratorExit):
+            self.error = f"{type(exc).__name__}: {exc}"
+        self.end()
+        return False
+
+    def end(self, end_ns: Optional[int] = None):
+        """Завершить спан и передать его на экспорт"""
+        if self.end_ns is None:
+            self.end_ns = end_ns if end_ns is not None else time.time_ns()
+            processor = self._tracer.processor
+            if processor is not None:
+                processor.submit(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Спан в виде словаря (формат JSON экспорта)"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Заглушка спана: трассировка выключена или запрос не попал в выборку"""
+
+    __slots__ = ()
+    recording = False
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def end(self, end_ns: Optional[int] = None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonFileExporter:
+    """Экспорт спанов в файл JSON Lines (один спан на строку)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        lines = "".join(fastjson.dumps_str(span.to_dict(), default=str) + "\n" for span in spans)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+    def close(self):
+        pass
+
+
+class OtlpHttpExporter:
+    """Экспорт спанов в OTLP коллектор по HTTP (кодировка JSON, POST /v1/traces)"""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout)
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        """Атрибут в формате OTLP"""
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        return {"key": key, "value": encoded}
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        """Спан в формате OTLP"""
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [self._attribute(key, value) for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+    def export(self, spans: List[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "llm-chat-debugger"},
+                    "spans": [self._encode(span) for span in spans],
+                }],
+            }]
+        }
+        response = self._client.post(
+            self.endpoint, content=fastjson.dumps(payload), headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+
+    def close(self):
+        self._client.close()
+
+
+class BatchSpanProcessor:
+    """
+    Накопление завершенных спанов и экспорт пачками в фоновом потоке
+
+    submit() только добавляет спан в очередь; экспорт не выполняется на пути запроса.
+    При переполнении очереди (экспорт не успевает) новые спаны отбрасываются.
+    """
+
+    def __init__(self, exporter, max_queue: int = 2048, batch_size: int = 512, interval: float = 2.0):
+        self.exporter = exporter
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: Deque[Span] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.exported = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span):
+        """Поставить спан в очередь экспорта"""
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+        if len(self._queue) >= self.batch_size:
+            with self._condition:
+                self._condition.notify()
+
+    def _run(self):
+        """Цикл потока экспорта"""
+        while True:
+            with self._condition:
+                if not self._closed:
+                    self._condition.wait(self.interval)
+                closed = self._closed
+            self._export()
+            if closed:
+                return
+
+    def _export(self):
+        """Экспортировать накопленные спаны"""
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            try:
+                self.exporter.export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Ошибка экспорта спанов трассировки: {type(e).__name__}: {str(e)}")
+
+    def shutdown(self):
+        """Экспортировать оставшиеся спаны и остановить поток"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.exporter.close()
+
+
+class Tracer:
+    """
+    Трассировщик приложения
+
+    Корневой спан создается для каждого HTTP запроса (TracingMiddleware): trace ID
+    берется из входящего заголовка traceparent или генерируется, решение о выборке
+    наследуется от родителя или принимается с вероятностью sample_rate. Вне
+    записываемого трейса start_span() возвращает заглушку, поэтому при выключенной
+    трассировке каждый спан стоит одного чтения contextvar.
+    """
+
+    def __init__(self):
+        self.config: Optional[TracingConfig] = None
+        self.processor: Optional[BatchSpanProcessor] = None
+        self.enabled = False
+
+    def configure(self, config: Optional[TracingConfig], default_dir: Path):
+        """
+        Применить конфигурацию (экспортер пересоздается только при изменении параметров)
+
+        Args:
+            config: Конфигурация трассировки (None - выключена)
+            default_dir: Папка файла JSON экспорта по умолчанию (stats_dir)
+        """
+        if config is not None and config.enabled and config.json_path is None:
+            config = config.model_copy(update={"json_path": Path(default_dir) / DEFAULT_TRACES_FILE})
+        if config == self.config:
+            return
+        previous = self.processor
+        if config is not None and config.enabled:
+            if config.exporter == "otlp":
+                exporter = OtlpHttpExporter(config.otlp_endpoint, config.service_name)
+                target = config.otlp_endpoint
+            else:
+                exporter = JsonFileExporter(config.json_path)
+                target = str(config.json_path)
+            self.processor = BatchSpanProcessor(exporter, interval=config.flush_interval)
+            logger.info(f"Трассировка включена: exporter={config.exporter} ({target}), sample_rate={config.sample_rate}")
+        else:
+            self.processor = None
+        self.config = config
+        self.enabled = self.processor is not None
+        if previous is not None:
+            previous.shutdown()
+
+    def shutdown(self):
+        """Экспортировать оставшиеся спаны и выключить трассировку"""
+        processor, self.processor = self.processor, None
+        self.enabled = False
+        self.config = None
+        if processor is not None:
+            processor.shutdown()
+
+    def start_root_span(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """
+        Начать корневой спан запроса
+
+        Args:
+            name: Имя спана
+            traceparent: Входящий заголовок traceparent
+            **attributes: Атрибуты спана
+
+        Returns:
+            Спан или заглушка (трассировка выключена, запрос не попал в выборку)
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < self.config.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def start_span(self, name: str, start_ns: Optional[int] = None, **attributes):
+        """
+        Начать дочерний спан текущего спана
+
+        Args:
+            name: Имя спана
+            start_ns: Время начала (time.time_ns()), по умолчанию текущее
+            **attributes: Атрибуты спана
+
+        Returns:
+            Спан или заглушка (нет записываемого текущего спана)
+        """
+        parent = _current_span.get()
+        if parent is None or self.processor is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes, start_ns)
+
+
+def _parse_traceparent(value: str) -> Optional[tuple[str, str, bool]]:
+    """
+    Разобрать заголовок traceparent (версия 00)
+
+    Returns:
+        Кортеж (trace ID, ID родительского спана, запрос в выборке) или None
+    """
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_span():
+    """Текущий спан или заглушка"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def propagation_headers() -> Dict[str, str]:
+    """Заголовки для передачи контекста трассировки провайдеру (пусто вне трейса)"""
+    span = _current_span.get()
+    if span is None:
+        return {}
+    return {TRACEPARENT_HEADER: span.traceparent}
+
+
+def httpx_trace_extensions() -> Dict[str, Any]:
+    """
+    Расширение httpx для спанов этапов HTTP запроса (подключение, TTFB, тело ответа)
+
+    Возвращает пустой словарь вне записываемого трейса. Спаны этапов привязываются
+    к текущему спану на момент вызова, в том числе чтение тела streaming ответа,
+    которое завершается после выхода из спана запроса.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return {}
+    tracer = parent._tracer
+    started: Dict[str, int] = {}
+
+    async def trace(event_name: str, info: Dict[str, Any]):
+        # События httpcore: "<уровень>.<этап>.started|complete|failed"
+        stage, _, state = event_name.rpartition(".")
+        if state == "started":
+            started[stage] = time.time_ns()
+            return
+        start_ns = started.pop(stage, None)
+        if start_ns is None or tracer.processor is None:
+            return
+        span = Span(tracer, f"http.{stage.split('.', 1)[-1]}", parent.trace_id, parent.span_id, start_ns=start_ns)
+        if state == "failed":
+            span.set_error(repr(info.get("exception")))
+        span.end()
+
+    return {"trace": trace}
+
+
+tracer = Tracer()
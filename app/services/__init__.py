@@ -1,5 +1,8 @@
 """Сервисы приложения"""
 from app.services.llm_client import LLMClient
+from app.services.router import ProviderRouter
+from app.services.completion import CompletionService
+from app.services.batch import BatchRunner
+from app.services.container import ServiceContainer
 
-__all__ = ["LLMClient"]
-
+__all__ = ["LLMClient", "ProviderRouter", "CompletionService", "BatchRunner", "ServiceContainer"]
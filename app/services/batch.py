@@ -0,0 +1,387 @@
+"""Пакетное выполнение запросов chat completion с сохранением результатов и продолжением после сбоя"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, AsyncIterator, Set
+
+from app.models.chat import ChatCompletionRequest
+from app.models.config import BatchConfig
+from app.observability.metrics import record_response
+from app.services.completion import CompletionService
+from app.services.limiter import AdmissionRejectedError
+from app.services.llm_client import describe_error
+from app.services.passthrough import RawCompletion
+from app.services.rate_limit import TokenBucket
+from app.storage.autosave import atomic_write_bytes
+from app.storage.timeseries import StatsHistory
+from app.utils import fastjson
+
+logger = logging.getLogger(__name__)
+
+# Папка заданий (в stats_dir)
+BATCHES_DIR_NAME = "batches"
+JOB_FILE_NAME = "job.json"
+RESULTS_FILE_NAME = "results.ndjson"
+# Количество повторов запроса, отклоненного ограничением одновременных запросов или квотой провайдера
+ADMISSION_RETRIES = 10
+# Идентификатор задания (имя папки)
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class BatchJob:
+    """
+    Задание пакетного выполнения
+
+    Папка задания содержит job.json (запросы и параметры, записывается один раз) и
+    results.ndjson - журнал результатов, в который каждый результат дописывается
+    отдельной строкой сразу после выполнения запроса. При загрузке для каждого запроса
+    берется последний результат; незавершенная последняя строка (сбой во время записи)
+    пропускается, поэтому после сбоя повторно выполняются только запросы без результата.
+    """
+
+    def __init__(self, directory: Path, data: Dict[str, Any]):
+        """
+        Args:
+            directory: Папка задания
+            data: Содержимое job.json
+        """
+        self.directory = directory
+        self.id: str = data["id"]
+        self.created: str = data["created"]
+        self.requests: List[Dict[str, Any]] = data["requests"]
+        self.concurrency: int = data["concurrency"]
+        self.requests_per_minute: Optional[float] = data.get("requests_per_minute")
+        # Последний результат каждого запроса (по индексу)
+        self.results: Dict[int, Dict[str, Any]] = {}
+        self.running = False
+        self.error: Optional[str] = None  # Причина остановки выполнения (ошибка записи результата)
+        self._lock = threading.Lock()
+
+    @property
+    def results_path(self) -> Path:
+        """Журнал результатов"""
+        return self.directory / RESULTS_FILE_NAME
+
+    @classmethod
+    def create(
+        cls,
+        root: Path,
+        requests: List[ChatCompletionRequest],
+        concurrency: int,
+        requests_per_minute: Optional[float]
+    ) -> "BatchJob":
+        """Создать задание и записать job.json"""
+        job_id = uuid.uuid4().hex
+        directory = root / job_id
+        directory.mkdir(parents=True)
+        data = {
+            "id": job_id,
+            "created": datetime.now().isoformat(),
+            "concurrency": concurrency,
+            "requests_per_minute": requests_per_minute,
+            "requests": [request.model_dump(exclude_none=True) for request in requests],
+        }
+        atomic_write_bytes(directory / JOB_FILE_NAME, fastjson.dumps(data))
+        return cls(directory, data)
+
+    @classmethod
+    def load(cls, directory: Path) -> "BatchJob":
+        """Загрузить задание и его результаты"""
+        job = cls(directory, fastjson.loads((directory / JOB_FILE_NAME).read_bytes()))
+        if not job.results_path.exists():
+            return job
+        data = job.results_path.read_bytes()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # Строка, запись которой прервана сбоем, удаляется, чтобы следующий результат начался с новой строки
+            with open(job.results_path, "r+b") as file:
+                file.truncate(complete)
+            data = data[:complete]
+        for line in data.splitlines():
+            try:
+                result = fastjson.loads(line)
+            except fastjson.JSONDecodeError:
+                continue
+            job.results[result["index"]] = result
+        return job
+
+    def write_result(self, result: Dict[str, Any]):
+        """Дописать результат в журнал с fsync (вызывается в потоке)"""
+        line = fastjson.dumps(result) + b"\n"
+        with self._lock, open(self.results_path, "ab") as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def pending(self, retry_failed: bool = True) -> List[int]:
+        """Индексы запросов для выполнения: без результата и (если retry_failed) с ошибкой"""
+        return [
+            index for index in range(len(self.requests))
+            if index not in self.results or (retry_failed and self.results[index]["status"] != "ok")
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """Состояние задания"""
+        succeeded = sum(1 for result in self.results.values() if result["status"] == "ok")
+        failed = len(self.results) - succeeded
+        remaining = len(self.requests) - len(self.results)
+        if self.running:
+            status = "running"
+        elif remaining == 0 and self.error is None:
+            status = "completed"
+        else:
+            status = "interrupted"
+        summary = {
+            "id": self.id,
+            "status": status,
+            "created": self.created,
+            "total": len(self.requests),
+            "succeeded": succeeded,
+            "failed": failed,
+            "remaining": remaining,
+            "concurrency": self.concurrency,
+            "requests_per_minute": self.requests_per_minute,
+        }
+        if self.error is not None:
+            summary["error"] = self.error
+        return summary
+
+    def ordered_results(self) -> List[Dict[str, Any]]:
+        """Последние результаты запросов в порядке запросов"""
+        return [self.results[index] for index in sorted(self.results)]
+
+
+class BatchRunner:
+    """
+    Выполнение заданий пакетной обработки
+
+    Запросы задания выполняются через CompletionService (маршрутизация, повторы,
+    квоты провайдеров, кэш) пулом из concurrency обработчиков; частота запуска
+    ограничивается requests_per_minute. Результаты рассылаются подписчикам
+    (потоковым ответам NDJSON) по мере выполнения; задание продолжает выполняться
+    и после отключения клиента.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        config: BatchConfig,
+        completion_service: CompletionService,
+        stats_history: Optional[StatsHistory] = None
+    ):
+        """
+        Args:
+            directory: Папка заданий
+            config: Параметры по умолчанию
+            completion_service: Сервис выполнения запросов
+            stats_history: История статистики ответов (None - отключена)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.config = config
+        # Сервисы заменяются при перезагрузке конфигурации (выполняющиеся задания
+        # отправляют следующие запросы через новый контейнер)
+        self.completion_service = completion_service
+        self.stats_history = stats_history
+        # Выполняющиеся задания (остальные загружаются с диска при обращении)
+        self._jobs: Dict[str, BatchJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def create_job(
+        self,
+        requests: List[ChatCompletionRequest],
+        concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None
+    ) -> BatchJob:
+        """
+        Создать задание
+
+        Args:
+            requests: Запросы (stream игнорируется)
+            concurrency: Количество одновременных запросов (по умолчанию из конфигурации)
+            requests_per_minute: Ограничение частоты запросов (по умолчанию из конфигурации)
+
+        Returns:
+            Задание
+
+        Raises:
+            ValueError: Нет запросов или их больше max_items
+        """
+        if not requests:
+            raise ValueError("Задание не содержит запросов")
+        if len(requests) > self.config.max_items:
+            raise ValueError(f"Количество запросов {len(requests)} превышает max_items={self.config.max_items}")
+        job = BatchJob.create(
+            self.directory,
+            requests,
+            concurrency or self.config.max_concurrency,
+            requests_per_minute or self.config.requests_per_minute
+        )
+        logger.info(f"Создано задание пакетной обработки {job.id}: запросов {len(requests)}")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[BatchJob]:
+        """Задание по идентификатору (None - не найдено)"""
+        if not _JOB_ID_PATTERN.match(job_id):
+            return None
+        job = self._jobs.get(job_id)
+        if job is None:
+            directory = self.directory / job_id
+            if not (directory / JOB_FILE_NAME).exists():
+                return None
+            job = BatchJob.load(directory)
+        return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Состояние всех заданий (новые первыми)"""
+        jobs = []
+        for directory in self.directory.iterdir():
+            job = self.get_job(directory.name) if directory.is_dir() else None
+            if job is not None:
+                jobs.append(job.summary())
+        return sorted(jobs, key=lambda summary: summary["created"], reverse=True)
+
+    def start(self, job: BatchJob, retry_failed: bool = True) -> bool:
+        """
+        Запустить выполнение оставшихся запросов задания
+
+        Args:
+            job: Задание
+            retry_failed: Повторить запросы, завершившиеся ошибкой
+
+        Returns:
+            False, если задание уже выполняется
+        """
+        if job.running:
+            return False
+        indices = job.pending(retry_failed)
+        job.running = True
+        job.error = None
+        self._jobs[job.id] = job
+        task = asyncio.create_task(self._run(job, indices))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return True
+
+    def subscribe(self, job: BatchJob) -> AsyncIterator[Dict[str, Any]]:
+        """
+        События выполнения задания: состояние, результаты запросов, итоговое состояние
+
+        Подписка создается сразу (до начала итерации), поэтому результаты, полученные
+        между запуском задания и началом передачи ответа, не теряются.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        initial = job.summary()
+        if job.running:
+            self._subscribers.setdefault(job.id, set()).add(queue)
+        else:
+            queue.put_nowait(None)
+        return self._events(job, queue, initial)
+
+    async def _events(
+        self,
+        job: BatchJob,
+        queue: asyncio.Queue,
+        initial: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Передать события подписки до завершения выполнения задания"""
+        try:
+            yield {"type": "job", **initial}
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield {"type": "result", **event}
+            yield {"type": "summary", **job.summary()}
+        finally:
+            subscribers = self._subscribers.get(job.id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job.id]
+
+    def _publish(self, job: BatchJob, event: Optional[Dict[str, Any]]):
+        """Передать событие подписчикам задания (None - выполнение завершено)"""
+        for queue in self._subscribers.get(job.id, ()):
+            queue.put_nowait(event)
+
+    async def _run(self, job: BatchJob, indices: List[int]):
+        """Выполнить запросы задания пулом обработчиков"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for index in indices:
+            queue.put_nowait(index)
+        bucket = TokenBucket(job.requests_per_minute) if job.requests_per_minute else None
+        pace_lock = asyncio.Lock()
+
+        async def worker():
+            while not queue.empty():
+                index = queue.get_nowait()
+                if bucket is not None:
+                    # Резервирование списывает квоту сразу, запросы распределяются равномерно
+                    async with pace_lock:
+                        wait = bucket.wait_time(1)
+                        bucket.consume(1)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                result = await self._execute(job, index)
+                try:
+                    await asyncio.to_thread(job.write_result, result)
+                except OSError as e:
+                    # Результат не сохранен (например, нет места на диске): выполнение останавливается,
+                    # оставшиеся запросы не выбираются, задание можно продолжить через resume
+                    logger.error(f"Задание {job.id} остановлено: не удалось записать результат запроса {index}: {e}")
+                    job.error = f"Ошибка записи результата: {e}"
+                    while not queue.empty():
+                        queue.get_nowait()
+                    return
+                job.results[index] = result
+                self._publish(job, result)
+
+        logger.info(f"Выполнение задания {job.id}: запросов {len(indices)}, одновременно {job.concurrency}")
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(job.concurrency, len(indices)) or 1)))
+        finally:
+            job.running = False
+            self._jobs.pop(job.id, None)
+            self._publish(job, None)
+            summary = job.summary()
+            logger.info(
+                f"Задание {job.id}: {summary['status']}, успешно {summary['succeeded']}, "
+                f"ошибок {summary['failed']}, осталось {summary['remaining']}"
+            )
+
+    async def _execute(self, job: BatchJob, index: int) -> Dict[str, Any]:
+        """Выполнить запрос задания и сформировать результат"""
+        request = ChatCompletionRequest.model_validate(job.requests[index])
+        request.stream = False
+        for attempt in range(ADMISSION_RETRIES + 1):
+            try:
+                response, metadata = await self.completion_service.chat_completion(request)
+                break
+            except AdmissionRejectedError as e:
+                # Очередь или квота провайдера переполнена: задание ждет, а не завершается ошибкой
+                if attempt == ADMISSION_RETRIES:
+                    return {"index": index, "status": "error", "error": str(e)}
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.warning(f"Запрос {index} задания {job.id} завершился ошибкой: {describe_error(e)}")
+                return {"index": index, "status": "error", "error": describe_error(e)}
+
+        record_response(metadata, stream=False)
+        if self.stats_history is not None:
+            self.stats_history.record(metadata)
+        body = response.data if isinstance(response, RawCompletion) else response.model_dump(exclude_none=True)
+        return {"index": index, "status": "ok", "response": body, "metadata": metadata.model_dump()}
+
+    async def aclose(self):
+        """Прервать выполняющиеся задания (их можно продолжить после перезапуска)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,220 @@
+"""Кэш ответов LLM провайдера с адресацией по содержимому запроса"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+from app.models.config import CacheConfig
+from app.observability.metrics import STORAGE_WRITE_DURATION
+from app.observability.tracing import tracer
+from app.utils import fastjson
+
+logger = logging.getLogger(__name__)
+
+# Имя файла базы данных дискового уровня кэша (в stats_dir)
+CACHE_DB_NAME = "response_cache.sqlite3"
+
+
+class DiskCache:
+    """
+    Дисковый уровень кэша на SQLite
+
+    Операции синхронные и выполняются в отдельном потоке (через asyncio.to_thread),
+    поэтому доступ к соединению защищен блокировкой.
+    """
+
+    def __init__(self, path: Path, max_entries: int):
+        """
+        Args:
+            path: Путь к файлу базы данных
+            max_entries: Максимальное количество записей (при превышении удаляются давно не использованные)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, expires REAL NOT NULL, accessed REAL NOT NULL, "
+            "size INTEGER NOT NULL, value BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """
+        Получить запись
+
+        Returns:
+            Кортеж (значение, время истечения) или None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return bytes(row[0]), row[1]
+
+    def put(self, key: str, value: bytes, expires: float):
+        """Сохранить запись и удалить просроченные и лишние записи"""
+        now = time.time()
+        with self._lock, STORAGE_WRITE_DURATION.time("response_cache"):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, expires, accessed, size, value) VALUES (?, ?, ?, ?, ?)",
+                (key, expires, now, len(value), value)
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+            count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Количество и объем записей"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"entries": count, "bytes": size}
+
+    def close(self):
+        """Закрыть соединение с базой данных"""
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов: LRU в памяти и опционально SQLite на диске
+
+    Запись - JSON с итоговым ответом и (для streaming) исходными SSE событиями.
+    Записи вытесняются по TTL, количеству и объему; запись, найденная на диске,
+    переносится в память.
+    """
+
+    def __init__(self, config: CacheConfig, directory: Path):
+        """
+        Инициализация кэша
+
+        Args:
+            config: Конфигурация кэша
+            directory: Папка для дискового уровня (stats_dir)
+        """
+        self.config = config
+        self.directory = Path(directory)
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: Optional[DiskCache] = (
+            DiskCache(self.directory / CACHE_DB_NAME, config.disk_max_entries) if config.disk else None
+        )
+        # Статистика
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Найти запись по ключу
+
+        Args:
+            key: Хэш канонической формы запроса
+
+        Returns:
+            Сохраненная запись или None
+        """
+        entry = self._memory.get(key)
+        if entry is not None and entry[1] <= time.time():
+            self._evict(key)
+            entry = None
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return fastjson.loads(entry[0])
+
+        if self._disk is not None:
+            try:
+                entry = await asyncio.to_thread(self._disk.get, key)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка чтения дискового кэша ответов: {str(e)}")
+                entry = None
+            if entry is not None:
+                self._store_memory(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return fastjson.loads(entry[0])
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: Dict[str, Any]):
+        """
+        Сохранить запись
+
+        Args:
+            key: Хэш канонической формы запроса
+            value: Запись (JSON-сериализуемый словарь)
+        """
+        data = fastjson.dumps(value)
+        expires = time.time() + self.config.ttl
+        self._store_memory(key, data, expires)
+        self.stores += 1
+        if self._disk is not None:
+            try:
+                with tracer.start_span("storage.response_cache.put", bytes=len(data)):
+                    await asyncio.to_thread(self._disk.put, key, data, expires)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи дискового кэша ответов: {str(e)}")
+
+    def _store_memory(self, key: str, data: bytes, expires: float):
+        """Сохранить запись в памяти с вытеснением давно не использованных"""
+        if len(data) > self.config.max_memory_bytes:
+            return
+        self._evict(key)
+        self._memory[key] = (data, expires)
+        self._memory_bytes += len(data)
+        while (
+            len(self._memory) > self.config.max_entries
+            or self._memory_bytes > self.config.max_memory_bytes
+        ):
+            oldest = next(iter(self._memory))
+            self._evict(oldest)
+
+    def _evict(self, key: str):
+        """Удалить запись из памяти"""
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[0])
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика попаданий и заполнения кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.config.enabled,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk": self._disk.stats() if self._disk is not None else None,
+        }
+
+    def close(self):
+        """Закрыть дисковый уровень"""
+        if self._disk is not None:
+            self._disk.close()
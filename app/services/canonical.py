@@ -0,0 +1,82 @@
+"""Каноническое представление запроса chat completion"""
+import hashlib
+from typing import Any, Dict
+
+from app.models.chat import ChatCompletionRequest
+from app.utils import fastjson
+
+# Поля, не влияющие на содержимое ответа модели
+NON_SEMANTIC_FIELDS = frozenset({"stream", "stream_options", "user"})
+
+
+def canonical_request(request: ChatCompletionRequest) -> Dict[str, Any]:
+    """
+    Каноническая форма запроса: без пустых и транспортных полей
+
+    Args:
+        request: Запрос (с примененными значениями по умолчанию)
+
+    Returns:
+        Словарь параметров, определяющих ответ модели
+    """
+    data = request.model_dump(exclude_none=True)
+    return {key: value for key, value in data.items() if key not in NON_SEMANTIC_FIELDS}
+
+
+def _tool_name(tool: Any) -> str:
+    """Имя функции инструмента (ключ сортировки списка инструментов)"""
+    function = tool.get("function") if isinstance(tool, dict) else None
+    name = function.get("name") if isinstance(function, dict) else None
+    return name if isinstance(name, str) else ""
+
+
+def _sorted_tool(tool: Any) -> Any:
+    """Описание инструмента с упорядоченными ключами верхнего уровня и ключами function"""
+    if not isinstance(tool, dict):
+        return tool
+    shaped = {key: tool[key] for key in sorted(tool)}
+    function = shaped.get("function")
+    if isinstance(function, dict):
+        # parameters (JSON Schema) не изменяется: порядок properties влияет на ответ модели
+        shaped["function"] = {key: function[key] for key in sorted(function)}
+    return shaped
+
+
+def shape_request_data(request_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Привести тело запроса к провайдеру к стабильной форме для кэша префиксов
+
+    Провайдеры (OpenAI, DeepSeek) применяют скидку и ускорение только к побайтно
+    совпадающему префиксу запроса. Изменяется только то, что не влияет на смысл
+    запроса: порядок инструментов (по имени функции) и порядок ключей в описании
+    инструмента и его function. Сообщения и схема параметров (включая порядок
+    properties) передаются без изменений.
+
+    Args:
+        request_data: Данные запроса (изменяются на месте)
+
+    Returns:
+        Те же данные запроса
+    """
+    tools = request_data.get("tools")
+    if isinstance(tools, list) and tools:
+        request_data["tools"] = sorted((_sorted_tool(tool) for tool in tools), key=_tool_name)
+    return request_data
+
+
+def canonical_json(data: Any) -> str:
+    """Детерминированная JSON сериализация (сортировка ключей, без пробелов)"""
+    return fastjson.dumps_str(data, sort_keys=True)
+
+
+def request_key(request: ChatCompletionRequest) -> str:
+    """
+    Хэш запроса для адресации по содержимому
+
+    Args:
+        request: Запрос (с примененными значениями по умолчанию)
+
+    Returns:
+        SHA-256 канонической формы запроса (hex)
+    """
+    return hashlib.sha256(canonical_json(canonical_request(request)).encode("utf-8")).hexdigest()
@@ -0,0 +1,246 @@
+"""Объединение одинаковых одновременных запросов к LLM провайдеру (single-flight)"""
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, List, Callable, Awaitable, AsyncIterator, TypeVar, Generic
+
+from app.models.metadata import ResponseMetadata
+from app.services.streaming import ChatCompletionStream
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _consume_exception(task: asyncio.Task):
+    """Пометить исключение задачи как полученное (если ее результат никто не ждет)"""
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight(Generic[T]):
+    """
+    Выполнение одного вызова для всех одновременных запросов с одинаковым ключом
+
+    Вызов выполняется в отдельной задаче, поэтому отмена одного из ожидающих
+    (например, клиент закрыл соединение) не прерывает запрос для остальных.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        # Количество запросов, получивших результат чужого вызова
+        self.shared = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Выполнить вызов или присоединиться к уже выполняющемуся
+
+        Args:
+            key: Ключ запроса
+            call: Функция выполнения запроса
+
+        Returns:
+            Кортеж (результат, получен ли результат чужого вызова)
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.get_running_loop().create_task(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """Удалить завершенный вызов"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        _consume_exception(task)
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся вызовов"""
+        return len(self._calls)
+
+
+class StreamFanout:
+    """
+    Один streaming запрос к провайдеру с несколькими подписчиками
+
+    События провайдера накапливаются в буфере исходного потока (record_events),
+    поэтому подписчик, присоединившийся позже, получает поток с начала.
+    Каждый подписчик собирает ответ и метаданные самостоятельно (со своим временем
+    начала запроса). Если все подписчики отключились, запрос к провайдеру прерывается.
+    Завершенный или прерванный поток закрыт: новые подписки отклоняются, и вызывающий
+    открывает новый поток.
+    """
+
+    def __init__(self, open_source: Callable[[], Awaitable[ChatCompletionStream]]):
+        """
+        Args:
+            open_source: Функция открытия исходного потока (с record_events=True)
+        """
+        self.source: Optional[ChatCompletionStream] = None
+        self.subscribers = 0
+        self.done = False
+        # Поток больше не принимает подписчиков (завершен, прерван или не открылся)
+        self.closed = False
+        self.error: Optional[Exception] = None
+        self._updated = asyncio.Event()
+        self._pump: Optional[asyncio.Task] = None
+        self._finish_callbacks: List[Callable[[], None]] = []
+        self._open_task = asyncio.get_running_loop().create_task(open_source())
+        self._open_task.add_done_callback(self._on_opened)
+
+    def add_finish_callback(self, callback: Callable[[], None]):
+        """Добавить функцию, вызываемую при закрытии потока (завершение, прерывание или неудачное открытие)"""
+        self._finish_callbacks.append(callback)
+
+    def _on_opened(self, task: asyncio.Task):
+        """Обработать результат открытия исходного потока"""
+        if task.cancelled() or task.exception() is not None:
+            self._finish()
+            return
+        self.source = task.result()
+        if self.subscribers == 0:
+            # Все ожидавшие отключились до открытия потока
+            self._finish()
+            self._pump = asyncio.get_running_loop().create_task(self._discard())
+
+    async def subscribe(
+        self,
+        start_time: float,
+        metadata_factory: Callable[..., ResponseMetadata],
+        suppress_usage_chunk: bool,
+        coalesced: bool
+    ) -> Optional["FanoutStream"]:
+        """
+        Подписаться на поток (дождавшись его открытия)
+
+        Args:
+            start_time: Время начала запроса подписчика
+            metadata_factory: Функция построения метаданных
+            suppress_usage_chunk: Не передавать подписчику чанк только с usage
+            coalesced: Подписчик присоединился к чужому запросу
+
+        Returns:
+            Поток SSE событий подписчика или None, если поток закрыт
+        """
+        if self.closed:
+            return None
+        self.subscribers += 1
+        try:
+            await asyncio.shield(self._open_task)
+        except BaseException:
+            self.unsubscribe()
+            raise
+        if self._pump is None:
+            self._pump = asyncio.get_running_loop().create_task(self._run())
+        return FanoutStream(self, start_time, metadata_factory, suppress_usage_chunk, coalesced)
+
+    def unsubscribe(self):
+        """Отписаться от потока"""
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done and self._pump is not None:
+            logger.info("Все подписчики отключились, streaming запрос к провайдеру прерван")
+            # Поток закрывается сразу, а не после отмены чтения: новый запрос откроет свой поток
+            self._finish()
+            self._pump.cancel()
+
+    async def _run(self):
+        """Читать исходный поток и оповещать подписчиков о новых событиях"""
+        try:
+            async for _ in self.source:
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            await self.source.aclose()
+            self.done = True
+            self._notify()
+            self._finish()
+
+    async def _discard(self):
+        """Закрыть поток, открытый после отключения всех ожидавших"""
+        await self.source.aclose()
+        self.done = True
+        self._finish()
+
+    def _notify(self):
+        """Разбудить подписчиков, ожидающих новых событий"""
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def _finish(self):
+        """Закрыть поток для новых подписчиков и вызвать обработчики завершения"""
+        self.closed = True
+        callbacks, self._finish_callbacks = self._finish_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    @property
+    def events(self) -> List[str]:
+        """Полученные исходные SSE события"""
+        return self.source.events
+
+    async def wait_update(self):
+        """Дождаться новых событий или завершения потока"""
+        await self._updated.wait()
+
+
+class FanoutStream(ChatCompletionStream):
+    """Поток подписчика StreamFanout с интерфейсом ChatCompletionStream"""
+
+    def __init__(
+        self,
+        fanout: StreamFanout,
+        start_time: float,
+        metadata_factory: Callable[..., ResponseMetadata],
+        suppress_usage_chunk: bool,
+        coalesced: bool
+    ):
+        super().__init__(None, start_time, metadata_factory, suppress_usage_chunk=suppress_usage_chunk)
+        self._fanout = fanout
+        self.coalesced = coalesced
+        self.headers_time = fanout.source.headers_time if not coalesced else time.time()
+
+    async def _read_events(self) -> AsyncIterator[bytes]:
+        """Читать события из общего буфера по мере их поступления"""
+        fanout = self._fanout
+        position = 0
+        while True:
+            events = fanout.events
+            while position < len(events):
+                event = self._process_event(events[position].split("\n"))
+                position += 1
+                if event is not None:
+                    yield event
+            if fanout.done:
+                break
+            await fanout.wait_update()
+        if fanout.error is not None:
+            self.error = fanout.error
+            raise fanout.error
+        if fanout.source.completed:
+            self.end_time = time.time()
+
+    async def aclose(self):
+        """Отписаться от общего потока"""
+        if not self._closed:
+            self._fanout.unsubscribe()
+        await super().aclose()
+
+    @property
+    def metadata(self) -> ResponseMetadata:
+        """Метаданные подписчика с провайдером и попытками исходного запроса"""
+        if self._metadata is None:
+            metadata = super().metadata
+            source = self._fanout.source.metadata
+            metadata.provider = source.provider
+            metadata.model = source.model
+            metadata.attempts = source.attempts
+            metadata.hedged = source.hedged
+            metadata.cache_hit = source.cache_hit
+            metadata.coalesced = self.coalesced
+        return self._metadata
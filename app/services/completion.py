@@ -0,0 +1,246 @@
+"""Сервис выполнения запросов chat completion"""
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any, Union
+
+from app.models.chat import ChatCompletionRequest, ChatCompletionResponse
+from app.models.config import CoalescingConfig
+from app.models.metadata import ResponseMetadata
+from app.services.cache import ResponseCache
+from app.services.canonical import request_key
+from app.services.coalescing import SingleFlight, StreamFanout
+from app.services.passthrough import RawCompletion
+from app.services.router import ProviderRouter
+from app.services.streaming import ChatCompletionStream, ReplayedCompletionStream, response_to_events
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionService:
+    """
+    Выполнение запросов chat completion перед маршрутизатором провайдеров
+
+    Для детерминированных запросов (температура не выше порога из конфигурации):
+    - ответ ищется в кэше ответов;
+    - одинаковые одновременные запросы объединяются в один запрос к провайдеру
+      (streaming ответ раздается всем подписчикам).
+    Ключ - хэш канонической формы запроса с примененными параметрами по умолчанию провайдера.
+
+    В режиме passthrough ответы без streaming возвращаются как RawCompletion:
+    исходное тело ответа провайдера (или записи кэша) без валидации моделью ответа.
+    """
+
+    def __init__(
+        self,
+        router: ProviderRouter,
+        cache: Optional[ResponseCache] = None,
+        coalescing: Optional[CoalescingConfig] = None,
+        passthrough: bool = False
+    ):
+        """
+        Инициализация сервиса
+
+        Args:
+            router: Маршрутизатор запросов между провайдерами
+            cache: Кэш ответов (None - без кэширования)
+            coalescing: Конфигурация объединения запросов (по умолчанию включено)
+            passthrough: Возвращать исходное тело ответа провайдера (RawCompletion)
+        """
+        self.router = router
+        self.cache = cache
+        self.coalescing = coalescing or CoalescingConfig()
+        self.passthrough = passthrough
+        self._single_flight: SingleFlight = SingleFlight()
+        self._fanouts: Dict[str, StreamFanout] = {}
+        self.coalesced_streams = 0
+        # Задачи сохранения ответов streaming запросов в кэш
+        self._pending: set = set()
+
+    def _keys(self, request: ChatCompletionRequest) -> tuple[Optional[str], Optional[str]]:
+        """
+        Ключи запроса
+
+        Returns:
+            Кортеж (ключ кэша или None, ключ объединения запросов или None)
+        """
+        coalesce = self.coalescing.enabled
+        if self.cache is None and not coalesce:
+            return None, None
+        resolved = self.router.resolve(request)
+        temperature = resolved.temperature
+        if temperature is None:
+            return None, None
+        key = request_key(resolved)
+        cache_key = key if self.cache is not None and temperature <= self.cache.config.max_temperature else None
+        flight_key = key if coalesce and temperature <= self.coalescing.max_temperature else None
+        return cache_key, flight_key
+
+    def _metadata_factory(self):
+        """Функция построения метаданных для ответов, полученных не от провайдера напрямую"""
+        return self.router.primary.client._extract_metadata
+
+    async def chat_completion(
+        self,
+        request: ChatCompletionRequest
+    ) -> tuple[Union[ChatCompletionResponse, RawCompletion], ResponseMetadata]:
+        """
+        Выполнить запрос (ответ из кэша, если он есть)
+
+        Args:
+            request: Запрос к API
+
+        Returns:
+            Кортеж (ответ модели, метаданные)
+        """
+        cache_key, flight_key = self._keys(request)
+        if cache_key is not None:
+            start_time = time.time()
+            entry = await self.cache.get(cache_key)
+            if entry is not None:
+                logger.info("Ответ получен из кэша: key=%.12s", cache_key)
+                return self._cached_response(entry, start_time)
+
+        if flight_key is None:
+            return await self._complete(request, cache_key)
+
+        (response, metadata), shared = await self._single_flight.run(
+            flight_key, lambda: self._complete(request, cache_key)
+        )
+        if not shared:
+            return response, metadata
+        logger.info("Запрос объединен с одинаковым выполняющимся запросом: key=%.12s", flight_key)
+        if not isinstance(response, RawCompletion):
+            # RawCompletion не изменяется и используется всеми подписчиками без копирования
+            response = response.model_copy(deep=True)
+        return response, metadata.model_copy(update={"coalesced": True})
+
+    async def _complete(
+        self,
+        request: ChatCompletionRequest,
+        cache_key: Optional[str]
+    ) -> tuple[Union[ChatCompletionResponse, RawCompletion], ResponseMetadata]:
+        """Выполнить запрос к провайдеру и сохранить ответ в кэш"""
+        response, metadata = await self.router.chat_completion(request, passthrough=self.passthrough)
+        if cache_key is not None:
+            metadata.cache_hit = False
+            if isinstance(response, RawCompletion):
+                if response.has_choices:
+                    await self.cache.put(cache_key, {"response": response.data, "events": None})
+            elif response.choices:
+                await self.cache.put(cache_key, {"response": response.model_dump(exclude_none=True), "events": None})
+        return response, metadata
+
+    def _cached_response(
+        self,
+        entry: Dict[str, Any],
+        start_time: float
+    ) -> tuple[Union[ChatCompletionResponse, RawCompletion], ResponseMetadata]:
+        """Ответ и метаданные для записи кэша"""
+        if self.passthrough:
+            response = RawCompletion.from_data(entry["response"])
+        else:
+            response = ChatCompletionResponse(**entry["response"])
+        elapsed = time.time() - start_time
+        metadata = self._metadata_factory()(response, start_time, elapsed, elapsed, elapsed)
+        metadata.cache_hit = True
+        metadata.attempts = 0
+        metadata.model = response.model
+        return response, metadata
+
+    async def chat_completion_stream(self, request: ChatCompletionRequest) -> ChatCompletionStream:
+        """
+        Открыть streaming запрос (воспроизведение из кэша, если ответ есть)
+
+        Args:
+            request: Запрос к API
+
+        Returns:
+            Поток SSE событий
+        """
+        start_time = time.time()
+        suppress_usage_chunk = request.stream_options is None
+        cache_key, flight_key = self._keys(request)
+        if cache_key is not None:
+            entry = await self.cache.get(cache_key)
+            if entry is not None:
+                logger.info("Streaming ответ воспроизводится из кэша: key=%.12s", cache_key)
+                events = entry.get("events") or response_to_events(ChatCompletionResponse(**entry["response"]))
+                return ReplayedCompletionStream(
+                    events,
+                    start_time,
+                    self._metadata_factory(),
+                    suppress_usage_chunk=suppress_usage_chunk
+                )
+
+        if flight_key is None:
+            return await self._open_stream(request, cache_key)
+
+        fanout = self._fanouts.get(flight_key)
+        if fanout is not None:
+            stream = await fanout.subscribe(start_time, self._metadata_factory(), suppress_usage_chunk, True)
+            if stream is not None:
+                self.coalesced_streams += 1
+                logger.info("Streaming запрос подключен к одинаковому выполняющемуся запросу: key=%.12s", flight_key)
+                return stream
+            # Общий поток закрыт: открываем новый
+
+        fanout = StreamFanout(lambda: self._open_stream(request, cache_key, record_events=True))
+        self._fanouts[flight_key] = fanout
+        fanout.add_finish_callback(lambda: self._drop_fanout(flight_key, fanout))
+        return await fanout.subscribe(start_time, self._metadata_factory(), suppress_usage_chunk, False)
+
+    def _drop_fanout(self, key: str, fanout: StreamFanout):
+        """Удалить завершенный общий поток"""
+        if self._fanouts.get(key) is fanout:
+            del self._fanouts[key]
+
+    async def _open_stream(
+        self,
+        request: ChatCompletionRequest,
+        cache_key: Optional[str],
+        record_events: bool = False
+    ) -> ChatCompletionStream:
+        """Открыть streaming запрос к провайдеру и сохранить ответ в кэш после завершения"""
+        stream = await self.router.chat_completion_stream(
+            request, record_events=record_events or cache_key is not None
+        )
+        if cache_key is not None:
+            stream.cache_hit = False
+
+            def on_close():
+                if stream.completed and stream.error is None:
+                    self._schedule(self.cache.put(cache_key, {
+                        "response": stream.response.model_dump(exclude_none=True),
+                        "events": stream.events
+                    }))
+
+            stream.add_close_callback(on_close)
+        return stream
+
+    def _schedule(self, coro):
+        """Запустить фоновую задачу, сохранив ссылку до ее завершения"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша ответов"""
+        if self.cache is None:
+            return {"enabled": False}
+        return self.cache.stats()
+
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """Статистика объединения запросов"""
+        return {
+            "enabled": self.coalescing.enabled,
+            "coalesced_requests": self._single_flight.shared,
+            "coalesced_streams": self.coalesced_streams,
+            "in_flight_requests": self._single_flight.in_flight,
+            "in_flight_streams": len(self._fanouts),
+        }
+
+    async def aclose(self):
+        """Дождаться фоновых задач"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
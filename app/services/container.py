@@ -0,0 +1,201 @@
+"""Контейнер сервисов приложения"""
+import logging
+from pathlib import Path
+from typing import Optional
+
+from app.config.manager import ConfigManager
+from app.models.config import StatsHistoryConfig, BatchConfig
+from app.observability.tracing import tracer
+from app.services.batch import BatchRunner, BATCHES_DIR_NAME
+from app.services.cache import ResponseCache
+from app.services.completion import CompletionService
+from app.services.llm_client import LLMClient
+from app.services.router import ProviderRouter
+from app.storage.prompts import PromptStorage
+from app.storage.contexts import ContextStorage
+from app.storage.context_store import SQLiteContextStorage
+from app.storage.current import CurrentDataStorage
+from app.storage.sessions import SessionStore
+from app.storage.timeseries import StatsHistory, TIMESERIES_DIR_NAME
+from app.storage.stats import StatsStorage
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Контейнер сервисов приложения
+
+    Создается один раз при старте приложения и хранится в app.state.container.
+    При изменении конфигурации контейнер целиком заменяется новым, поэтому
+    все роутеры одновременно начинают использовать новые клиенты и хранилища.
+    Пулы соединений и хранилища предыдущего контейнера переиспользуются, если
+    их параметры не изменились.
+    """
+
+    def __init__(self, config_manager: ConfigManager, previous: Optional["ServiceContainer"] = None):
+        """
+        Инициализация контейнера
+
+        Args:
+            config_manager: Менеджер конфигурации
+            previous: Предыдущий контейнер (при перезагрузке конфигурации)
+        """
+        app_config = config_manager.app_config
+        self.config_manager = config_manager
+        tracer.configure(app_config.tracing, app_config.stats_dir)
+        # Провайдеры с неизменными параметрами подключения сохраняют пул соединений
+        self.router = ProviderRouter.from_config(
+            config_manager,
+            previous=previous.router if previous is not None else None
+        )
+
+        self.prompt_storage = self._reuse(previous, "prompt_storage", "prompts_dir", app_config.prompts_dir) \
+            or PromptStorage(app_config.prompts_dir)
+        context_storage_class = (
+            SQLiteContextStorage if app_config.context_storage == "sqlite" else ContextStorage
+        )
+        self.context_storage = self._reuse(previous, "context_storage", "contexts_dir", app_config.contexts_dir)
+        if not isinstance(self.context_storage, context_storage_class):
+            if context_storage_class is SQLiteContextStorage:
+                self.context_storage = SQLiteContextStorage(
+                    app_config.contexts_dir, import_json=app_config.import_json_contexts
+                )
+            else:
+                self.context_storage = ContextStorage(app_config.contexts_dir)
+        self.current_storage = self._reuse(previous, "current_storage", "contexts_dir", app_config.contexts_dir) \
+            or CurrentDataStorage(app_config.contexts_dir)
+        self.stats_storage = self._reuse(previous, "stats_storage", "stats_dir", app_config.stats_dir) \
+            or StatsStorage(app_config.stats_dir)
+        # Сессии сохраняются, если не изменились хранилища сессии по умолчанию
+        previous_sessions = previous.sessions if previous is not None else None
+        if (
+            previous_sessions is not None
+            and previous_sessions.default.current is self.current_storage
+            and previous_sessions.default.stats is self.stats_storage
+        ):
+            self.sessions = previous_sessions
+            self.sessions.max_sessions = app_config.max_sessions
+        else:
+            self.sessions = SessionStore(
+                app_config.contexts_dir, self.current_storage, self.stats_storage, app_config.max_sessions
+            )
+
+        # История статистики сохраняется, если не изменились папка и срок хранения
+        history_config = app_config.stats_history or StatsHistoryConfig()
+        self.stats_history: Optional[StatsHistory] = None
+        if history_config.enabled:
+            previous_history = previous.stats_history if previous is not None else None
+            history_dir = Path(app_config.stats_dir) / TIMESERIES_DIR_NAME
+            if (
+                previous_history is not None
+                and previous_history.directory == history_dir
+                and previous_history.retention_days == history_config.retention_days
+            ):
+                self.stats_history = previous_history
+            else:
+                self.stats_history = StatsHistory(history_dir, history_config.retention_days)
+
+        # Кэш ответов сохраняется, если его параметры и папка не изменились
+        self.response_cache: Optional[ResponseCache] = None
+        if app_config.cache is not None and app_config.cache.enabled:
+            previous_cache = previous.response_cache if previous is not None else None
+            if (
+                previous_cache is not None
+                and previous_cache.config == app_config.cache
+                and previous_cache.directory == Path(app_config.stats_dir)
+            ):
+                self.response_cache = previous_cache
+            else:
+                self.response_cache = ResponseCache(app_config.cache, app_config.stats_dir)
+        self.completion_service = CompletionService(
+            self.router, self.response_cache, app_config.coalescing, passthrough=app_config.response_passthrough
+        )
+
+        # Исполнитель заданий сохраняется, если не изменилась папка: выполняющиеся задания
+        # продолжают работу и отправляют следующие запросы через сервисы нового контейнера
+        batch_dir = Path(app_config.stats_dir) / BATCHES_DIR_NAME
+        batch_config = app_config.batch or BatchConfig()
+        previous_runner = previous.batch_runner if previous is not None else None
+        if previous_runner is not None and previous_runner.directory == batch_dir:
+            self.batch_runner = previous_runner
+            self.batch_runner.config = batch_config
+            self.batch_runner.completion_service = self.completion_service
+            self.batch_runner.stats_history = self.stats_history
+        else:
+            self.batch_runner = BatchRunner(batch_dir, batch_config, self.completion_service, self.stats_history)
+
+    @staticmethod
+    def _reuse(previous: Optional["ServiceContainer"], name: str, dir_attr: str, directory: Path):
+        """Вернуть хранилище предыдущего контейнера, если оно работает с той же папкой"""
+        if previous is None:
+            return None
+        storage = getattr(previous, name)
+        if getattr(storage, dir_attr) == Path(directory):
+            return storage
+        return None
+
+    @property
+    def llm_client(self) -> LLMClient:
+        """Клиент основного провайдера"""
+        return self.router.primary.client
+
+    @classmethod
+    def create(cls, config_path: Path, previous: Optional["ServiceContainer"] = None) -> "ServiceContainer":
+        """Создать контейнер, загрузив конфигурацию из файла"""
+        return cls(ConfigManager(config_path), previous=previous)
+
+    async def start(self):
+        """Запустить сервисы (создать пулы соединений к LLM провайдерам)"""
+        await self.router.start()
+
+    async def aclose(self):
+        """Остановить сервисы"""
+        await self.batch_runner.aclose()
+        await self.completion_service.aclose()
+        await self.router.aclose()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if isinstance(self.context_storage, SQLiteContextStorage):
+            self.context_storage.close()
+        self.current_storage.close()
+        self.stats_storage.close()
+        self.sessions.close()
+        if self.stats_history is not None:
+            self.stats_history.close()
+        tracer.shutdown()
+
+    async def aclose_when_idle(self, successor: Optional["ServiceContainer"] = None):
+        """
+        Остановить сервисы после завершения запросов, начатых до замены контейнера
+
+        Args:
+            successor: Новый контейнер; переданные ему сервисы не останавливаются
+        """
+        kept = set(id(client) for client in successor.router.clients) if successor is not None else set()
+        retired = [client for client in self.router.clients if id(client) not in kept]
+        for client in retired:
+            await client.wait_idle()
+            await client.aclose()
+        if retired:
+            logger.info(f"Остановлены пулы соединений предыдущего контейнера: {len(retired)}")
+        if successor is None or successor.batch_runner is not self.batch_runner:
+            await self.batch_runner.aclose()
+        await self.completion_service.aclose()
+        if self.response_cache is not None and (
+            successor is None or successor.response_cache is not self.response_cache
+        ):
+            self.response_cache.close()
+        if isinstance(self.context_storage, SQLiteContextStorage) and (
+            successor is None or successor.context_storage is not self.context_storage
+        ):
+            self.context_storage.close()
+        # Файлы автосохранения записываются перед остановкой потоков записи
+        if self.stats_history is not None and (
+            successor is None or successor.stats_history is not self.stats_history
+        ):
+            self.stats_history.close()
+        for name in ("current_storage", "stats_storage", "sessions"):
+            storage = getattr(self, name)
+            if successor is None or getattr(successor, name) is not storage:
+                storage.close()
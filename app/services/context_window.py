@@ -0,0 +1,325 @@
+"""Бюджет токенов контекста: удаление старых сообщений или замена их кратким содержанием"""
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Any
+
+from app.models.chat import ChatCompletionMessage, ChatCompletionRequest
+from app.models.config import ContextWindowConfig
+from app.utils import fastjson
+from app.utils.text_stats import MESSAGE_OVERHEAD_TOKENS, estimate_text_tokens, text_counts
+
+logger = logging.getLogger(__name__)
+
+# Заголовок сообщения с кратким содержанием удаленной части диалога
+SUMMARY_HEADER = "Краткое содержание предыдущей части диалога:"
+# Сглаживание поправки локальной оценки по фактическому prompt_tokens провайдера
+CALIBRATION_ALPHA = 0.2
+# Допустимый диапазон поправки (защита от некорректного usage)
+CALIBRATION_MIN = 0.25
+CALIBRATION_MAX = 4.0
+
+# Запрос краткого содержания: (сообщения, max_tokens) -> текст
+Summarizer = Callable[[List[ChatCompletionMessage], int], Awaitable[str]]
+# Группа сообщений, удаляемых только целиком: [start, end)
+Unit = Tuple[int, int]
+
+
+@dataclass
+class ContextFit:
+    """Результат применения бюджета к запросу"""
+    estimated_tokens: int  # Локальная оценка контекста отправляемого запроса (без поправки)
+    trimmed: int = 0  # Количество удаленных (или замененных кратким содержанием) сообщений
+    summarized: bool = False  # Удаленная часть заменена кратким содержанием
+
+
+def _render_transcript(messages: List[ChatCompletionMessage]) -> str:
+    """Текстовая запись части диалога для запроса краткого содержания"""
+    lines = []
+    for message in messages:
+        if message.tool_calls:
+            calls = "; ".join(f"{call.function.name}({call.function.arguments})" for call in message.tool_calls)
+            lines.append(f"{message.role}: {message.content or ''} [вызов инструментов: {calls}]")
+        elif message.role == "tool":
+            lines.append(f"tool {message.name or message.tool_call_id or ''}: {message.content or ''}")
+        else:
+            lines.append(f"{message.role}: {message.content or ''}")
+    return "\n\n".join(lines)
+
+
+class ContextWindowManager:
+    """
+    Бюджет токенов контекста запроса к провайдеру
+
+    Токены оцениваются локально (общий кэш подсчетов text_counts по хэшу текста,
+    тот же, что дает подсчеты сохраненных контекстов, поэтому при росте диалога
+    считаются только новые сообщения) с поправочным коэффициентом,
+    который уточняется по prompt_tokens ответов провайдера.
+
+    При превышении бюджета:
+    - системные сообщения в начале контекста сохраняются всегда;
+    - сообщение assistant с tool_calls и следующие за ним результаты (role=tool)
+      удаляются только вместе;
+    - последние min_recent_messages сообщений не удаляются;
+    - drop_oldest: удаляется минимальное количество старых сообщений;
+    - summarize: старые сообщения заменяются кратким содержанием. Краткие содержания
+      кэшируются по хэшу удаленной части и строятся инкрементально (предыдущее краткое
+      содержание + новые удаленные сообщения); контекст сокращается до
+      summary_target_ratio бюджета, чтобы одно краткое содержание использовалось
+      в нескольких следующих запросах. При ошибке запроса краткого содержания
+      применяется drop_oldest.
+    """
+
+    def __init__(self, config: ContextWindowConfig, summarizer: Optional[Summarizer] = None):
+        """
+        Args:
+            config: Конфигурация бюджета
+            summarizer: Функция запроса краткого содержания (для политики summarize)
+        """
+        self.config = config
+        self.summarizer = summarizer
+        self.calibration = 1.0
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, "asyncio.Task[str]"] = {}
+        # Статистика
+        self.trimmed_requests = 0
+        self.summaries_created = 0
+        self.summary_cache_hits = 0
+        self.summary_failures = 0
+
+    @property
+    def budget(self) -> int:
+        """Бюджет в единицах локальной оценки (с учетом поправки)"""
+        return int(self.config.max_context_tokens / self.calibration)
+
+    def observe(self, fit: Optional[ContextFit], prompt_tokens: Optional[int]):
+        """
+        Уточнить поправку оценки по фактическому количеству токенов контекста
+
+        Args:
+            fit: Результат fit() для запроса
+            prompt_tokens: prompt_tokens из usage ответа провайдера
+        """
+        if fit is None or not prompt_tokens or fit.estimated_tokens <= 0:
+            return
+        ratio = min(max(prompt_tokens / fit.estimated_tokens, CALIBRATION_MIN), CALIBRATION_MAX)
+        self.calibration += CALIBRATION_ALPHA * (ratio - self.calibration)
+
+    async def fit(self, request: ChatCompletionRequest) -> ContextFit:
+        """
+        Сократить контекст запроса до бюджета (request.messages заменяется)
+
+        Args:
+            request: Запрос к провайдеру (копия запроса клиента)
+
+        Returns:
+            Оценка и результат сокращения
+        """
+        messages = request.messages
+        counts = [text_counts.message(message).tokens for message in messages]
+        tools_tokens = estimate_text_tokens(fastjson.dumps_str(request.tools)) if request.tools else 0
+        total = sum(counts) + tools_tokens
+        budget = self.budget
+        if total <= budget:
+            return ContextFit(total)
+
+        pinned = 0
+        while pinned < len(messages) and messages[pinned].role == "system":
+            pinned += 1
+        units = self._units(messages, pinned)
+        droppable = self._droppable(units)
+        if droppable == 0:
+            logger.warning(
+                "Контекст превышает бюджет токенов (%d > %d), но удалять нечего", total, budget
+            )
+            return ContextFit(total)
+
+        fixed = sum(counts[:pinned]) + tools_tokens
+        # kept[k] - оценка контекста без первых k групп
+        kept = [0] * (len(units) + 1)
+        for index in range(len(units) - 1, -1, -1):
+            start, end = units[index]
+            kept[index] = kept[index + 1] + sum(counts[start:end])
+        kept = [fixed + value for value in kept]
+
+        self.trimmed_requests += 1
+        if self.config.policy == "summarize" and self.summarizer is not None:
+            result = await self._fit_summary(request, units, droppable, kept, pinned, budget)
+            if result is not None:
+                return result
+
+        count = self._min_drop(kept, droppable, budget)
+        start = units[count][0] if count < len(units) else len(messages)
+        request.messages = messages[:pinned] + messages[start:]
+        fit = ContextFit(kept[count], trimmed=start - pinned)
+        if fit.estimated_tokens > budget:
+            logger.warning(
+                "Контекст превышает бюджет токенов после удаления старых сообщений: %d > %d",
+                fit.estimated_tokens, budget
+            )
+        logger.info(
+            "Контекст сокращен по бюджету токенов: удалено сообщений %d (оценка %d -> %d)",
+            fit.trimmed, total, fit.estimated_tokens
+        )
+        return fit
+
+    @staticmethod
+    def _units(messages: List[ChatCompletionMessage], pinned: int) -> List[Unit]:
+        """Группы сообщений после закрепленных: вызов инструментов вместе с результатами"""
+        units: List[Unit] = []
+        index = pinned
+        while index < len(messages):
+            end = index + 1
+            if messages[index].role == "assistant" and messages[index].tool_calls:
+                while end < len(messages) and messages[end].role == "tool":
+                    end += 1
+            units.append((index, end))
+            index = end
+        return units
+
+    def _droppable(self, units: List[Unit]) -> int:
+        """Количество первых групп, которые можно удалить (последние сообщения сохраняются)"""
+        protected = 0
+        recent = 0
+        while protected < len(units) and (protected == 0 or recent < self.config.min_recent_messages):
+            start, end = units[len(units) - 1 - protected]
+            recent += end - start
+            protected += 1
+        return len(units) - protected
+
+    @staticmethod
+    def _min_drop(kept: List[int], droppable: int, limit: float) -> int:
+        """Минимальное количество удаляемых групп, при котором контекст укладывается в limit"""
+        for count in range(droppable + 1):
+            if kept[count] <= limit:
+                return count
+        return droppable
+
+    def _prefix_keys(self, messages: List[ChatCompletionMessage], units: List[Unit], droppable: int) -> List[str]:
+        """Ключи кэша кратких содержаний: keys[k] - хэш первых k групп (keys[0] - пустой префикс)"""
+        digest = hashlib.sha256(self.config.summary_prompt.encode("utf-8"))
+        keys = [digest.hexdigest()]
+        for start, end in units[:droppable]:
+            for message in messages[start:end]:
+                digest.update(hashlib.sha256(message.model_dump_json(exclude_none=True).encode("utf-8")).digest())
+            keys.append(digest.copy().hexdigest())
+        return keys
+
+    async def _fit_summary(
+        self,
+        request: ChatCompletionRequest,
+        units: List[Unit],
+        droppable: int,
+        kept: List[int],
+        pinned: int,
+        budget: int
+    ) -> Optional[ContextFit]:
+        """Заменить старые группы кратким содержанием (None - не удалось, применяется drop_oldest)"""
+        messages = request.messages
+        reserve = self.config.summary_max_tokens + MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(SUMMARY_HEADER)
+        if budget - reserve <= 0:
+            return None
+        keys = self._prefix_keys(messages, units, droppable)
+        minimum = max(self._min_drop(kept, droppable, budget - reserve), 1)
+
+        # Краткое содержание, уже построенное для достаточной части диалога
+        count = next((k for k in range(minimum, droppable + 1) if keys[k] in self._summaries), None)
+        if count is not None:
+            self.summary_cache_hits += 1
+            self._summaries.move_to_end(keys[count])
+            summary = self._summaries[keys[count]]
+        else:
+            target = max(self._min_drop(kept, droppable, budget * self.config.summary_target_ratio - reserve), minimum)
+            try:
+                summary = await self._build_summary(messages, units, keys, target, budget - reserve)
+            except Exception as e:
+                self.summary_failures += 1
+                logger.warning("Не удалось получить краткое содержание контекста, старые сообщения удаляются: %s", e)
+                return None
+            count = target
+
+        start = units[count][0] if count < len(units) else len(messages)
+        summary_message = ChatCompletionMessage(role="system", content=f"{SUMMARY_HEADER}\n{summary}")
+        request.messages = messages[:pinned] + [summary_message] + messages[start:]
+        fit = ContextFit(kept[count] + text_counts.message(summary_message).tokens, trimmed=start - pinned, summarized=True)
+        logger.info(
+            "Контекст сокращен по бюджету токенов: %d сообщений заменены кратким содержанием (оценка %d)",
+            fit.trimmed, fit.estimated_tokens
+        )
+        return fit
+
+    async def _build_summary(
+        self,
+        messages: List[ChatCompletionMessage],
+        units: List[Unit],
+        keys: List[str],
+        target: int,
+        limit: int
+    ) -> str:
+        """
+        Построить краткое содержание первых target групп
+
+        Начинается с самого длинного уже построенного префикса; группы передаются
+        порциями, укладывающимися в limit вместе с предыдущим кратким содержанием.
+        """
+        done = next((k for k in range(target - 1, 0, -1) if keys[k] in self._summaries), 0)
+        summary = self._summaries.get(keys[done]) if done else None
+        while done < target:
+            used = estimate_text_tokens(self.config.summary_prompt) + estimate_text_tokens(summary) + 2 * MESSAGE_OVERHEAD_TOKENS
+            end = done
+            while end < target:
+                start, stop = units[end]
+                size = sum(text_counts.message(message).tokens for message in messages[start:stop])
+                if end > done and used + size > limit:
+                    break
+                used += size
+                end += 1
+            part = messages[units[done][0]:units[end - 1][1]]
+            summary = await self._summarize_once(keys[end], summary, part)
+            done = end
+        return summary
+
+    async def _summarize_once(
+        self,
+        key: str,
+        previous: Optional[str],
+        part: List[ChatCompletionMessage]
+    ) -> str:
+        """Один запрос краткого содержания (одновременные запросы одного префикса объединяются)"""
+        cached = self._summaries.get(key)
+        if cached is not None:
+            return cached
+        task = self._pending.get(key)
+        if task is None:
+            transcript = _render_transcript(part)
+            if previous:
+                transcript = f"{SUMMARY_HEADER}\n{previous}\n\n{transcript}"
+            prompt = [
+                ChatCompletionMessage(role="system", content=self.config.summary_prompt),
+                ChatCompletionMessage(role="user", content=transcript),
+            ]
+            task = asyncio.ensure_future(self.summarizer(prompt, self.config.summary_max_tokens))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        summary = await asyncio.shield(task)
+        if key not in self._summaries:
+            self.summaries_created += 1
+            self._summaries[key] = summary
+            while len(self._summaries) > self.config.summary_cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика бюджета контекста"""
+        return {
+            "max_context_tokens": self.config.max_context_tokens,
+            "policy": self.config.policy,
+            "calibration": round(self.calibration, 3),
+            "trimmed_requests": self.trimmed_requests,
+            "summaries_created": self.summaries_created,
+            "summary_cache_hits": self.summary_cache_hits,
+            "summary_failures": self.summary_failures,
+            "token_cache": text_counts.stats(),
+        }
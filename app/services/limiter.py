@@ -0,0 +1,168 @@
+"""Ограничение количества одновременных запросов к LLM провайдеру"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Deque
+
+from app.models.config import ConcurrencyConfig
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejectedError(Exception):
+    """Запрос отклонен: очередь ожидания провайдера переполнена или время ожидания истекло"""
+
+    def __init__(self, message: str, retry_after: float):
+        """
+        Args:
+            message: Описание причины отказа
+            retry_after: Рекомендуемая задержка перед повтором в секундах
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Семафор с ограниченной FIFO очередью ожидания
+
+    Не более max_concurrency запросов выполняются одновременно, остальные ждут
+    в очереди в порядке поступления. Если очередь заполнена, запрос сразу
+    отклоняется (AdmissionRejectedError), а не накапливается в памяти.
+    Освободившийся слот передается первому ожидающему напрямую, поэтому новые
+    запросы не могут обогнать очередь.
+    """
+
+    def __init__(self, config: ConcurrencyConfig):
+        """
+        Инициализация контроллера
+
+        Args:
+            config: Параметры ограничения
+        """
+        self.config = config
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Средняя длительность удержания слота (EWMA) для оценки Retry-After
+        self._hold_time: Optional[float] = None
+        # Статистика
+        self.total_admitted = 0
+        self.total_queued = 0
+        self.total_waited = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих в очереди"""
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Оценка времени до освобождения места в очереди в секундах (не меньше 1)"""
+        hold_time = self._hold_time if self._hold_time is not None else 1.0
+        estimate = hold_time * (self.queue_depth + 1) / self.config.max_concurrency
+        return float(max(1, math.ceil(estimate)))
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Занять слот, при необходимости дождавшись очереди
+
+        Args:
+            timeout: Максимальное время ожидания в секундах (не больше queue_timeout)
+
+        Returns:
+            Время ожидания в очереди в секундах
+
+        Raises:
+            AdmissionRejectedError: Очередь заполнена или время ожидания истекло
+        """
+        if self.active < self.config.max_concurrency and not self._waiters:
+            self.active += 1
+            self.total_admitted += 1
+            return 0.0
+
+        if len(self._waiters) >= self.config.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejectedError(
+                f"Очередь запросов к провайдеру заполнена ({self.config.max_queue})",
+                self.retry_after()
+            )
+
+        wait_timeout = self.config.queue_timeout if timeout is None else min(timeout, self.config.queue_timeout)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.total_queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max(wait_timeout, 0.0))
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                self.rejected_timeout += 1
+                raise AdmissionRejectedError(
+                    f"Превышено время ожидания в очереди запросов к провайдеру ({wait_timeout:.1f}s)",
+                    self.retry_after()
+                )
+        except BaseException:
+            if self._abandon(waiter):
+                # Слот был передан одновременно с отменой ожидания
+                self.release()
+            raise
+
+        waited = time.monotonic() - start
+        self.total_admitted += 1
+        self.total_waited += 1
+        self.total_wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        return waited
+
+    def _abandon(self, waiter: asyncio.Future) -> bool:
+        """
+        Убрать ожидающего из очереди
+
+        Returns:
+            True, если слот уже был передан ожидающему (он остается занятым)
+        """
+        if waiter.done():
+            return True
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        return False
+
+    def release(self, hold_time: Optional[float] = None):
+        """
+        Освободить слот и передать его первому ожидающему
+
+        Args:
+            hold_time: Длительность удержания слота в секундах (для оценки Retry-After)
+        """
+        if hold_time is not None:
+            self._hold_time = hold_time if self._hold_time is None else 0.8 * self._hold_time + 0.2 * hold_time
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Слот передается ожидающему без уменьшения active
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние очереди и статистика ожидания"""
+        return {
+            "max_concurrency": self.config.max_concurrency,
+            "max_queue": self.config.max_queue,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "total_admitted": self.total_admitted,
+            "total_queued": self.total_queued,
+            "avg_wait_time": self.total_wait_time / self.total_waited if self.total_waited else 0.0,
+            "max_wait_time": self.max_wait_time,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
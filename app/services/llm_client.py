@@ -1,16 +1,61 @@
 """Сервис для работы с LLM провайдером"""
+import asyncio
 import logging
+import random
 import httpx
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable, TypeVar, Union, List
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 
-from app.models.chat import ChatCompletionRequest, ChatCompletionResponse
-from app.models.config import ModelConfig, AppConfig
+from app.models.chat import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionMessage
+from app.models.config import ModelConfig, AppConfig, HttpPoolConfig, RetryConfig
 from app.models.metadata import ResponseMetadata
+from app.observability.tracing import tracer, propagation_headers, httpx_trace_extensions
+from app.services.streaming import ChatCompletionStream
+from app.services.passthrough import RawCompletion
+from app.services.context_window import ContextWindowManager, ContextFit
+from app.services.limiter import AdmissionController, AdmissionRejectedError
+from app.services.rate_limit import RateLimiter, RateReservation, get_rate_limiter
+from app.services.tokens import estimate_request_tokens
+from app.services.canonical import shape_request_data
+from app.utils import fastjson
+from app.utils.text_stats import text_counts
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Распарсить заголовок Retry-After
+    
+    Args:
+        value: Значение заголовка (количество секунд или HTTP-дата)
+    
+    Returns:
+        Задержка в секундах или None, если заголовок отсутствует или некорректен
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def describe_error(error: Exception) -> str:
+    """Краткое описание ошибки запроса к провайдеру для логов"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code}"
+    return f"{type(error).__name__}: {str(error)}"
+
 
 class LLMClient:
     """Клиент для работы с LLM провайдером"""
@@ -23,10 +68,58 @@ class LLMClient:
             model_config: Конфигурация модели
             app_config: Конфигурация приложения (опционально, для переопределения параметров модели)
         """
-        self.model_config = model_config
-        self.app_config = app_config
         self.base_url = model_config.provider_url.rstrip('/')
         self.api_key = model_config.api_key
+        # Параметры пула соединений: из app_config, иначе значения по умолчанию
+        self.http_pool = (
+            app_config.http_pool if app_config and app_config.http_pool is not None
+            else HttpPoolConfig()
+        )
+        self._apply_config(model_config, app_config)
+        # Долгоживущий HTTP клиент с пулом соединений (создается в start())
+        self._http_client: Optional[httpx.AsyncClient] = None
+        # Количество выполняющихся запросов (включая открытые потоки)
+        self.in_flight = 0
+    
+    @staticmethod
+    def provider_settings(model_config: ModelConfig, app_config: Optional[AppConfig] = None) -> tuple:
+        """
+        Параметры, при изменении которых необходимо пересоздать пул соединений
+        
+        Args:
+            model_config: Конфигурация модели
+            app_config: Конфигурация приложения
+        
+        Returns:
+            Кортеж (URL провайдера, API ключ, параметры пула)
+        """
+        http_pool = app_config.http_pool if app_config and app_config.http_pool is not None else HttpPoolConfig()
+        return (model_config.provider_url.rstrip('/'), model_config.api_key, http_pool.model_dump())
+    
+    def has_same_provider(self, model_config: ModelConfig, app_config: Optional[AppConfig] = None) -> bool:
+        """Проверить, можно ли использовать текущий пул соединений для новой конфигурации"""
+        return (
+            self.provider_settings(model_config, app_config)
+            == self.provider_settings(self.model_config, self.app_config)
+        )
+    
+    def update_config(self, model_config: ModelConfig, app_config: Optional[AppConfig] = None):
+        """
+        Обновить параметры запросов (модель, температура, max_tokens, таймаут) без пересоздания пула
+        
+        Args:
+            model_config: Конфигурация модели
+            app_config: Конфигурация приложения
+        """
+        if not self.has_same_provider(model_config, app_config):
+            raise ValueError("Изменились параметры провайдера, необходимо создать новый LLMClient")
+        self._apply_config(model_config, app_config)
+        logger.info(f"Параметры LLM клиента обновлены: model={self.default_model}")
+    
+    def _apply_config(self, model_config: ModelConfig, app_config: Optional[AppConfig]):
+        """Применить параметры запросов из конфигурации"""
+        self.model_config = model_config
+        self.app_config = app_config
         self.default_model = model_config.model_name
         # Используем значения из app_config если они есть, иначе из model_config
         self.default_temperature = (
@@ -42,121 +135,600 @@ class LLMClient:
             app_config.timeout if app_config and app_config.timeout is not None
             else 60.0
         )
+        self.canonical_requests = model_config.canonical_requests
+        # Политика повторов: из model_config, иначе одна попытка
+        self.retry_policy = (
+            model_config.retry if model_config.retry is not None
+            else RetryConfig(max_attempts=1)
+        )
+        # Ограничение одновременных запросов: контроллер сохраняется, если параметры не изменились
+        # (занятые слоты прежнего контроллера освобождаются в нем же)
+        current = getattr(self, "admission", None)
+        if model_config.concurrency is None:
+            self.admission: Optional[AdmissionController] = None
+        elif current is None or current.config != model_config.concurrency:
+            self.admission = AdmissionController(model_config.concurrency)
+        # Бюджет контекста: менеджер (с кэшем оценок и кратких содержаний) сохраняется, если параметры не изменились
+        current_window = getattr(self, "context_window", None)
+        if model_config.context_window is None:
+            self.context_window: Optional[ContextWindowManager] = None
+        elif current_window is None or current_window.config != model_config.context_window:
+            self.context_window = ContextWindowManager(model_config.context_window, self._summarize)
+        # Квоты RPM/TPM: ограничитель общий для всех клиентов с тем же URL провайдера и ключом
+        self.rate_limiter: Optional[RateLimiter] = (
+            get_rate_limiter(model_config.provider_url, model_config.api_key, model_config.rate_limit)
+            if model_config.rate_limit is not None else None
+        )
     
-    async def chat_completion(
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """Создать HTTP клиент с пулом keep-alive соединений к провайдеру"""
+        http2 = self.http_pool.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 включен в конфигурации, но пакет h2 не установлен. Используется HTTP/1.1")
+                http2 = False
+        
+        limits = httpx.Limits(
+            max_connections=self.http_pool.max_connections,
+            max_keepalive_connections=self.http_pool.max_keepalive_connections,
+            keepalive_expiry=self.http_pool.keepalive_expiry
+        )
+        logger.info(
+            f"Создание пула соединений к LLM провайдеру: URL={self.base_url}, "
+            f"max_connections={limits.max_connections}, "
+            f"max_keepalive_connections={limits.max_keepalive_connections}, "
+            f"keepalive_expiry={limits.keepalive_expiry}s, http2={http2}"
+        )
+        return httpx.AsyncClient(
+            timeout=self.default_timeout,
+            limits=limits,
+            http2=http2,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+        )
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Получить HTTP клиент (создается при первом обращении, если не был создан в start())"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = self._create_http_client()
+        return self._http_client
+    
+    async def start(self):
+        """Создать пул соединений (вызывается при старте приложения)"""
+        self._get_http_client()
+    
+    async def aclose(self):
+        """Закрыть пул соединений (вызывается при остановке приложения)"""
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+            logger.info(f"Пул соединений к LLM провайдеру закрыт: URL={self.base_url}")
+        self._http_client = None
+    
+    async def wait_idle(self, timeout: Optional[float] = None, poll_interval: float = 0.5):
+        """
+        Дождаться завершения выполняющихся запросов
+        
+        Args:
+            timeout: Максимальное время ожидания в секундах (по умолчанию - таймаут запроса)
+            poll_interval: Интервал проверки в секундах
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+    
+    async def _admit(
         self,
-        request: ChatCompletionRequest,
-        timeout: Optional[float] = None
-    ) -> tuple[ChatCompletionResponse, ResponseMetadata]:
+        request_data: Dict[str, Any],
+        timeout: float
+    ) -> tuple[Optional[AdmissionController], Optional[RateReservation], float]:
         """
-        Отправить запрос к LLM провайдеру
+        Дождаться квоты провайдера (RPM/TPM) и свободного слота (если заданы ограничения)
+        
+        Квота резервируется до занятия слота, чтобы запрос не удерживал слот,
+        ожидая пополнения квоты.
         
         Args:
-            request: Запрос к API
-            timeout: Таймаут запроса в секундах (если None, используется значение из конфигурации)
+            request_data: Данные запроса (для оценки расхода токенов)
+            timeout: Остаток бюджета времени попытки в секундах
         
         Returns:
-            Кортеж (ответ модели, метаданные)
+            Кортеж (контроллер, в котором занят слот, или None; резервирование квоты или None;
+            остаток таймаута попытки)
         """
-        # Применяем значения по умолчанию из конфигурации
+        reservation = None
+        if self.rate_limiter is not None:
+            start = time.monotonic()
+            reservation = await self.rate_limiter.acquire(estimate_request_tokens(request_data), timeout)
+            timeout = max(timeout - (time.monotonic() - start), 0.001)
+        
+        admission = self.admission
+        if admission is None:
+            return None, reservation, timeout
+        try:
+            waited = await admission.acquire(timeout)
+        except BaseException:
+            if reservation is not None:
+                reservation.cancel()
+            raise
+        if waited > 0:
+            logger.debug("Запрос ожидал в очереди провайдера %.2fs: URL=%s", waited, self.base_url)
+        return admission, reservation, max(timeout - waited, 0.001)
+    
+    def _on_status_error(self, error: httpx.HTTPStatusError):
+        """Учесть ответ провайдера с ошибкой (429 - квота провайдера исчерпана)"""
+        if error.response.status_code == 429 and self.rate_limiter is not None:
+            self.rate_limiter.on_rate_limited()
+    
+    @staticmethod
+    def _settle(reservation: Optional[RateReservation], usage: Optional[Dict[str, Any]]):
+        """Уточнить расход квоты токенов по usage ответа"""
+        if reservation is not None and usage:
+            reservation.settle(usage.get("total_tokens"))
+    
+    def _release(self, admission: Optional[AdmissionController] = None, start_time: Optional[float] = None):
+        """Отметить завершение запроса и освободить слот провайдера"""
+        self.in_flight -= 1
+        if admission is not None:
+            admission.release(time.time() - start_time if start_time is not None else None)
+    
+    def apply_defaults(self, request: ChatCompletionRequest):
+        """Применить значения по умолчанию из конфигурации (модель, температура, max_tokens) к запросу"""
         if request.temperature is None:
             request.temperature = self.default_temperature
         if request.max_tokens is None:
             request.max_tokens = self.default_max_tokens
         if not request.model or request.model.strip() == '':
             request.model = self.default_model
+    
+    def _prepare_request(
+        self,
+        request: ChatCompletionRequest,
+        timeout: Optional[float]
+    ) -> tuple[Dict[str, Any], float]:
+        """
+        Применить значения по умолчанию из конфигурации и подготовить данные запроса
+        
+        Args:
+            request: Запрос к API
+            timeout: Таймаут запроса в секундах (если None, используется значение из конфигурации)
+        
+        Returns:
+            Кортеж (данные запроса, таймаут)
+        """
+        # Применяем значения по умолчанию из конфигурации
+        self.apply_defaults(request)
         # Используем timeout из параметра, если передан, иначе из конфигурации
         if timeout is None:
             timeout = self.default_timeout
         
-        # Формируем URL
-        url = f"{self.base_url}/chat/completions"
-        logger.info(f"Отправка запроса к LLM провайдеру: URL={url}, timeout={timeout}s")
-        
-        # Формируем заголовки
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Подготавливаем данные запроса
+        # Подготавливаем данные запроса (в стабильной форме для кэша префиксов провайдера)
         request_data = request.model_dump(exclude_none=True)
-        logger.debug(f"Параметры запроса: model={request_data.get('model')}, max_tokens={request_data.get('max_tokens')}, temperature={request_data.get('temperature')}")
-        logger.debug(f"Количество сообщений: {len(request_data.get('messages', []))}")
-        
-        # Засекаем время начала запроса
-        start_time = time.time()
-        
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                logger.debug(f"Выполнение POST запроса к {url}")
-                response = await client.post(
-                    url,
-                    headers=headers,
-                    json=request_data
-                )
-                
-                # Проверяем статус ответа
-                response.raise_for_status()
-                
-                # Парсим ответ
-                response_data = response.json()
-                
-                # Время получения ответа (приблизительно - время до первого токена)
-                time_to_first_token = time.time() - start_time
-        except httpx.TimeoutException as e:
-            elapsed = time.time() - start_time
+        if self.canonical_requests:
+            shape_request_data(request_data)
+        logger.debug(
+            "Параметры запроса: model=%s, max_tokens=%s, temperature=%s",
+            request_data.get('model'), request_data.get('max_tokens'), request_data.get('temperature')
+        )
+        logger.debug("Количество сообщений: %d", len(request_data.get('messages', [])))
+        return request_data, timeout
+    
+    def _log_request_error(self, e: httpx.RequestError, url: str, timeout: float, start_time: float):
+        """Залогировать ошибку запроса к LLM провайдеру"""
+        elapsed = time.time() - start_time
+        if isinstance(e, httpx.TimeoutException):
             logger.error(
                 f"Таймаут подключения к LLM провайдеру: "
                 f"URL={url}, timeout={timeout}s, elapsed={elapsed:.2f}s, "
                 f"error_type={type(e).__name__}, error={str(e)}"
             )
-            raise
-        except httpx.ConnectError as e:
-            elapsed = time.time() - start_time
+        elif isinstance(e, httpx.ConnectError):
             logger.error(
                 f"Ошибка подключения к LLM провайдеру: "
                 f"URL={url}, elapsed={elapsed:.2f}s, "
                 f"error_type={type(e).__name__}, error={str(e)}, "
                 f"request_url={getattr(e.request, 'url', 'N/A') if hasattr(e, 'request') else 'N/A'}"
             )
-            raise
-        except httpx.RequestError as e:
-            elapsed = time.time() - start_time
+        else:
             logger.error(
                 f"Ошибка запроса к LLM провайдеру: "
                 f"URL={url}, elapsed={elapsed:.2f}s, "
                 f"error_type={type(e).__name__}, error={str(e)}, "
                 f"request_url={getattr(e.request, 'url', 'N/A') if hasattr(e, 'request') else 'N/A'}"
             )
-            raise
+    
+    def _is_retryable(self, error: Exception) -> bool:
+        """Проверить, можно ли повторить запрос после ошибки"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in self.retry_policy.retry_statuses
+        return isinstance(error, httpx.TransportError)
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Рассчитать задержку перед повторной попыткой
+        
+        Args:
+            attempt: Номер неудачной попытки (начиная с 1)
+            error: Ошибка неудачной попытки
+        
+        Returns:
+            Задержка в секундах
+        """
+        policy = self.retry_policy
+        delay = min(policy.backoff_base * policy.backoff_multiplier ** (attempt - 1), policy.backoff_max)
+        if policy.jitter == "full":
+            delay = random.uniform(0, delay)
+        elif policy.jitter == "equal":
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        
+        # Retry-After от провайдера имеет приоритет над расчетной задержкой
+        if policy.respect_retry_after and isinstance(error, httpx.HTTPStatusError):
+            retry_after = parse_retry_after(error.response.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, policy.retry_after_max))
+        return delay
+    
+    async def _with_retry(
+        self,
+        send: Callable[[float], Awaitable[T]],
+        deadline: float,
+        max_attempts: Optional[int] = None
+    ) -> T:
+        """
+        Выполнить запрос с повторными попытками в пределах общего бюджета времени
+        
+        Каждая попытка получает в качестве таймаута остаток бюджета, а повтор не
+        выполняется, если задержка перед ним не укладывается в бюджет.
+        
+        Args:
+            send: Функция выполнения одной попытки (принимает таймаут попытки)
+            deadline: Момент окончания бюджета времени (time.monotonic())
+            max_attempts: Максимальное количество попыток (по умолчанию из политики повторов)
+        
+        Returns:
+            Результат успешной попытки
+
+        Raises:
+            Ошибка последней попытки; в ее атрибуте attempts - количество запросов,
+            отправленных провайдеру (учитывается в метаданных при переключении провайдера)
+        """
+        if max_attempts is None:
+            max_attempts = self.retry_policy.max_attempts
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                error = httpx.TimeoutException("Исчерпан бюджет времени запроса к LLM провайдеру")
+                error.attempts = attempt - 1
+                raise error
+            try:
+                return await send(remaining)
+            except AdmissionRejectedError as e:
+                # Запрос не допущен к провайдеру
+                e.attempts = attempt - 1
+                raise
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                e.attempts = attempt
+                if attempt >= max_attempts or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    logger.warning(f"Повтор запроса к LLM провайдеру не выполнен: задержка {delay:.2f}s превышает остаток бюджета времени")
+                    raise
+                logger.warning(
+                    f"Повтор запроса к LLM провайдеру через {delay:.2f}s: "
+                    f"URL={self.base_url}, attempt={attempt}/{max_attempts}, error={describe_error(e)}"
+                )
+                await asyncio.sleep(delay)
+    
+    def _deadline(self, timeout: Optional[float], deadline: Optional[float]) -> float:
+        """Момент окончания бюджета времени запроса (time.monotonic())"""
+        if deadline is not None:
+            return deadline
+        return time.monotonic() + (timeout if timeout is not None else self.default_timeout)
+    
+    async def chat_completion(
+        self,
+        request: ChatCompletionRequest,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        passthrough: bool = False,
+        fit_context: bool = True
+    ) -> tuple[Union[ChatCompletionResponse, RawCompletion], ResponseMetadata]:
+        """
+        Отправить запрос к LLM провайдеру
+        
+        Args:
+            request: Запрос к API
+            timeout: Общий бюджет времени запроса с учетом повторов в секундах
+                (если None, используется значение из конфигурации)
+            deadline: Момент окончания бюджета времени (time.monotonic()), приоритет над timeout
+            max_attempts: Максимальное количество попыток (по умолчанию из политики повторов)
+            passthrough: Вернуть исходное тело ответа (RawCompletion) без валидации моделью ответа
+            fit_context: Применить бюджет токенов контекста (если он настроен)
+        
+        Returns:
+            Кортеж (ответ модели, метаданные)
+        """
+        fit = await self._fit_context(request) if fit_context else None
+        request_data, timeout = self._prepare_request(request, timeout)
+        # Тело запроса сериализуется один раз для всех попыток
+        body = fastjson.dumps(request_data)
+        deadline = self._deadline(timeout, deadline)
+        attempts = 0
+        
+        async def send(attempt_timeout: float):
+            nonlocal attempts
+            attempts += 1
+            return await self._post(request_data, body, attempt_timeout)
+        
+        raw, start_time, time_to_first_token = await self._with_retry(send, deadline, max_attempts)
         
         # Время завершения запроса
         end_time = time.time()
         total_time = end_time - start_time
         latency = time_to_first_token
         
-        # Парсим ответ
-        chat_response = ChatCompletionResponse(**response_data)
+        # Парсим ответ (в режиме passthrough только JSON, без модели ответа)
+        with tracer.start_span("response.parse", passthrough=passthrough):
+            data = raw.data
+            chat_response = raw if passthrough else ChatCompletionResponse.model_validate(data)
         
         # Извлекаем метаданные
-        metadata = self._extract_metadata(
-            chat_response,
+        with tracer.start_span("metadata.extract"):
+            metadata = self._extract_metadata(
+                chat_response,
+                start_time,
+                latency,
+                time_to_first_token,
+                total_time
+            )
+        metadata.attempts = attempts
+        if fit is not None:
+            metadata.context_trimmed = fit.trimmed
+            self.context_window.observe(fit, metadata.context_tokens)
+        
+        return chat_response, metadata
+    
+    async def _fit_context(self, request: ChatCompletionRequest) -> Optional[ContextFit]:
+        """Сократить контекст запроса до бюджета токенов модели (None - бюджет не настроен)"""
+        if self.context_window is None:
+            return None
+        with tracer.start_span("context.fit", messages=len(request.messages)) as span:
+            fit = await self.context_window.fit(request)
+            span.set_attribute("context.estimated_tokens", fit.estimated_tokens)
+            span.set_attribute("context.trimmed", fit.trimmed)
+        return fit
+    
+    async def _summarize(self, messages: List[ChatCompletionMessage], max_tokens: int) -> str:
+        """
+        Запросить у провайдера краткое содержание части диалога (для бюджета контекста)
+        
+        Args:
+            messages: Сообщения запроса краткого содержания
+            max_tokens: Максимальная длина краткого содержания
+        
+        Returns:
+            Текст краткого содержания
+        """
+        request = ChatCompletionRequest(messages=messages, max_tokens=max_tokens, temperature=0)
+        with tracer.start_span("context.summarize"):
+            response, metadata = await self.chat_completion(request, fit_context=False)
+        content = response.choices[0].message.content if response.choices and response.choices[0].message else None
+        if not content:
+            raise ValueError("Провайдер вернул пустое краткое содержание")
+        logger.info(
+            "Получено краткое содержание контекста: context_tokens=%d, response_tokens=%d",
+            metadata.context_tokens, metadata.response_tokens
+        )
+        return content
+    
+    async def _post(
+        self,
+        request_data: Dict[str, Any],
+        body: bytes,
+        timeout: float
+    ) -> tuple[RawCompletion, float, float]:
+        """
+        Выполнить одну попытку запроса без streaming
+        
+        Args:
+            request_data: Данные запроса (для оценки расхода квоты)
+            body: Сериализованное тело запроса
+            timeout: Таймаут попытки
+        
+        Returns:
+            Кортеж (тело ответа, время начала попытки, время до получения ответа)
+        """
+        # Формируем URL
+        url = f"{self.base_url}/chat/completions"
+        
+        # Запрос учитывается в нагрузке провайдера и во время ожидания квоты и очереди
+        self.in_flight += 1
+        try:
+            with tracer.start_span("upstream.queue"):
+                admission, reservation, timeout = await self._admit(request_data, timeout)
+        except BaseException:
+            self._release()
+            raise
+        logger.info("Отправка запроса к LLM провайдеру: URL=%s, timeout=%.1fs", url, timeout)
+        
+        # Засекаем время начала запроса
+        start_time = time.time()
+        
+        try:
+            client = self._get_http_client()
+            logger.debug("Выполнение POST запроса к %s", url)
+            with tracer.start_span("upstream.request", **{"http.url": url}) as span:
+                response = await client.post(
+                    url,
+                    content=body,
+                    timeout=timeout,
+                    headers=propagation_headers(),
+                    extensions=httpx_trace_extensions()
+                )
+                span.set_attribute("http.status_code", response.status_code)
+                
+                # Проверяем статус ответа
+                response.raise_for_status()
+            
+            # Время получения ответа (без streaming ответ приходит целиком)
+            time_to_first_token = time.time() - start_time
+            raw = RawCompletion(response.content)
+            if reservation is not None:
+                self._settle(reservation, raw.data.get("usage"))
+        except httpx.HTTPStatusError as e:
+            self._on_status_error(e)
+            raise
+        except httpx.RequestError as e:
+            self._log_request_error(e, url, timeout, start_time)
+            raise
+        finally:
+            self._release(admission, start_time)
+        
+        return raw, start_time, time_to_first_token
+    
+    async def chat_completion_stream(
+        self,
+        request: ChatCompletionRequest,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        record_events: bool = False
+    ) -> ChatCompletionStream:
+        """
+        Отправить streaming запрос к LLM провайдеру
+        
+        Метод возвращается после получения заголовков ответа, поэтому ошибки
+        провайдера (HTTPStatusError, RequestError) выбрасываются до начала передачи
+        данных клиенту, а повторные попытки выполняются только до начала потока.
+        Поток необходимо закрыть через aclose().
+        
+        Args:
+            request: Запрос к API (stream=True)
+            timeout: Общий бюджет времени запроса с учетом повторов в секундах
+                (если None, используется значение из конфигурации)
+            deadline: Момент окончания бюджета времени (time.monotonic()), приоритет над timeout
+            max_attempts: Максимальное количество попыток (по умолчанию из политики повторов)
+            record_events: Сохранять исходные SSE события в потоке (для кэширования ответа)
+        
+        Returns:
+            Поток SSE событий провайдера
+        """
+        request.stream = True
+        # Запрашиваем usage в последнем чанке, если клиент не указал stream_options сам
+        suppress_usage_chunk = request.stream_options is None
+        if suppress_usage_chunk:
+            request.stream_options = {"include_usage": True}
+        fit = await self._fit_context(request)
+        request_data, timeout = self._prepare_request(request, timeout)
+        body = fastjson.dumps(request_data)
+        deadline = self._deadline(timeout, deadline)
+        
+        attempts = 0
+        
+        async def send(attempt_timeout: float):
+            nonlocal attempts
+            attempts += 1
+            return await self._open_stream(request_data, body, attempt_timeout)
+        
+        response, start_time, admission, reservation = await self._with_retry(send, deadline, max_attempts)
+        
+        # Запрос считается выполняющимся (и занимает слот провайдера) до закрытия потока
+        stream = ChatCompletionStream(
+            response,
             start_time,
-            latency,
-            time_to_first_token,
-            total_time
+            self._extract_metadata,
+            suppress_usage_chunk=suppress_usage_chunk,
+            on_close=lambda: self._release(admission, start_time),
+            record_events=record_events
         )
+        stream.attempts = attempts
+        if reservation is not None:
+            stream.add_close_callback(lambda: self._settle(reservation, stream.accumulator.usage))
+        if fit is not None:
+            stream.context_trimmed = fit.trimmed
+            stream.add_close_callback(
+                lambda: self.context_window.observe(fit, (stream.accumulator.usage or {}).get("prompt_tokens"))
+            )
+        return stream
+    
+    async def _open_stream(
+        self,
+        request_data: Dict[str, Any],
+        body: bytes,
+        timeout: float
+    ) -> tuple[httpx.Response, float, Optional[AdmissionController], Optional[RateReservation]]:
+        """
+        Выполнить одну попытку открытия streaming запроса
         
-        return chat_response, metadata
+        Returns:
+            Кортеж (открытый ответ, время начала попытки, контроллер занятого слота, резервирование квоты)
+        """
+        url = f"{self.base_url}/chat/completions"
+        
+        self.in_flight += 1
+        try:
+            with tracer.start_span("upstream.queue"):
+                admission, reservation, timeout = await self._admit(request_data, timeout)
+        except BaseException:
+            self._release()
+            raise
+        logger.info("Отправка streaming запроса к LLM провайдеру: URL=%s, timeout=%.1fs", url, timeout)
+        
+        start_time = time.time()
+        
+        try:
+            client = self._get_http_client()
+            # Спан до получения заголовков; чтение тела учитывается спаном http.receive_response_body
+            with tracer.start_span("upstream.request", **{"http.url": url, "stream": True}) as span:
+                http_request = client.build_request(
+                    "POST",
+                    url,
+                    content=body,
+                    timeout=timeout,
+                    headers=propagation_headers(),
+                    extensions=httpx_trace_extensions()
+                )
+                response = await client.send(http_request, stream=True)
+                span.set_attribute("http.status_code", response.status_code)
+                if response.is_error:
+                    # Читаем тело ошибки, чтобы оно было доступно в HTTPStatusError
+                    await response.aread()
+                    await response.aclose()
+                    response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            self._release(admission, start_time)
+            self._on_status_error(e)
+            raise
+        except httpx.RequestError as e:
+            self._release(admission, start_time)
+            self._log_request_error(e, url, timeout, start_time)
+            raise
+        except BaseException:
+            # Отмена задачи (например, проигравший hedged запрос)
+            self._release(admission, start_time)
+            raise
+        
+        return response, start_time, admission, reservation
     
     def _extract_metadata(
         self,
-        response: ChatCompletionResponse,
+        response: Union[ChatCompletionResponse, RawCompletion],
         start_time: float,
         latency: float,
         time_to_first_token: float,
-        total_time: float
+        total_time: float,
+        inter_token_latency: Optional[float] = None,
+        generation_time: Optional[float] = None,
+        chunk_count: Optional[int] = None
     ) -> ResponseMetadata:
         """
         Извлечь метаданные из ответа
@@ -167,6 +739,9 @@ class LLMClient:
             latency: Задержка до начала ответа
             time_to_first_token: Время до первого токена
             total_time: Общее время выполнения
+            inter_token_latency: Средняя задержка между чанками (только для streaming)
+            generation_time: Время от первого до последнего чанка (только для streaming)
+            chunk_count: Количество чанков с токенами (только для streaming)
         
         Returns:
             Метаданные ответа
@@ -176,16 +751,20 @@ class LLMClient:
         
         # Извлекаем content из первого choice
         content = ""
-        if response.choices and response.choices[0].message:
+        if isinstance(response, RawCompletion):
+            content = response.content or ""
+        elif response.choices and response.choices[0].message:
             content = response.choices[0].message.content or ""
         
         # Подсчитываем статистику
-        response_tokens = usage.completion_tokens if usage else 0
+        response_tokens = usage.completion_tokens if usage else (chunk_count or 0)
         context_tokens = usage.prompt_tokens if usage else 0
+        cached_tokens = usage.cached_tokens if usage else None
         
-        # Подсчет слов и символов
-        response_words = len(content.split()) if content else 0
-        response_characters = len(content) if content else 0
+        # Подсчет слов и символов (кэш по хэшу: тот же текст затем сохраняется в контексте)
+        counts = text_counts.text(content)
+        response_words = counts.words
+        response_characters = counts.characters
         
         # Вычисляем средние значения
         avg_token_length = (
@@ -197,11 +776,14 @@ class LLMClient:
             if response_words > 0 else 0.0
         )
         
-        # Скорость инференса
-        inference_speed = (
-            response_tokens / total_time
-            if total_time > 0 else 0.0
-        )
+        # Скорость инференса: для streaming - по фактическому времени генерации чанков
+        if generation_time:
+            inference_speed = max(response_tokens - 1, 0) / generation_time
+        else:
+            inference_speed = (
+                response_tokens / total_time
+                if total_time > 0 else 0.0
+            )
         
         # Формируем метаданные
         return ResponseMetadata(
@@ -215,6 +797,8 @@ class LLMClient:
             avg_token_length=avg_token_length,
             avg_word_tokens=avg_word_tokens,
             context_tokens=context_tokens,
-            inference_speed=inference_speed
+            cached_tokens=cached_tokens,
+            inference_speed=inference_speed,
+            inter_token_latency=inter_token_latency
         )
 
@@ -0,0 +1,82 @@
+"""Ответ провайдера в режиме passthrough: исходные байты без повторной валидации"""
+from typing import Optional, Dict, Any, List
+
+from pydantic import ValidationError
+
+from app.models.chat import Usage
+from app.utils import fastjson
+
+
+class RawCompletion:
+    """
+    Ответ chat completion в исходном виде
+
+    Тело ответа передается клиенту без изменений (сохраняются поля провайдера,
+    неизвестные модели ChatCompletionResponse: reasoning_content, system_fingerprint,
+    logprobs и т.п.). Для метаданных и автосохранения извлекаются только usage и
+    content/tool_calls первого варианта ответа; JSON разбирается при первом обращении.
+    """
+
+    __slots__ = ("body", "_data")
+
+    def __init__(self, body: bytes, data: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            body: Тело ответа провайдера
+            data: Уже разобранное тело (если есть)
+        """
+        self.body = body
+        self._data = data
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any]) -> "RawCompletion":
+        """Ответ из словаря (например, записи кэша ответов)"""
+        return cls(fastjson.dumps(data), data)
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """Разобранное тело ответа"""
+        if self._data is None:
+            self._data = fastjson.loads(self.body)
+        return self._data
+
+    @property
+    def model(self) -> Optional[str]:
+        """Модель, указанная провайдером"""
+        return self.data.get("model")
+
+    @property
+    def usage(self) -> Optional[Usage]:
+        """Использование токенов (None, если провайдер его не вернул или формат некорректен)"""
+        usage = self.data.get("usage")
+        if not isinstance(usage, dict):
+            return None
+        try:
+            return Usage.model_validate(usage)
+        except ValidationError:
+            return None
+
+    @property
+    def has_choices(self) -> bool:
+        """В ответе есть варианты ответа"""
+        return bool(self.data.get("choices"))
+
+    def _message(self) -> Dict[str, Any]:
+        """Сообщение первого варианта ответа"""
+        choices = self.data.get("choices")
+        if not choices or not isinstance(choices[0], dict):
+            return {}
+        message = choices[0].get("message")
+        return message if isinstance(message, dict) else {}
+
+    @property
+    def content(self) -> Optional[str]:
+        """content первого варианта ответа"""
+        content = self._message().get("content")
+        return content if isinstance(content, str) else None
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """tool_calls первого варианта ответа в исходном виде"""
+        tool_calls = self._message().get("tool_calls")
+        return tool_calls if isinstance(tool_calls, list) else []
@@ -0,0 +1,228 @@
+"""Ограничение частоты запросов к LLM провайдеру по квотам RPM и TPM"""
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any
+
+from app.models.config import RateLimitConfig
+from app.services.limiter import AdmissionRejectedError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ведро токенов с равномерным пополнением
+
+    Резервирование списывает токены сразу (баланс может стать отрицательным) и
+    возвращает время, через которое баланс восстановится. Поэтому запросы
+    распределяются во времени равномерно, а не отправляются пачкой до исчерпания квоты.
+    """
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute: Квота в минуту (она же емкость ведра)
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def configure(self, per_minute: float):
+        """Изменить квоту, сохранив текущий баланс (в пределах новой емкости)"""
+        self._refill()
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self):
+        """Пополнить ведро за прошедшее время"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Время в секундах, через которое можно списать amount токенов"""
+        self._refill()
+        # Запрос больше емкости ведра ждет только полного ведра
+        amount = min(amount, self.capacity)
+        deficit = amount - self.tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def consume(self, amount: float):
+        """Списать токены (баланс может стать отрицательным)"""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        """Вернуть токены (или списать, если amount отрицательный)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        """Обнулить баланс (провайдер сообщил о превышении квоты)"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateReservation:
+    """Зарезервированная квота одного запроса"""
+
+    def __init__(self, limiter: "RateLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+
+    def settle(self, actual_tokens: Optional[int]):
+        """
+        Уточнить расход токенов по usage ответа
+
+        Args:
+            actual_tokens: Фактическое количество токенов (None - оставить оценку)
+        """
+        if actual_tokens is None or self.limiter.tpm is None:
+            return
+        self.limiter.tpm.refund(self.tokens - actual_tokens)
+        self.limiter.estimate_error += actual_tokens - self.tokens
+        self.tokens = actual_tokens
+
+    def cancel(self):
+        """Вернуть квоту запроса, который не был отправлен"""
+        self.limiter.release(self)
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов по квотам провайдера
+
+    Общий для всех клиентов с одинаковыми URL провайдера и API ключом, так как
+    квоты RPM и TPM провайдер считает по ключу.
+    """
+
+    def __init__(self, config: RateLimitConfig):
+        """
+        Args:
+            config: Квоты провайдера
+        """
+        self.config = config
+        self.rpm: Optional[TokenBucket] = None
+        self.tpm: Optional[TokenBucket] = None
+        self.configure(config)
+        # Статистика
+        self.total_requests = 0
+        self.total_throttled = 0
+        self.total_wait_time = 0.0
+        self.total_rejected = 0
+        self.estimate_error = 0
+
+    def configure(self, config: RateLimitConfig):
+        """Применить квоты (баланс существующих ведер сохраняется)"""
+        self.config = config
+        self.rpm = self._bucket(self.rpm, config.requests_per_minute)
+        self.tpm = self._bucket(self.tpm, config.tokens_per_minute)
+
+    @staticmethod
+    def _bucket(bucket: Optional[TokenBucket], per_minute: Optional[int]) -> Optional[TokenBucket]:
+        """Создать, обновить или удалить ведро"""
+        if per_minute is None:
+            return None
+        if bucket is None:
+            return TokenBucket(per_minute)
+        bucket.configure(per_minute)
+        return bucket
+
+    async def acquire(self, tokens: int, timeout: Optional[float] = None) -> RateReservation:
+        """
+        Зарезервировать квоту запроса, дождавшись ее пополнения
+
+        Args:
+            tokens: Оценка расхода токенов запроса
+            timeout: Максимальное время ожидания в секундах (не больше max_wait)
+
+        Returns:
+            Резервирование (уточняется по usage через settle())
+
+        Raises:
+            AdmissionRejectedError: Квота не восстановится за допустимое время ожидания
+        """
+        wait = max(
+            self.rpm.wait_time(1) if self.rpm else 0.0,
+            self.tpm.wait_time(tokens) if self.tpm else 0.0
+        )
+        max_wait = self.config.max_wait if timeout is None else min(timeout, self.config.max_wait)
+        if wait > max_wait:
+            self.total_rejected += 1
+            raise AdmissionRejectedError(
+                f"Квота провайдера исчерпана: ожидание {wait:.1f}s превышает допустимое ({max_wait:.1f}s)",
+                wait
+            )
+
+        reservation = RateReservation(self, tokens)
+        if self.rpm:
+            self.rpm.consume(1)
+        if self.tpm:
+            self.tpm.consume(tokens)
+        self.total_requests += 1
+        if wait > 0:
+            self.total_throttled += 1
+            self.total_wait_time += wait
+            logger.debug("Запрос отложен на %.2fs до восстановления квоты провайдера", wait)
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                reservation.cancel()
+                raise
+        return reservation
+
+    def release(self, reservation: RateReservation):
+        """Вернуть квоту неотправленного запроса"""
+        if self.rpm:
+            self.rpm.refund(1)
+        if self.tpm:
+            self.tpm.refund(reservation.tokens)
+
+    def on_rate_limited(self):
+        """Провайдер вернул 429: прекратить отправку до пополнения квоты"""
+        for bucket in (self.rpm, self.tpm):
+            if bucket is not None:
+                bucket.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        """Остаток квот и статистика ожидания"""
+        return {
+            "requests_per_minute": self.config.requests_per_minute,
+            "tokens_per_minute": self.config.tokens_per_minute,
+            "available_requests": self.rpm.tokens if self.rpm else None,
+            "available_tokens": self.tpm.tokens if self.tpm else None,
+            "total_requests": self.total_requests,
+            "total_throttled": self.total_throttled,
+            "total_wait_time": self.total_wait_time,
+            "total_rejected": self.total_rejected,
+            "estimate_error_tokens": self.estimate_error,
+        }
+
+
+# Ограничители по (URL провайдера, API ключ): квота общая для всех моделей ключа
+_limiters: Dict[tuple, RateLimiter] = {}
+
+
+def get_rate_limiter(provider_url: str, api_key: str, config: RateLimitConfig) -> RateLimiter:
+    """
+    Получить общий ограничитель для провайдера и ключа
+
+    Args:
+        provider_url: URL провайдера
+        api_key: API ключ
+        config: Квоты провайдера (применяются к существующему ограничителю)
+
+    Returns:
+        Ограничитель частоты запросов
+    """
+    key = (provider_url.rstrip('/'), api_key)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = RateLimiter(config)
+        _limiters[key] = limiter
+    elif limiter.config != config:
+        limiter.configure(config)
+    return limiter
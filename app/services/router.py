@@ -0,0 +1,708 @@
+"""Маршрутизация запросов между несколькими LLM провайдерами"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Iterable, Callable, Awaitable, TypeVar, Deque, Union
+
+import httpx
+
+from app.config.manager import ConfigManager
+from app.models.chat import ChatCompletionRequest, ChatCompletionResponse
+from app.models.config import ProviderConfig, RoutingConfig, HedgingConfig
+from app.models.metadata import ResponseMetadata
+from app.services.llm_client import LLMClient, describe_error
+from app.services.limiter import AdmissionRejectedError
+from app.services.streaming import ChatCompletionStream
+from app.services.tokens import estimate_messages_tokens
+from app.services.passthrough import RawCompletion
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Количество последних измерений задержки, хранимых для расчета порога hedged запросов
+LATENCY_HISTORY_SIZE = 256
+
+
+class NoUpstreamAvailableError(Exception):
+    """Нет доступного провайдера для запроса"""
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    Проверить, является ли ошибка отказом провайдера (а не ошибкой в запросе клиента)
+
+    Отказом считаются сетевые ошибки, 429 и 5xx.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, httpx.RequestError)
+
+
+class Upstream:
+    """Провайдер в пуле: клиент с собственным пулом соединений и состоянием здоровья"""
+
+    def __init__(self, entry: ProviderConfig, client: LLMClient):
+        """
+        Инициализация провайдера
+
+        Args:
+            entry: Параметры провайдера в пуле
+            client: Клиент провайдера
+        """
+        self.client = client
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+        # Токены контекста ответов, в которых провайдер сообщает об использовании кэша префиксов
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        # История задержек до первого токена отдельно для обычных и streaming запросов
+        self.latency_history: Dict[bool, Deque[float]] = {
+            False: deque(maxlen=LATENCY_HISTORY_SIZE),
+            True: deque(maxlen=LATENCY_HISTORY_SIZE),
+        }
+        self.apply_entry(entry)
+
+    def apply_entry(self, entry: ProviderConfig):
+        """Применить параметры провайдера в пуле (имя, вес, псевдонимы)"""
+        self.name = entry.name
+        self.weight = entry.weight
+        self.aliases = set(entry.aliases)
+
+    @property
+    def model_name(self) -> str:
+        """Название модели провайдера"""
+        return self.client.default_model
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся запросов"""
+        return self.client.in_flight
+
+    def model_names(self) -> set:
+        """Все имена, по которым запрос может быть направлен этому провайдеру"""
+        return {self.model_name, self.name} | self.aliases
+
+    def is_equivalent(self, other: "Upstream") -> bool:
+        """Провайдеры эквивалентны, если у них общее название модели или псевдоним"""
+        return bool(({self.model_name} | self.aliases) & ({other.model_name} | other.aliases))
+
+    def is_healthy(self, now: float) -> bool:
+        """Провайдер доступен (не исключен после серии ошибок)"""
+        return now >= self.unhealthy_until
+
+    def record_success(self, latency: float, alpha: float, stream: bool = False):
+        """Учесть успешный запрос"""
+        self.latency_history[stream].append(latency)
+        self.total_requests += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def record_prompt_cache(self, metadata: ResponseMetadata):
+        """Учесть использование кэша префиксов провайдера (если провайдер о нем сообщает)"""
+        if metadata.cached_tokens is None:
+            return
+        self.prompt_tokens += metadata.context_tokens
+        self.cached_tokens += metadata.cached_tokens
+
+    def prompt_cache_stats(self) -> Dict[str, Any]:
+        """Доля токенов контекста из кэша префиксов провайдера"""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "hit_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else None,
+        }
+
+    def record_failure(self, routing: RoutingConfig):
+        """Учесть отказ провайдера"""
+        self.total_requests += 1
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= routing.failure_threshold:
+            self.unhealthy_until = time.monotonic() + routing.cooldown
+            logger.warning(
+                f"Провайдер '{self.name}' исключен на {routing.cooldown}s "
+                f"после {self.consecutive_failures} ошибок подряд"
+            )
+
+    def latency_percentile(self, percentile: float, stream: bool) -> Optional[float]:
+        """
+        Перцентиль задержки до первого токена по истории измерений
+
+        Args:
+            percentile: Перцентиль (0-100)
+            stream: Использовать историю streaming запросов
+
+        Returns:
+            Значение перцентиля или None, если измерений нет
+        """
+        history = sorted(self.latency_history[stream])
+        if not history:
+            return None
+        index = min(len(history) - 1, max(0, math.ceil(percentile / 100 * len(history)) - 1))
+        return history[index]
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние провайдера"""
+        return {
+            "name": self.name,
+            "model": self.model_name,
+            "provider_url": self.client.base_url,
+            "weight": self.weight,
+            "aliases": sorted(self.aliases),
+            "in_flight": self.in_flight,
+            "ewma_latency": self.ewma_latency,
+            "healthy": self.is_healthy(time.monotonic()),
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "admission": self.client.admission.stats() if self.client.admission is not None else None,
+            "rate_limit": self.client.rate_limiter.stats() if self.client.rate_limiter is not None else None,
+            "context_window": self.client.context_window.stats() if self.client.context_window is not None else None,
+            "prompt_cache": self.prompt_cache_stats(),
+        }
+
+
+class ProviderRouter:
+    """
+    Маршрутизатор запросов между провайдерами
+
+    Провайдер выбирается по имени модели из запроса (название модели, имя провайдера
+    или псевдоним). Среди эквивалентных провайдеров выбирается провайдер с минимальной
+    EWMA задержкой до первого токена или с минимумом выполняющихся запросов с учетом веса.
+    Запросы без модели направляются провайдерам, эквивалентным основному.
+    """
+
+    def __init__(
+        self,
+        upstreams: List[Upstream],
+        routing: Optional[RoutingConfig] = None,
+        hedging: Optional[HedgingConfig] = None
+    ):
+        """
+        Инициализация маршрутизатора
+
+        Args:
+            upstreams: Провайдеры (первый - основной)
+            routing: Конфигурация маршрутизации
+            hedging: Конфигурация дублирующих запросов
+        """
+        if not upstreams:
+            raise ValueError("Пул провайдеров не может быть пустым")
+        self.upstreams = upstreams
+        self.routing = routing or RoutingConfig()
+        self.hedging = hedging or HedgingConfig()
+        # Статистика дублирующих запросов
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.hedge_wasted_tokens = 0
+
+    @classmethod
+    def from_config(cls, config_manager: ConfigManager, previous: Optional["ProviderRouter"] = None) -> "ProviderRouter":
+        """
+        Создать маршрутизатор по конфигурации
+
+        Провайдеры предыдущего маршрутизатора с теми же именем и параметрами подключения
+        переиспользуются вместе с пулом соединений и накопленной статистикой.
+
+        Args:
+            config_manager: Менеджер конфигурации
+            previous: Предыдущий маршрутизатор (при перезагрузке конфигурации)
+        """
+        app_config = config_manager.app_config
+        previous_upstreams = {u.name: u for u in previous.upstreams} if previous else {}
+        upstreams = []
+        for entry, model_config in config_manager.providers:
+            upstream = previous_upstreams.get(entry.name)
+            if upstream is not None and upstream.client.has_same_provider(model_config, app_config):
+                upstream.client.update_config(model_config, app_config)
+                upstream.apply_entry(entry)
+            else:
+                upstream = Upstream(entry, LLMClient(model_config, app_config))
+            upstreams.append(upstream)
+        router = cls(upstreams, app_config.routing, app_config.hedging)
+        if previous is not None:
+            router.hedges_fired = previous.hedges_fired
+            router.hedges_won = previous.hedges_won
+            router.hedge_wasted_tokens = previous.hedge_wasted_tokens
+        return router
+
+    @property
+    def primary(self) -> Upstream:
+        """Основной провайдер"""
+        return self.upstreams[0]
+
+    @property
+    def clients(self) -> List[LLMClient]:
+        """Клиенты всех провайдеров"""
+        return [upstream.client for upstream in self.upstreams]
+
+    def candidates(self, model: Optional[str]) -> List[Upstream]:
+        """
+        Провайдеры, которым может быть направлен запрос
+
+        Args:
+            model: Имя модели из запроса
+
+        Returns:
+            Список провайдеров (без учета состояния здоровья)
+        """
+        if model and model.strip():
+            matched = [u for u in self.upstreams if model in u.model_names()]
+            if matched:
+                return matched
+            # Неизвестная модель передается основному провайдеру как есть
+            return [self.primary]
+        return [u for u in self.upstreams if u is self.primary or u.is_equivalent(self.primary)]
+
+    def _score(self, upstream: Upstream) -> tuple:
+        """Оценка провайдера (меньше - лучше)"""
+        latency = upstream.ewma_latency or 0.0
+        load = (upstream.in_flight + 1) / upstream.weight
+        if self.routing.strategy == "least_inflight":
+            return (load, latency)
+        # Провайдеры без истории задержек выбираются первыми, чтобы собрать статистику
+        return (latency * load, load)
+
+    def failover_candidates(self, model: Optional[str], failed: Iterable[Upstream]) -> List[Upstream]:
+        """
+        Провайдеры для переключения после отказов
+
+        Помимо эквивалентных провайдеров включает провайдеров, указанных
+        в failover_providers политики повторов отказавших провайдеров.
+
+        Args:
+            model: Имя модели из запроса
+            failed: Отказавшие провайдеры
+
+        Returns:
+            Список провайдеров без отказавших
+        """
+        failed = list(failed)
+        failed_ids = set(id(u) for u in failed)
+        candidates = self.candidates(model)
+        by_name = {u.name: u for u in self.upstreams}
+        for upstream in failed:
+            for name in upstream.client.retry_policy.failover_providers:
+                alternate = by_name.get(name)
+                if alternate is None:
+                    logger.warning(f"Провайдер для переключения '{name}' не найден в пуле")
+                elif alternate not in candidates:
+                    candidates.append(alternate)
+        return [u for u in candidates if id(u) not in failed_ids]
+
+    def select(self, model: Optional[str], exclude: Iterable[Upstream] = ()) -> Upstream:
+        """
+        Выбрать провайдера для запроса
+
+        Args:
+            model: Имя модели из запроса
+            exclude: Провайдеры, которые не следует выбирать (уже отказавшие)
+
+        Returns:
+            Выбранный провайдер
+        """
+        candidates = self.failover_candidates(model, exclude)
+        if not candidates:
+            raise NoUpstreamAvailableError(f"Нет доступного провайдера для модели '{model}'")
+        now = time.monotonic()
+        healthy = [u for u in candidates if u.is_healthy(now)]
+        if not healthy:
+            # Все исключены - пробуем провайдера, который раньше других вернется в строй
+            return min(candidates, key=lambda u: u.unhealthy_until)
+        return min(healthy, key=self._score)
+
+    def _prepare(self, upstream: Upstream, request: ChatCompletionRequest) -> ChatCompletionRequest:
+        """
+        Подготовить копию запроса для провайдера
+
+        Имя провайдера или псевдоним заменяется названием модели провайдера. При переключении
+        на провайдера другой модели (failover_providers) также подставляется его модель.
+        """
+        upstream_request = request.model_copy(deep=True)
+        model = upstream_request.model
+        if model and model != upstream.model_name:
+            if model in upstream.model_names() or upstream not in self.candidates(model):
+                upstream_request.model = upstream.model_name
+        return upstream_request
+
+    def resolve(self, request: ChatCompletionRequest) -> ChatCompletionRequest:
+        """
+        Копия запроса с моделью и параметрами по умолчанию провайдера, которому он будет направлен
+
+        Эквивалентные провайдеры имеют общее название модели, поэтому результат
+        не зависит от выбора конкретного провайдера при балансировке.
+        """
+        upstream = self.candidates(request.model)[0]
+        resolved = self._prepare(upstream, request)
+        upstream.client.apply_defaults(resolved)
+        return resolved
+
+    def _annotate(self, upstream: Upstream, request: ChatCompletionRequest, metadata: ResponseMetadata):
+        """Добавить в метаданные провайдера и модель"""
+        metadata.provider = upstream.name
+        metadata.model = request.model
+
+    async def _execute(
+        self,
+        request: ChatCompletionRequest,
+        timeout: Optional[float],
+        call: Callable[[Upstream, ChatCompletionRequest, float, int], Awaitable[T]],
+        stream: bool = False
+    ) -> tuple[Upstream, ChatCompletionRequest, T]:
+        """
+        Выполнить запрос с переключением на другого провайдера после отказов
+
+        Повторы и переключения укладываются в общий бюджет времени timeout.
+
+        Args:
+            request: Запрос к API
+            timeout: Общий бюджет времени запроса в секундах
+            call: Выполнение запроса к провайдеру (провайдер, запрос, deadline, максимум попыток)
+            stream: Streaming запрос (для выбора истории задержек hedged запросов)
+
+        Returns:
+            Кортеж (провайдер, запрос к провайдеру, результат)
+        """
+        if timeout is None:
+            timeout = self.primary.client.default_timeout
+        deadline = time.monotonic() + timeout
+        failed: List[Upstream] = []
+        failed_attempts = 0
+        last_error: Optional[Exception] = None
+        while True:
+            try:
+                upstream = self.select(request.model, exclude=failed)
+            except NoUpstreamAvailableError:
+                if last_error is not None:
+                    raise last_error
+                raise
+
+            policy = upstream.client.retry_policy
+            has_alternate = len(self.failover_candidates(request.model, failed + [upstream])) > 0
+            max_attempts = (
+                min(policy.failover_after, policy.max_attempts)
+                if policy.failover_after and has_alternate else policy.max_attempts
+            )
+            upstream_request = self._prepare(upstream, request)
+            logger.debug("Запрос направлен провайдеру '%s'", upstream.name)
+            try:
+                upstream, upstream_request, result = await self._call_hedged(
+                    request, upstream, upstream_request, deadline, max_attempts, call, stream, failed
+                )
+            except Exception as e:
+                if isinstance(e, AdmissionRejectedError):
+                    # Переполненная очередь - перегрузка, а не отказ провайдера: здоровье не меняется
+                    if not has_alternate:
+                        raise
+                elif not is_upstream_failure(e):
+                    raise
+                else:
+                    upstream.record_failure(self.routing)
+                if not has_alternate or time.monotonic() >= deadline:
+                    raise
+                logger.warning(f"Переключение с провайдера '{upstream.name}' на другого провайдера после ошибки: {describe_error(e)}")
+                failed.append(upstream)
+                failed_attempts += getattr(e, "attempts", 1)
+                last_error = e
+                continue
+            if failed_attempts:
+                self._account_failover_attempts(result, failed_attempts)
+            return upstream, upstream_request, result
+
+    def _account_failover_attempts(self, result: Any, failed_attempts: int):
+        """Добавить к попыткам ответа попытки провайдеров, от которых запрос был переключен"""
+        if isinstance(result, ChatCompletionStream):
+            result.attempts += failed_attempts
+        else:
+            _, metadata = result
+            metadata.attempts = (metadata.attempts or 0) + failed_attempts
+
+    def hedge_delay(self, upstream: Upstream, stream: bool, deadline: float) -> Optional[float]:
+        """
+        Задержка перед отправкой дублирующего запроса
+
+        Args:
+            upstream: Провайдер основного запроса
+            stream: Streaming запрос
+            deadline: Момент окончания бюджета времени
+
+        Returns:
+            Задержка в секундах или None, если дублирующий запрос не нужен
+        """
+        hedging = self.hedging
+        if not hedging.enabled or len(upstream.latency_history[stream]) < hedging.min_samples:
+            return None
+        delay = max(upstream.latency_percentile(hedging.percentile, stream), hedging.min_delay)
+        if hedging.max_delay is not None:
+            delay = min(delay, hedging.max_delay)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    async def _call_hedged(
+        self,
+        request: ChatCompletionRequest,
+        upstream: Upstream,
+        upstream_request: ChatCompletionRequest,
+        deadline: float,
+        max_attempts: int,
+        call: Callable[[Upstream, ChatCompletionRequest, float, int], Awaitable[T]],
+        stream: bool,
+        failed: List[Upstream]
+    ) -> tuple[Upstream, ChatCompletionRequest, T]:
+        """
+        Выполнить запрос с дублированием, если ответ (или первый чанк потока) задерживается
+
+        Если за время, равное перцентилю истории задержек провайдера, ответ не получен,
+        тот же запрос отправляется эквивалентному провайдеру (или тому же провайдеру).
+        Побеждает первый успешный ответ, проигравший запрос отменяется.
+
+        Returns:
+            Кортеж (провайдер, запрос к провайдеру, результат) победившего запроса
+        """
+        async def attempt(target: Upstream, target_request: ChatCompletionRequest) -> T:
+            result = await call(target, target_request, deadline, max_attempts)
+            if stream:
+                # Для streaming побеждает запрос, первым получивший чанк
+                try:
+                    await result.prefetch()
+                except BaseException:
+                    await result.aclose()
+                    raise
+            return result
+
+        delay = self.hedge_delay(upstream, stream, deadline)
+        if delay is None:
+            return upstream, upstream_request, await call(upstream, upstream_request, deadline, max_attempts)
+
+        primary = asyncio.create_task(attempt(upstream, upstream_request))
+        tasks = {primary: (upstream, upstream_request)}
+        # Запрос, результат (или ошибка) которого возвращается; остальные освобождаются в finally
+        outcome: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                outcome = primary
+                return upstream, upstream_request, primary.result()
+
+            try:
+                hedge_upstream = self.select(request.model, exclude=failed + [upstream])
+            except NoUpstreamAvailableError:
+                hedge_upstream = upstream if self.hedging.allow_same_provider else None
+            if hedge_upstream is None:
+                await asyncio.wait({primary})
+                outcome = primary
+                return upstream, upstream_request, primary.result()
+
+            hedge_request = self._prepare(hedge_upstream, request)
+            self.hedges_fired += 1
+            logger.info(
+                f"Дублирующий запрос провайдеру '{hedge_upstream.name}': "
+                f"нет ответа от '{upstream.name}' за {delay:.2f}s"
+            )
+            hedge = asyncio.create_task(attempt(hedge_upstream, hedge_request))
+            tasks[hedge] = (hedge_upstream, hedge_request)
+
+            pending = set(tasks)
+            winner: Optional[asyncio.Task] = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if winner is None and not task.cancelled() and task.exception() is None:
+                        winner = task
+
+            if winner is None:
+                # Оба запроса завершились ошибкой - возвращаем ошибку основного запроса
+                outcome = primary
+                return upstream, upstream_request, primary.result()
+
+            outcome = winner
+            loser = hedge if winner is primary else primary
+            loser_cancelled = not loser.done()
+            winner_upstream, winner_request = tasks[winner]
+            result = winner.result()
+            if winner is hedge:
+                self.hedges_won += 1
+            self._account_hedge(result, winner is hedge, loser_cancelled)
+            return winner_upstream, winner_request, result
+        finally:
+            await self._release_hedged(tasks, outcome)
+
+    async def _release_hedged(
+        self,
+        tasks: Dict["asyncio.Task", tuple],
+        outcome: Optional["asyncio.Task"]
+    ):
+        """
+        Освободить запросы, результат которых не возвращается
+
+        Незавершенные запросы отменяются (в том числе при отмене вызывающего запроса -
+        тогда освобождаются все), успешные ответы закрываются с учетом токенов, а отказы
+        провайдеров учитываются в их состоянии.
+        """
+        losers = [task for task in tasks if task is not outcome]
+        for task in losers:
+            task.cancel()
+        if losers:
+            await asyncio.gather(*losers, return_exceptions=True)
+        for task in losers:
+            if task.cancelled():
+                continue
+            target, target_request = tasks[task]
+            error = task.exception()
+            if error is None:
+                await self._discard(task.result(), target_request)
+            elif is_upstream_failure(error):
+                target.record_failure(self.routing)
+
+    async def _discard(self, result: Any, request: ChatCompletionRequest):
+        """
+        Освободить результат проигравшего дублирующего запроса и учесть его токены
+
+        Для прерванного потока usage неизвестен: учитывается оценка контекста
+        отправленного запроса и уже полученные токены ответа.
+        """
+        if isinstance(result, ChatCompletionStream):
+            await result.aclose()
+            if result.completed:
+                self.hedge_wasted_tokens += result.metadata.context_tokens + result.metadata.response_tokens
+            else:
+                self.hedge_wasted_tokens += (
+                    estimate_messages_tokens(request.messages) + result.accumulator.received_tokens()
+                )
+        else:
+            _, metadata = result
+            self.hedge_wasted_tokens += metadata.context_tokens + metadata.response_tokens
+
+    def _account_hedge(self, result: Any, hedged: bool, loser_cancelled: bool):
+        """
+        Отметить ответ дублированного запроса и учесть токены отмененного запроса
+
+        Токены отмененного запроса оцениваются по prompt_tokens победившего ответа:
+        провайдер успевает обработать контекст отмененного запроса.
+        """
+        if isinstance(result, ChatCompletionStream):
+            def on_close():
+                result.metadata.hedged = hedged
+                if loser_cancelled:
+                    self.hedge_wasted_tokens += result.metadata.context_tokens
+            result.add_close_callback(on_close)
+        else:
+            _, metadata = result
+            metadata.hedged = hedged
+            if loser_cancelled:
+                self.hedge_wasted_tokens += metadata.context_tokens
+
+    def hedging_stats(self) -> Dict[str, Any]:
+        """Статистика дублирующих запросов"""
+        return {
+            "enabled": self.hedging.enabled,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "wasted_tokens": self.hedge_wasted_tokens,
+        }
+
+    async def chat_completion(
+        self,
+        request: ChatCompletionRequest,
+        timeout: Optional[float] = None,
+        passthrough: bool = False
+    ) -> tuple[Union[ChatCompletionResponse, RawCompletion], ResponseMetadata]:
+        """
+        Отправить запрос выбранному провайдеру
+
+        Args:
+            request: Запрос к API
+            timeout: Общий бюджет времени запроса в секундах
+            passthrough: Вернуть исходное тело ответа провайдера (RawCompletion)
+
+        Returns:
+            Кортеж (ответ модели, метаданные)
+        """
+        async def call(upstream: Upstream, upstream_request: ChatCompletionRequest, deadline: float, max_attempts: int):
+            return await upstream.client.chat_completion(
+                upstream_request, deadline=deadline, max_attempts=max_attempts, passthrough=passthrough
+            )
+
+        upstream, upstream_request, (response, metadata) = await self._execute(request, timeout, call)
+        upstream.record_success(metadata.time_to_first_token, self.routing.ewma_alpha)
+        upstream.record_prompt_cache(metadata)
+        self._annotate(upstream, upstream_request, metadata)
+        return response, metadata
+
+    async def chat_completion_stream(
+        self,
+        request: ChatCompletionRequest,
+        timeout: Optional[float] = None,
+        record_events: bool = False
+    ) -> ChatCompletionStream:
+        """
+        Открыть streaming запрос к выбранному провайдеру
+
+        Args:
+            request: Запрос к API
+            timeout: Общий бюджет времени запроса в секундах
+            record_events: Сохранять исходные SSE события в потоке (для кэширования ответа)
+
+        Returns:
+            Поток SSE событий провайдера
+        """
+        async def call(upstream: Upstream, upstream_request: ChatCompletionRequest, deadline: float, max_attempts: int):
+            return await upstream.client.chat_completion_stream(
+                upstream_request, deadline=deadline, max_attempts=max_attempts, record_events=record_events
+            )
+
+        upstream, upstream_request, stream = await self._execute(request, timeout, call, stream=True)
+
+        def on_close():
+            if stream.error is not None:
+                upstream.record_failure(self.routing)
+            elif stream.completed:
+                metadata = stream.metadata
+                upstream.record_success(metadata.time_to_first_token, self.routing.ewma_alpha, stream=True)
+                upstream.record_prompt_cache(metadata)
+                self._annotate(upstream, upstream_request, metadata)
+
+        stream.add_close_callback(on_close)
+        return stream
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Состояние всех провайдеров"""
+        return [upstream.stats() for upstream in self.upstreams]
+
+    def prompt_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Доля токенов контекста из кэша префиксов провайдеров по моделям"""
+        totals: Dict[str, List[int]] = {}
+        for upstream in self.upstreams:
+            model_totals = totals.setdefault(upstream.model_name, [0, 0])
+            model_totals[0] += upstream.prompt_tokens
+            model_totals[1] += upstream.cached_tokens
+        return {
+            model: {
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": cached_tokens,
+                "hit_ratio": cached_tokens / prompt_tokens if prompt_tokens else None,
+            }
+            for model, (prompt_tokens, cached_tokens) in totals.items()
+        }
+
+    async def start(self):
+        """Создать пулы соединений всех провайдеров"""
+        for client in self.clients:
+            await client.start()
+
+    async def aclose(self):
+        """Закрыть пулы соединений всех провайдеров"""
+        for client in self.clients:
+            await client.aclose()
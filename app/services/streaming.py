@@ -0,0 +1,372 @@
+"""Потоковая (SSE) передача ответов LLM провайдера"""
+import logging
+import time
+from typing import Optional, Dict, Any, List, Callable, AsyncIterator
+
+import httpx
+
+from app.models.chat import ChatCompletionResponse
+from app.models.metadata import ResponseMetadata
+from app.utils import fastjson
+from app.utils.text_stats import estimate_text_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class StreamAccumulator:
+    """
+    Сборщик streaming ответа из дельт
+
+    Собирает content, tool_calls (включая инкрементальные фрагменты arguments),
+    finish_reason и usage по мере поступления чанков и фиксирует время их прихода.
+    """
+
+    def __init__(self, start_time: float):
+        """
+        Инициализация сборщика
+
+        Args:
+            start_time: Время начала запроса (time.time())
+        """
+        self.start_time = start_time
+        self.id: str = ""
+        self.model: str = ""
+        self.created: int = 0
+        self.role: str = "assistant"
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        # Время прихода чанков с токенами (content или tool_calls)
+        self.token_times: List[float] = []
+        self.done = False
+
+    def add_chunk(self, chunk: Dict[str, Any], received_at: float):
+        """
+        Добавить распарсенный чанк
+
+        Args:
+            chunk: Данные чанка (chat.completion.chunk)
+            received_at: Время получения чанка
+        """
+        self.id = chunk.get("id") or self.id
+        self.model = chunk.get("model") or self.model
+        self.created = chunk.get("created") or self.created
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+
+        has_tokens = False
+        for choice in chunk.get("choices") or []:
+            # Собираем только первый вариант ответа
+            if choice.get("index", 0) != 0:
+                continue
+            delta = choice.get("delta") or {}
+            if delta.get("role"):
+                self.role = delta["role"]
+            if delta.get("content"):
+                self.content_parts.append(delta["content"])
+                has_tokens = True
+            for fragment in delta.get("tool_calls") or []:
+                self._add_tool_call_fragment(fragment)
+                has_tokens = True
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+        if has_tokens:
+            self.token_times.append(received_at)
+
+    def _add_tool_call_fragment(self, fragment: Dict[str, Any]):
+        """Добавить фрагмент tool_call (первый фрагмент содержит id и имя функции, остальные - части arguments)"""
+        index = fragment.get("index", len(self.tool_calls))
+        tool_call = self.tool_calls.setdefault(
+            index,
+            {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+        )
+        if fragment.get("id"):
+            tool_call["id"] = fragment["id"]
+        if fragment.get("type"):
+            tool_call["type"] = fragment["type"]
+        function = fragment.get("function") or {}
+        if function.get("name"):
+            tool_call["function"]["name"] += function["name"]
+        if function.get("arguments"):
+            tool_call["function"]["arguments"] += function["arguments"]
+
+    @property
+    def content(self) -> str:
+        """Собранный content"""
+        return "".join(self.content_parts)
+
+    def received_tokens(self) -> int:
+        """Оценка токенов ответа, полученных к текущему моменту (content и аргументы tool_calls)"""
+        return estimate_text_tokens(self.content) + sum(
+            estimate_text_tokens(call["function"]["name"]) + estimate_text_tokens(call["function"]["arguments"])
+            for call in self.tool_calls.values()
+        )
+
+    def build_response(self) -> ChatCompletionResponse:
+        """Собрать итоговый ответ в формате chat.completion"""
+        message: Dict[str, Any] = {"role": self.role, "content": self.content or None}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return ChatCompletionResponse(
+            id=self.id or "stream",
+            created=self.created or int(self.start_time),
+            model=self.model,
+            choices=[{"index": 0, "message": message, "finish_reason": self.finish_reason}],
+            usage=self.usage
+        )
+
+
+class ChatCompletionStream:
+    """
+    Поток SSE событий от LLM провайдера
+
+    Итерация возвращает SSE события в исходном виде (bytes) для передачи клиенту.
+    Параллельно ответ собирается в StreamAccumulator; после завершения потока
+    доступны итоговые response и metadata.
+    """
+
+    def __init__(
+        self,
+        response: httpx.Response,
+        start_time: float,
+        metadata_factory: Callable[..., ResponseMetadata],
+        suppress_usage_chunk: bool = False,
+        on_close: Optional[Callable[[], None]] = None,
+        record_events: bool = False
+    ):
+        """
+        Инициализация потока
+
+        Args:
+            response: Открытый streaming ответ httpx (None для воспроизведения сохраненного потока)
+            start_time: Время начала запроса
+            metadata_factory: Функция построения метаданных (LLMClient._extract_metadata)
+            suppress_usage_chunk: Не передавать клиенту чанк только с usage
+                (если usage запрошен прокси, а не клиентом)
+            on_close: Функция, вызываемая один раз при закрытии потока
+            record_events: Сохранять исходные SSE события (для кэширования ответа)
+        """
+        self._response = response
+        self._metadata_factory = metadata_factory
+        self._suppress_usage_chunk = suppress_usage_chunk
+        self._close_callbacks: List[Callable[[], None]] = [on_close] if on_close else []
+        self._closed = False
+        self.accumulator = StreamAccumulator(start_time)
+        # Время получения заголовков ответа
+        self.headers_time = time.time()
+        self.end_time: Optional[float] = None
+        # Ошибка получения потока от провайдера (если поток прервался)
+        self.error: Optional[Exception] = None
+        # Количество попыток открытия потока (включая повторы)
+        self.attempts = 1
+        # Ответ воспроизведен из кэша
+        self.cache_hit: Optional[bool] = None
+        # Сообщения контекста, удаленные по бюджету токенов (None - бюджет не настроен)
+        self.context_trimmed: Optional[int] = None
+        # Исходные SSE события провайдера (включая скрытый от клиента чанк с usage)
+        self.events: Optional[List[str]] = [] if record_events else None
+        self._response_model: Optional[ChatCompletionResponse] = None
+        self._metadata: Optional[ResponseMetadata] = None
+        self._events: Optional[AsyncIterator[bytes]] = None
+        self._prefetched: List[bytes] = []
+
+    @property
+    def completed(self) -> bool:
+        """Поток полностью получен ([DONE] или конец тела ответа)"""
+        return self.end_time is not None
+
+    async def prefetch(self):
+        """Дождаться первого SSE события (оно будет возвращено при итерации)"""
+        if self._events is None:
+            self._events = self._read_events()
+        try:
+            self._prefetched.append(await self._events.__anext__())
+        except StopAsyncIteration:
+            pass
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Итерироваться по SSE событиям провайдера"""
+        while self._prefetched:
+            yield self._prefetched.pop(0)
+        if self._events is None:
+            self._events = self._read_events()
+        async for event in self._events:
+            yield event
+
+    async def _read_events(self) -> AsyncIterator[bytes]:
+        """Читать SSE события из ответа провайдера"""
+        event_lines: List[str] = []
+        try:
+            async for line in self._response.aiter_lines():
+                if line:
+                    event_lines.append(line)
+                    continue
+                if event_lines:
+                    event = self._process_event(event_lines)
+                    event_lines = []
+                    if event is not None:
+                        yield event
+        except httpx.HTTPError as e:
+            self.error = e
+            raise
+        if event_lines:
+            event = self._process_event(event_lines)
+            if event is not None:
+                yield event
+        self.end_time = time.time()
+
+    def _process_event(self, lines: List[str]) -> Optional[bytes]:
+        """
+        Обработать одно SSE событие
+
+        Returns:
+            Событие для передачи клиенту или None, если его нужно пропустить
+        """
+        received_at = time.time()
+        if self.events is not None:
+            self.events.append("\n".join(lines))
+        data = "\n".join(
+            line[5:].lstrip() for line in lines if line.startswith("data:")
+        )
+        if data == "[DONE]":
+            self.accumulator.done = True
+        elif data:
+            try:
+                chunk = fastjson.loads(data)
+            except fastjson.JSONDecodeError:
+                logger.warning(f"Не удалось распарсить чанк streaming ответа: {data[:200]}")
+            else:
+                self.accumulator.add_chunk(chunk, received_at)
+                if (
+                    self._suppress_usage_chunk
+                    and chunk.get("usage")
+                    and not chunk.get("choices")
+                ):
+                    return None
+        return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+    async def aclose(self):
+        """Закрыть соединение с провайдером"""
+        if self._response is not None:
+            await self._response.aclose()
+        if self._closed:
+            return
+        self._closed = True
+        for callback in self._close_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике закрытия потока: {str(e)}")
+    
+    def add_close_callback(self, callback: Callable[[], None]):
+        """Добавить функцию, вызываемую один раз при закрытии потока"""
+        self._close_callbacks.append(callback)
+
+    @property
+    def response(self) -> ChatCompletionResponse:
+        """Итоговый ответ, собранный из дельт"""
+        if self._response_model is None:
+            self._response_model = self.accumulator.build_response()
+        return self._response_model
+
+    @property
+    def metadata(self) -> ResponseMetadata:
+        """Метаданные, рассчитанные по фактическому времени прихода чанков"""
+        if self._metadata is None:
+            acc = self.accumulator
+            start_time = acc.start_time
+            end_time = self.end_time or time.time()
+            total_time = end_time - start_time
+            latency = self.headers_time - start_time
+            token_times = acc.token_times
+            if token_times:
+                time_to_first_token = token_times[0] - start_time
+                generation_time = token_times[-1] - token_times[0]
+            else:
+                time_to_first_token = total_time
+                generation_time = 0.0
+            inter_token_latency = (
+                generation_time / (len(token_times) - 1)
+                if len(token_times) > 1 else 0.0
+            )
+            self._metadata = self._metadata_factory(
+                self.response,
+                start_time,
+                latency,
+                time_to_first_token,
+                total_time,
+                inter_token_latency=inter_token_latency,
+                generation_time=generation_time,
+                chunk_count=len(token_times)
+            )
+            self._metadata.attempts = self.attempts
+            self._metadata.cache_hit = self.cache_hit
+            self._metadata.context_trimmed = self.context_trimmed
+        return self._metadata
+
+
+def response_to_events(response: ChatCompletionResponse) -> List[str]:
+    """
+    Представить готовый ответ в виде SSE событий streaming ответа
+
+    Args:
+        response: Ответ в формате chat.completion
+
+    Returns:
+        SSE события (строки "data: ...") в формате chat.completion.chunk
+    """
+    base = {"id": response.id, "object": "chat.completion.chunk", "created": response.created, "model": response.model}
+    events = []
+    for choice in response.choices:
+        message = choice.message
+        delta: Dict[str, Any] = {"role": message.role if message else "assistant"}
+        if message and message.content:
+            delta["content"] = message.content
+        if message and message.tool_calls:
+            delta["tool_calls"] = [
+                {"index": index, **tool_call.model_dump(exclude_none=True)}
+                for index, tool_call in enumerate(message.tool_calls)
+            ]
+        events.append("data: " + fastjson.dumps_str(
+            {**base, "choices": [{"index": choice.index, "delta": delta, "finish_reason": None}]}
+        ))
+        events.append("data: " + fastjson.dumps_str(
+            {**base, "choices": [{"index": choice.index, "delta": {}, "finish_reason": choice.finish_reason}]}
+        ))
+    if response.usage is not None:
+        events.append("data: " + fastjson.dumps_str({**base, "choices": [], "usage": response.usage.model_dump()}))
+    events.append("data: [DONE]")
+    return events
+
+
+class ReplayedCompletionStream(ChatCompletionStream):
+    """Воспроизведение сохраненных SSE событий (ответ из кэша) с интерфейсом ChatCompletionStream"""
+
+    def __init__(
+        self,
+        events: List[str],
+        start_time: float,
+        metadata_factory: Callable[..., ResponseMetadata],
+        suppress_usage_chunk: bool = False
+    ):
+        """
+        Args:
+            events: Исходные SSE события (строки без завершающей пустой строки)
+            start_time: Время начала запроса
+            metadata_factory: Функция построения метаданных
+            suppress_usage_chunk: Не передавать клиенту чанк только с usage
+        """
+        super().__init__(None, start_time, metadata_factory, suppress_usage_chunk=suppress_usage_chunk)
+        self._replay = events
+        self.cache_hit = True
+        self.attempts = 0
+
+    async def _read_events(self) -> AsyncIterator[bytes]:
+        """Воспроизвести сохраненные события"""
+        for event_text in self._replay:
+            event = self._process_event(event_text.split("\n"))
+            if event is not None:
+                yield event
+        self.end_time = time.time()
@@ -0,0 +1,40 @@
+"""Приблизительная оценка количества токенов запроса без токенизатора модели"""
+from typing import Any, Dict, List
+
+from app.utils import fastjson
+from app.utils.text_stats import estimate_text_tokens, text_counts
+
+
+def estimate_messages_tokens(messages: List[Any]) -> int:
+    """
+    Оценить количество токенов контекста
+
+    Оценка сообщения та же, что у подсчетов сохраненных контекстов и бюджета
+    контекста (app.utils.text_stats).
+
+    Args:
+        messages: Сообщения (словари в формате OpenAI или модели сообщений)
+
+    Returns:
+        Оценка количества токенов контекста
+    """
+    return sum(text_counts.message(message).tokens for message in messages)
+
+
+def estimate_request_tokens(request_data: Dict[str, Any]) -> int:
+    """
+    Оценить расход токенов запроса до его выполнения
+
+    Учитывается контекст, описание инструментов и максимальная длина ответа
+    (фактический расход уточняется по usage ответа).
+
+    Args:
+        request_data: Данные запроса к провайдеру
+
+    Returns:
+        Оценка количества токенов запроса и ответа
+    """
+    total = estimate_messages_tokens(request_data.get("messages") or [])
+    if request_data.get("tools"):
+        total += estimate_text_tokens(fastjson.dumps_str(request_data["tools"]))
+    return total + (request_data.get("max_tokens") or 0)
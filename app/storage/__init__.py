@@ -1,13 +1,21 @@
 """Модуль для работы с файлами"""
 from app.storage.prompts import PromptStorage
 from app.storage.contexts import ContextStorage
+from app.storage.context_store import SQLiteContextStorage
 from app.storage.stats import StatsStorage
 from app.storage.current import CurrentDataStorage
+from app.storage.autosave import AutosaveWriter
+from app.storage.sessions import SessionStore
+from app.storage.timeseries import StatsHistory
 
 __all__ = [
     "PromptStorage",
     "ContextStorage",
+    "SQLiteContextStorage",
     "StatsStorage",
     "CurrentDataStorage",
+    "AutosaveWriter",
+    "SessionStore",
+    "StatsHistory",
 ]
 
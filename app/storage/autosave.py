@@ -0,0 +1,211 @@
+"""Фоновая атомарная запись файлов автосохранения"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Union, Callable
+
+from app.observability.metrics import STORAGE_WRITE_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Задержка перед записью: сохранения одного файла в пределах окна объединяются в одну запись
+DEFAULT_DELAY = 0.2
+
+# Содержимое файла: строка, байты (UTF-8) или функция, возвращающая их
+# (сериализация выполняется в потоке записи)
+Content = Union[str, bytes, Callable[[], Union[str, bytes]]]
+
+# Отметка незаписанного удаления файла (вместо содержимого в очереди записи)
+_DELETED = object()
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """
+    Атомарно записать файл: временный файл в той же папке, fsync, os.replace
+
+    При сбое во время записи на диске остается либо прежняя, либо новая версия файла.
+
+    Args:
+        path: Путь к файлу
+        data: Содержимое
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path: Path, text: str, encoding: str = "utf-8"):
+    """
+    Атомарно записать текстовый файл
+
+    Args:
+        path: Путь к файлу
+        text: Содержимое
+        encoding: Кодировка
+    """
+    atomic_write_bytes(path, text.encode(encoding))
+
+
+class AutosaveWriter:
+    """
+    Объединяющая запись файлов автосохранения в фоновом потоке
+
+    write() только запоминает последнее содержимое файла и возвращается сразу;
+    поток записи через delay секунд записывает последние версии всех измененных
+    файлов атомарно. delete() так же только отмечает файл удаленным, а удаляет
+    его поток записи. Чтение через read() учитывает еще не записанные изменения.
+    flush() записывает все изменения синхронно (при остановке приложения).
+    """
+
+    def __init__(self, delay: float = DEFAULT_DELAY):
+        """
+        Args:
+            delay: Окно объединения записей в секундах
+        """
+        self.delay = delay
+        self._pending: Dict[Path, Content] = {}
+        # Изменения, записываемые в данный момент (видны через read() до окончания записи)
+        self._writing: Dict[Path, Content] = {}
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="autosave-writer", daemon=True)
+        self._thread.start()
+        # Статистика
+        self.requested = 0
+        self.written = 0
+
+    def write(self, path: Path, content: Content):
+        """
+        Запланировать запись файла (предыдущая незаписанная версия заменяется)
+
+        Args:
+            path: Путь к файлу
+            content: Содержимое или функция его построения
+        """
+        with self._condition:
+            self._pending[Path(path)] = content
+            self.requested += 1
+            self._condition.notify()
+        if self._closed:
+            self.flush()
+
+    def delete(self, path: Path) -> bool:
+        """
+        Запланировать удаление файла (незаписанные изменения отменяются)
+
+        Не ожидает текущей записи: файл удаляется в потоке записи после нее,
+        а read() сразу возвращает None.
+
+        Returns:
+            True, если файл существовал или был запланирован к записи
+        """
+        path = Path(path)
+        with self._condition:
+            pending = self._pending.get(path)
+            if pending is None:
+                pending = self._writing.get(path)
+            self._pending[path] = _DELETED
+            self._condition.notify()
+        if self._closed:
+            self.flush()
+        if pending is not None:
+            return pending is not _DELETED
+        return path.exists()
+
+    def read_bytes(self, path: Path) -> Optional[bytes]:
+        """
+        Прочитать файл с учетом незаписанных изменений
+
+        Returns:
+            Содержимое (UTF-8) или None, если файл не существует
+        """
+        path = Path(path)
+        with self._condition:
+            pending = self._pending.get(path)
+            if pending is None:
+                pending = self._writing.get(path)
+        if pending is _DELETED:
+            return None
+        if pending is not None:
+            return self._resolve(pending)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def read(self, path: Path) -> Optional[str]:
+        """
+        Прочитать текстовый файл с учетом незаписанных изменений
+
+        Returns:
+            Содержимое или None, если файл не существует
+        """
+        data = self.read_bytes(path)
+        return data.decode("utf-8") if data is not None else None
+
+    @staticmethod
+    def _resolve(content: Content) -> bytes:
+        """Получить содержимое в байтах"""
+        if callable(content):
+            content = content()
+        return content.encode("utf-8") if isinstance(content, str) else content
+
+    def _run(self):
+        """Цикл потока записи"""
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            # Окно объединения: последующие сохранения тех же файлов заменяют содержимое
+            time.sleep(self.delay)
+            self.flush()
+
+    def flush(self):
+        """Записать все незаписанные изменения"""
+        with self._write_lock:
+            with self._condition:
+                self._writing, self._pending = self._pending, {}
+            for path, content in self._writing.items():
+                if content is _DELETED:
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.error(f"Ошибка удаления файла автосохранения {path}: {str(e)}")
+                    continue
+                try:
+                    with STORAGE_WRITE_DURATION.time("autosave"):
+                        # Папка создается при первой записи (например, папка новой сессии)
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        atomic_write_bytes(path, self._resolve(content))
+                    self.written += 1
+                except Exception as e:
+                    logger.error(f"Ошибка автосохранения файла {path}: {str(e)}")
+            with self._condition:
+                self._writing = {}
+
+    def close(self):
+        """Записать изменения и остановить поток записи"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
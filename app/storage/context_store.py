@@ -0,0 +1,388 @@
+"""Хранилище контекстов диалогов на SQLite с дозаписью сообщений"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Dict, Any
+
+from app.models.message import Message
+from app.observability.metrics import STORAGE_WRITE_DURATION
+from app.observability.tracing import tracer
+from app.utils import fastjson
+from app.utils.text_stats import text_counts
+
+logger = logging.getLogger(__name__)
+
+# Имя файла базы данных контекстов (в contexts_dir)
+CONTEXTS_DB_NAME = "contexts.sqlite3"
+# Ключ таблицы meta: файлы контекстов *.json уже импортированы в базу
+JSON_IMPORTED_KEY = "json_imported"
+# Количество удаленных сообщений, после которого запускается фоновое сжатие
+COMPACT_THRESHOLD = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contexts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created TEXT NOT NULL,
+    updated TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    words INTEGER NOT NULL DEFAULT 0,
+    characters INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    context_id INTEGER NOT NULL REFERENCES contexts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    tokens INTEGER,
+    words INTEGER,
+    characters INTEGER,
+    PRIMARY KEY (context_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Столбцы подсчетов, добавляемые в базы, созданные до их появления
+_COUNT_COLUMNS = {
+    "contexts": ("tokens INTEGER NOT NULL DEFAULT 0", "words INTEGER NOT NULL DEFAULT 0", "characters INTEGER NOT NULL DEFAULT 0"),
+    "messages": ("tokens INTEGER", "words INTEGER", "characters INTEGER"),
+}
+
+
+class SQLiteContextStorage:
+    """
+    Хранилище контекстов на SQLite (WAL) с API ContextStorage
+
+    Сообщения хранятся отдельными строками с хэшем содержимого. При сохранении
+    контекста записываются только сообщения после общего с сохраненной версией
+    префикса, поэтому сохранение после нового сообщения не переписывает весь диалог.
+    Таблица contexts служит индексом (имя, количество сообщений, размер, итоги
+    токенов, слов и символов); подсчеты вычисляются один раз для записываемых
+    сообщений, итоги обновляются на разницу. Переименование меняет одну строку индекса.
+    """
+
+    def __init__(self, contexts_dir: Path, import_json: bool = False):
+        """
+        Инициализация хранилища
+
+        Args:
+            contexts_dir: Путь к папке с контекстами
+            import_json: Скопировать в базу существующие файлы контекстов *.json,
+                если они еще не импортировались в эту базу
+        """
+        self.contexts_dir = Path(contexts_dir)
+        self.contexts_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.contexts_dir / CONTEXTS_DB_NAME
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self._migrate_counts()
+        self._conn.commit()
+        self._deleted_since_compact = 0
+        self._compact_thread: Optional[threading.Thread] = None
+        if import_json and not self._json_imported():
+            self.import_json_files()
+
+    @staticmethod
+    def _generate_default_name() -> str:
+        """Сгенерировать имя по умолчанию из временной метки"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"context_{timestamp}"
+
+    def _migrate_counts(self):
+        """Добавить столбцы подсчетов в базу предыдущей версии и заполнить их"""
+        for table, columns in _COUNT_COLUMNS.items():
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if column.split()[0] not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        rows = self._conn.execute(
+            "SELECT context_id, position, data FROM messages WHERE tokens IS NULL"
+        ).fetchall()
+        if not rows:
+            return
+        updates = []
+        for context_id, position, data in rows:
+            counts = text_counts.message(Message(**fastjson.loads(data)))
+            updates.append((counts.tokens, counts.words, counts.characters, context_id, position))
+        self._conn.executemany(
+            "UPDATE messages SET tokens = ?, words = ?, characters = ? WHERE context_id = ? AND position = ?", updates
+        )
+        self._conn.execute(
+            "UPDATE contexts SET "
+            "tokens = (SELECT COALESCE(SUM(tokens), 0) FROM messages WHERE context_id = contexts.id), "
+            "words = (SELECT COALESCE(SUM(words), 0) FROM messages WHERE context_id = contexts.id), "
+            "characters = (SELECT COALESCE(SUM(characters), 0) FROM messages WHERE context_id = contexts.id)"
+        )
+        logger.info(f"Подсчитаны токены, слова и символы сохраненных сообщений: {len(rows)}")
+
+    @staticmethod
+    def _with_hash(data: str) -> tuple[str, str]:
+        """Добавить к сериализованному сообщению хэш содержимого"""
+        return data, hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def list_contexts(self) -> List[str]:
+        """Получить список доступных контекстов"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM contexts ORDER BY name").fetchall()
+        return [row[0] for row in rows]
+
+    def list_context_info(self) -> List[Dict[str, Any]]:
+        """
+        Получить индекс контекстов
+
+        Returns:
+            Список словарей (name, message_count, tokens, words, characters, size_bytes, created, updated)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, message_count, tokens, words, characters, size_bytes, created, updated "
+                "FROM contexts ORDER BY name"
+            ).fetchall()
+        return [
+            {
+                "name": name, "message_count": count, "tokens": tokens, "words": words, "characters": characters,
+                "size_bytes": size, "created": created, "updated": updated
+            }
+            for name, count, tokens, words, characters, size, created, updated in rows
+        ]
+
+    def get_context(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Загрузить контекст по имени
+
+        Args:
+            name: Имя контекста
+
+        Returns:
+            Словарь с данными контекста (с подсчетами message_stats и totals) или None если не найден
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, message_count, tokens, words, characters FROM contexts WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                return None
+            context_id, count, tokens, words, characters = row
+            rows = self._conn.execute(
+                "SELECT data, tokens, words, characters FROM messages WHERE context_id = ? ORDER BY position",
+                (context_id,)
+            ).fetchall()
+        return {
+            "name": name,
+            "messages": [fastjson.loads(data) for data, _, _, _ in rows],
+            "message_stats": [
+                {"tokens": message_tokens, "words": message_words, "characters": message_characters}
+                for _, message_tokens, message_words, message_characters in rows
+            ],
+            "totals": {"messages": count, "tokens": tokens, "words": words, "characters": characters}
+        }
+
+    def save_context(self, name: str, messages: List[Message], create_if_not_exists: bool = True) -> Path:
+        """
+        Сохранить контекст
+
+        Args:
+            name: Имя контекста (если пустое, генерируется из временной метки)
+            messages: Список сообщений
+            create_if_not_exists: Создать новый контекст если не существует
+
+        Returns:
+            Путь к файлу базы данных
+        """
+        if not name:
+            name = self._generate_default_name()
+        self._save(name, messages)
+        return self.db_path
+
+    def _save(self, name: str, messages: List[Message]):
+        """Записать изменившийся хвост контекста"""
+        # Сериализация pydantic (без промежуточных словарей) - основная работа при сохранении длинного диалога
+        serialized = [self._with_hash(msg.model_dump_json(exclude_none=True)) for msg in messages]
+        now = datetime.now().isoformat()
+        with tracer.start_span("storage.contexts.save", messages=len(messages)) as span, \
+                self._lock, self._conn, STORAGE_WRITE_DURATION.time("contexts"):
+            row = self._conn.execute(
+                "SELECT id, size_bytes, tokens, words, characters FROM contexts WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                context_id = self._conn.execute(
+                    "INSERT INTO contexts (name, created, updated) VALUES (?, ?, ?)", (name, now, now)
+                ).lastrowid
+                size_bytes = tokens = words = characters = 0
+                stored_hashes: List[str] = []
+            else:
+                context_id, size_bytes, tokens, words, characters = row
+                stored_hashes = [
+                    h for (h,) in self._conn.execute(
+                        "SELECT hash FROM messages WHERE context_id = ? ORDER BY position", (context_id,)
+                    )
+                ]
+
+            # Общий префикс сохраненной и новой версии не переписывается
+            common = 0
+            limit = min(len(stored_hashes), len(serialized))
+            while common < limit and stored_hashes[common] == serialized[common][1]:
+                common += 1
+
+            if common < len(stored_hashes):
+                removed = self._conn.execute(
+                    "SELECT COALESCE(SUM(LENGTH(CAST(data AS BLOB))), 0), COALESCE(SUM(tokens), 0), "
+                    "COALESCE(SUM(words), 0), COALESCE(SUM(characters), 0) FROM messages "
+                    "WHERE context_id = ? AND position >= ?",
+                    (context_id, common)
+                ).fetchone()
+                size_bytes -= removed[0]
+                tokens -= removed[1]
+                words -= removed[2]
+                characters -= removed[3]
+                self._conn.execute(
+                    "DELETE FROM messages WHERE context_id = ? AND position >= ?", (context_id, common)
+                )
+                self._deleted_since_compact += len(stored_hashes) - common
+            # Подсчеты вычисляются только для записываемых сообщений
+            rows = []
+            for position in range(common, len(serialized)):
+                data, message_hash = serialized[position]
+                counts = text_counts.message(messages[position])
+                rows.append((context_id, position, message_hash, data, counts.tokens, counts.words, counts.characters))
+                tokens += counts.tokens
+                words += counts.words
+                characters += counts.characters
+            self._conn.executemany(
+                "INSERT INTO messages (context_id, position, hash, data, tokens, words, characters) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            size_bytes += sum(len(data.encode("utf-8")) for data, _ in serialized[common:])
+            span.set_attribute("written_messages", len(serialized) - common)
+            self._conn.execute(
+                "UPDATE contexts SET updated = ?, message_count = ?, size_bytes = ?, "
+                "tokens = ?, words = ?, characters = ? WHERE id = ?",
+                (now, len(serialized), size_bytes, tokens, words, characters, context_id)
+            )
+        self._maybe_compact()
+
+    def delete_context(self, name: str) -> bool:
+        """
+        Удалить контекст
+
+        Args:
+            name: Имя контекста
+
+        Returns:
+            True если удален, False если не найден
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, message_count FROM contexts WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM contexts WHERE id = ?", (row[0],))
+            self._deleted_since_compact += row[1]
+        self._maybe_compact()
+        return True
+
+    def rename_context(self, old_name: str, new_name: str) -> bool:
+        """
+        Переименовать контекст
+
+        Args:
+            old_name: Старое имя контекста
+            new_name: Новое имя контекста
+
+        Returns:
+            True если переименован, False если не найден или новое имя занято
+        """
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM contexts WHERE name = ?", (new_name,)).fetchone():
+                return False  # Новое имя уже существует
+            cursor = self._conn.execute(
+                "UPDATE contexts SET name = ?, updated = ? WHERE name = ?",
+                (new_name, datetime.now().isoformat(), old_name)
+            )
+        return cursor.rowcount > 0
+
+    def _json_imported(self) -> bool:
+        """Импортировались ли файлы контекстов *.json в эту базу"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (JSON_IMPORTED_KEY,)).fetchone()
+        return row is not None
+
+    def import_json_files(self) -> int:
+        """
+        Импортировать файлы контекстов *.json (формат ContextStorage)
+
+        Файлы копируются в базу и остаются на месте, поэтому к хранилищу json можно
+        вернуться без потери данных. Файлы с именами уже существующих контекстов
+        не импортируются. После импорта в базе ставится отметка, и при следующих
+        запусках с import_json импорт не повторяется.
+
+        Returns:
+            Количество импортированных контекстов
+        """
+        imported = 0
+        for file in sorted(self.contexts_dir.glob("*.json")):
+            if file.name.startswith("current_"):
+                continue
+            try:
+                data = fastjson.loads(file.read_bytes())
+            except (fastjson.JSONDecodeError, IOError) as e:
+                logger.warning(f"Не удалось импортировать контекст {file}: {str(e)}")
+                continue
+            name = data.get("name") or file.stem
+            with self._lock:
+                exists = self._conn.execute("SELECT 1 FROM contexts WHERE name = ?", (name,)).fetchone()
+            if exists:
+                logger.warning(f"Контекст '{name}' уже существует, файл {file} не импортирован")
+                continue
+            self._save(name, [Message(**message) for message in data.get("messages") or []])
+            imported += 1
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (JSON_IMPORTED_KEY, datetime.now().isoformat())
+            )
+        if imported:
+            logger.info(f"Импортировано контекстов из JSON файлов: {imported} (исходные файлы сохранены)")
+        return imported
+
+    def _maybe_compact(self):
+        """Запустить фоновое сжатие после большого количества удалений"""
+        if self._deleted_since_compact < COMPACT_THRESHOLD:
+            return
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+        self._deleted_since_compact = 0
+        self._compact_thread = threading.Thread(target=self.compact, name="contexts-compact", daemon=True)
+        self._compact_thread.start()
+
+    def compact(self):
+        """Вернуть освободившиеся страницы файлу и перенести WAL в основной файл"""
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA incremental_vacuum").fetchall()
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            logger.debug("Хранилище контекстов сжато")
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка сжатия хранилища контекстов: {str(e)}")
+
+    def close(self):
+        """Закрыть базу данных"""
+        if self._compact_thread is not None:
+            self._compact_thread.join()
+        with self._lock:
+            self._conn.close()
@@ -1,10 +1,41 @@
 """Сервис для работы с контекстами диалогов"""
-import json
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
+from pydantic import ValidationError
+
 from app.models.message import Message
+from app.utils import fastjson
+from app.utils.text_stats import message_stats, totals
+
+
+def with_counts(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Дополнить данные контекста подсчетами сообщений (message_stats) и итогами (totals)
+
+    Подсчеты, сохраненные вместе с контекстом, используются как есть; пересчитываются
+    только контексты без подсчетов (созданные до их появления или измененные вручную
+    с изменением количества сообщений).
+
+    Args:
+        data: Данные контекста (name, messages)
+
+    Returns:
+        Те же данные с ключами message_stats и totals
+    """
+    messages = data.get("messages") or []
+    stats = data.get("message_stats")
+    if not isinstance(stats, list) or len(stats) != len(messages):
+        try:
+            stats = message_stats(Message(**message) for message in messages)
+        except (ValidationError, TypeError):
+            stats = [{"tokens": 0, "words": 0, "characters": 0} for _ in messages]
+        data["message_stats"] = stats
+        data["totals"] = totals(stats, len(messages))
+    elif not isinstance(data.get("totals"), dict):
+        data["totals"] = totals(stats, len(messages))
+    return data
 
 
 class ContextStorage:
@@ -36,6 +67,31 @@ class ContextStorage:
                 contexts.append(file.stem)
         return sorted(contexts)
     
+    def list_context_info(self) -> List[Dict[str, Any]]:
+        """
+        Получить индекс контекстов
+        
+        Returns:
+            Список словарей (name, message_count, tokens, words, characters, size_bytes, created, updated)
+        """
+        info = []
+        for name in self.list_contexts():
+            file_path = self.contexts_dir / f"{name}.json"
+            context = self.get_context(name) or {}
+            context_totals = context.get("totals") or {}
+            stat = file_path.stat()
+            info.append({
+                "name": name,
+                "message_count": len(context.get("messages") or []),
+                "tokens": context_totals.get("tokens", 0),
+                "words": context_totals.get("words", 0),
+                "characters": context_totals.get("characters", 0),
+                "size_bytes": stat.st_size,
+                "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+                "updated": datetime.fromtimestamp(stat.st_mtime).isoformat()
+            })
+        return info
+    
     def get_context(self, name: str) -> Optional[Dict[str, Any]]:
         """
         Загрузить контекст по имени
@@ -44,16 +100,16 @@ class ContextStorage:
             name: Имя контекста (без расширения)
         
         Returns:
-            Словарь с данными контекста или None если не найден
+            Словарь с данными контекста (с подсчетами message_stats и totals) или None если не найден
         """
         file_path = self.contexts_dir / f"{name}.json"
         if not file_path.exists():
             return None
         
         try:
-            data = json.loads(file_path.read_text(encoding='utf-8'))
-            return data
-        except (json.JSONDecodeError, IOError):
+            data = fastjson.loads(file_path.read_bytes())
+            return with_counts(data)
+        except (fastjson.JSONDecodeError, IOError):
             return None
     
     def save_context(self, name: str, messages: List[Message], create_if_not_exists: bool = True) -> Path:
@@ -73,15 +129,18 @@ class ContextStorage:
         
         file_path = self.contexts_dir / f"{name}.json"
         
+        # Подсчеты токенов, слов и символов хранятся рядом с сообщениями (повторно
+        # отправляемые сообщения берутся из кэша по хэшу содержимого)
+        stats = message_stats(messages)
         data = {
             "name": name,
-            "messages": [msg.model_dump(exclude_none=True) for msg in messages]
+            "messages": [msg.model_dump(exclude_none=True) for msg in messages],
+            "message_stats": stats,
+            "totals": totals(stats, len(messages))
         }
         
-        file_path.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding='utf-8'
-        )
+        # Файлы контекстов предназначены и для ручного просмотра: JSON с отступами
+        file_path.write_bytes(fastjson.dumps(data, indent=True))
         return file_path
     
     def delete_context(self, name: str) -> bool:
@@ -123,12 +182,9 @@ class ContextStorage:
         old_path.rename(new_path)
         
         # Обновить имя в файле
-        data = json.loads(new_path.read_text(encoding='utf-8'))
+        data = fastjson.loads(new_path.read_bytes())
         data['name'] = new_name
-        new_path.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding='utf-8'
-        )
+        new_path.write_bytes(fastjson.dumps(data, indent=True))
         
         return True
 
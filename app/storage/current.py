@@ -4,20 +4,30 @@ from typing import Optional, List
 
 from app.models.message import Message
 from app.models.metadata import ResponseMetadata
+from app.storage.autosave import AutosaveWriter
+from app.storage.contexts import with_counts
+from app.utils import fastjson
+from app.utils.text_stats import message_stats, totals
 
 
 class CurrentDataStorage:
     """Класс для работы с текущими данными"""
     
-    def __init__(self, contexts_dir: Path):
+    def __init__(self, contexts_dir: Path, writer: Optional[AutosaveWriter] = None, create_dir: bool = True):
         """
         Инициализация хранилища текущих данных
         
         Args:
             contexts_dir: Путь к папке для сохранения текущих данных
+            writer: Общий поток записи (по умолчанию создается собственный)
+            create_dir: Создать папку сразу (иначе ее создаст поток записи при первой записи)
         """
         self.contexts_dir = Path(contexts_dir)
-        self.contexts_dir.mkdir(parents=True, exist_ok=True)
+        if create_dir:
+            self.contexts_dir.mkdir(parents=True, exist_ok=True)
+        # Файлы записываются атомарно в фоновом потоке, частые сохранения объединяются
+        self._owns_writer = writer is None
+        self.writer = writer or AutosaveWriter()
     
     def save_current_content(self, content: str) -> Path:
         """
@@ -30,7 +40,7 @@ class CurrentDataStorage:
             Путь к сохраненному файлу
         """
         file_path = self.contexts_dir / "current_content.md"
-        file_path.write_text(content, encoding='utf-8')
+        self.writer.write(file_path, content)
         return file_path
     
     def get_current_content(self) -> Optional[str]:
@@ -41,9 +51,7 @@ class CurrentDataStorage:
             Содержимое ответа или None если не найден
         """
         file_path = self.contexts_dir / "current_content.md"
-        if not file_path.exists():
-            return None
-        return file_path.read_text(encoding='utf-8')
+        return self.writer.read(file_path)
     
     def save_current_tool_call(self, tool_calls: list) -> Path:
         """
@@ -55,12 +63,8 @@ class CurrentDataStorage:
         Returns:
             Путь к сохраненному файлу
         """
-        import json
         file_path = self.contexts_dir / "current_tool_call.json"
-        file_path.write_text(
-            json.dumps(tool_calls, ensure_ascii=False, indent=2),
-            encoding='utf-8'
-        )
+        self.writer.write(file_path, lambda: fastjson.dumps(tool_calls))
         return file_path
     
     def get_current_tool_call(self) -> Optional[list]:
@@ -70,13 +74,11 @@ class CurrentDataStorage:
         Returns:
             Список tool calls или None если не найден
         """
-        import json
         file_path = self.contexts_dir / "current_tool_call.json"
-        if not file_path.exists():
-            return None
         try:
-            return json.loads(file_path.read_text(encoding='utf-8'))
-        except (json.JSONDecodeError, IOError):
+            data = self.writer.read_bytes(file_path)
+            return fastjson.loads(data) if data is not None else None
+        except (fastjson.JSONDecodeError, IOError):
             return None
     
     def save_current_context(self, name: str, messages: List[Message]) -> Path:
@@ -90,10 +92,15 @@ class CurrentDataStorage:
         Returns:
             Путь к сохраненному файлу
         """
-        import json
         file_path = self.contexts_dir / "current_context.json"
         messages_data = [msg.model_dump(exclude_none=True) for msg in messages]
-        
+        # Сериализация и подсчет токенов, слов и символов выполняются в потоке записи
+        self.writer.write(file_path, lambda: self._serialize_context(name, messages_data, messages))
+        return file_path
+    
+    @staticmethod
+    def _serialize_context(name: str, messages_data: List[dict], messages: List[Message]) -> bytes:
+        """Сериализовать текущий контекст (с подсчетами сообщений)"""
         # Исправляем экранированные Unicode символы в arguments tool_calls
         for msg_data in messages_data:
             if "tool_calls" in msg_data and isinstance(msg_data["tool_calls"], list):
@@ -105,36 +112,33 @@ class CurrentDataStorage:
                             if isinstance(arguments_str, str):
                                 try:
                                     # Парсим JSON строку и сериализуем обратно с ensure_ascii=False
-                                    parsed_args = json.loads(arguments_str)
-                                    function_data["arguments"] = json.dumps(parsed_args, ensure_ascii=False)
-                                except (json.JSONDecodeError, TypeError):
+                                    parsed_args = fastjson.loads(arguments_str)
+                                    function_data["arguments"] = fastjson.dumps_str(parsed_args)
+                                except (fastjson.JSONDecodeError, TypeError):
                                     # Если не удалось распарсить, оставляем как есть
                                     pass
         
+        stats = message_stats(messages)
         data = {
             "name": name,
-            "messages": messages_data
+            "messages": messages_data,
+            "message_stats": stats,
+            "totals": totals(stats, len(messages))
         }
-        file_path.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding='utf-8'
-        )
-        return file_path
+        return fastjson.dumps(data)
     
     def get_current_context(self) -> Optional[dict]:
         """
         Загрузить текущий контекст
         
         Returns:
-            Словарь с данными контекста или None если не найден
+            Словарь с данными контекста (с подсчетами message_stats и totals) или None если не найден
         """
-        import json
         file_path = self.contexts_dir / "current_context.json"
-        if not file_path.exists():
-            return None
         try:
-            return json.loads(file_path.read_text(encoding='utf-8'))
-        except (json.JSONDecodeError, IOError):
+            data = self.writer.read_bytes(file_path)
+            return with_counts(fastjson.loads(data)) if data is not None else None
+        except (fastjson.JSONDecodeError, IOError):
             return None
     
     def clear_current_context(self) -> bool:
@@ -145,8 +149,10 @@ class CurrentDataStorage:
             True если файл удален, False если не найден
         """
         file_path = self.contexts_dir / "current_context.json"
-        if file_path.exists():
-            file_path.unlink()
-            return True
-        return False
+        return self.writer.delete(file_path)
+    
+    def close(self):
+        """Записать незаписанные изменения и остановить поток записи (если он собственный)"""
+        if self._owns_writer:
+            self.writer.close()
 
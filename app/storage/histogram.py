@@ -0,0 +1,97 @@
+"""Объединяемая гистограмма с логарифмическими корзинами для оценки перцентилей"""
+import math
+from typing import Optional, Dict, Any
+
+# Относительная точность значений перцентилей (ширина корзины)
+DEFAULT_PRECISION = 0.01
+
+
+class LogHistogram:
+    """
+    Гистограмма с логарифмическими корзинами (по принципу HDR Histogram)
+
+    Значение v > 0 попадает в корзину floor(log(v) / log(1 + precision)), поэтому
+    относительная ошибка перцентилей не превышает precision при любом диапазоне
+    значений, а объем зависит только от числа различных порядков величины.
+    Гистограммы с одинаковой точностью объединяются сложением счетчиков корзин,
+    что позволяет хранить агрегаты по интервалам времени и суммировать их для окна.
+    """
+
+    __slots__ = ("precision", "_log_base", "buckets", "zeros", "count", "total", "min", "max")
+
+    def __init__(self, precision: float = DEFAULT_PRECISION):
+        """
+        Args:
+            precision: Относительная точность (ширина корзины)
+        """
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, count: int = 1):
+        """Добавить значение (отрицательные значения считаются нулевыми)"""
+        if value > 0:
+            index = math.floor(math.log(value) / self._log_base)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        else:
+            value = 0.0
+            self.zeros += count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LogHistogram"):
+        """Добавить счетчики другой гистограммы с той же точностью"""
+        if other.count == 0:
+            return
+        buckets = self.buckets
+        for index, count in other.buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Оценка перцентиля
+
+        Args:
+            pct: Перцентиль (0-100)
+
+        Returns:
+            Значение (середина корзины, ограниченная min/max) или None для пустой гистограммы
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count * pct / 100))
+        seen = self.zeros
+        if seen >= rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                value = math.exp((index + 0.5) * self._log_base)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """Количество, среднее, min/max и перцентили p50/p90/p99"""
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
@@ -0,0 +1,130 @@
+"""Текущие данные (автосохранение) отдельно для каждой сессии"""
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from app.storage.autosave import AutosaveWriter
+from app.storage.current import CurrentDataStorage
+from app.storage.stats import StatsStorage
+
+logger = logging.getLogger(__name__)
+
+# Заголовок и cookie с идентификатором сессии
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "llm_debugger_session"
+# Сессия запросов без идентификатора (файлы current_* в contexts_dir и stats_dir)
+DEFAULT_SESSION = "default"
+# Папка с данными сессий (в contexts_dir)
+SESSIONS_DIR_NAME = "_sessions"
+# Допустимый идентификатор сессии (используется как имя папки)
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+@dataclass
+class SessionState:
+    """Хранилища текущих данных одной сессии"""
+    current: CurrentDataStorage
+    stats: StatsStorage
+
+
+class SessionStore:
+    """
+    Хранилище текущих данных по сессиям
+
+    Сессия по умолчанию использует прежние файлы current_* (существующие клиенты
+    и веб-интерфейс работают без изменений). Остальные сессии хранят файлы в
+    contexts_dir/_sessions/<id>/ и записываются одним общим потоком записи; папка
+    сессии создается только при первой записи, поэтому обращение с новым
+    идентификатором (например, только чтение) не оставляет следов на диске.
+    В памяти держатся последние max_sessions сессий (LRU); вытесненная сессия
+    ничего не теряет - ее изменения уже переданы потоку записи, а при следующем
+    обращении данные читаются с диска.
+    """
+
+    def __init__(
+        self,
+        contexts_dir: Path,
+        current_storage: CurrentDataStorage,
+        stats_storage: StatsStorage,
+        max_sessions: int = 256
+    ):
+        """
+        Инициализация хранилища сессий
+
+        Args:
+            contexts_dir: Путь к папке контекстов (в ней создается папка сессий)
+            current_storage: Хранилище текущих данных сессии по умолчанию
+            stats_storage: Хранилище текущей статистики сессии по умолчанию
+            max_sessions: Максимальное количество сессий в памяти
+        """
+        self.contexts_dir = Path(contexts_dir)
+        self.sessions_dir = self.contexts_dir / SESSIONS_DIR_NAME
+        self.default = SessionState(current_storage, stats_storage)
+        self.max_sessions = max_sessions
+        self.writer = AutosaveWriter()
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        # Зависимости FastAPI без async выполняются в пуле потоков
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    @staticmethod
+    def validate_session_id(session_id: str) -> str:
+        """
+        Проверить идентификатор сессии
+
+        Raises:
+            ValueError: Если идентификатор недопустим
+        """
+        if not SESSION_ID_PATTERN.match(session_id) or session_id in (".", ".."):
+            raise ValueError(
+                "Недопустимый идентификатор сессии: допускаются латинские буквы, цифры, '_', '-', '.' (до 64 символов)"
+            )
+        return session_id
+
+    def get(self, session_id: Optional[str] = None) -> SessionState:
+        """
+        Получить хранилища сессии
+
+        Args:
+            session_id: Идентификатор сессии (None - сессия по умолчанию)
+
+        Returns:
+            Хранилища текущих данных сессии
+        """
+        if not session_id or session_id == DEFAULT_SESSION:
+            return self.default
+        self.validate_session_id(session_id)
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                self._sessions.move_to_end(session_id)
+                return state
+            directory = self.sessions_dir / session_id
+            state = SessionState(
+                CurrentDataStorage(directory, writer=self.writer, create_dir=False),
+                StatsStorage(directory, writer=self.writer, create_dir=False)
+            )
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self.evicted += 1
+                logger.debug(f"Сессия {evicted_id} вытеснена из памяти")
+        return state
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика сессий"""
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evicted": self.evicted,
+            "writes_requested": self.writer.requested,
+            "writes_performed": self.writer.written,
+        }
+
+    def close(self):
+        """Записать незаписанные изменения сессий и остановить общий поток записи"""
+        self.writer.close()
@@ -1,23 +1,30 @@
 """Сервис для работы со статистикой"""
-import json
 from pathlib import Path
 from typing import Optional, Dict, Any
 
 from app.models.metadata import ResponseMetadata
+from app.storage.autosave import AutosaveWriter
+from app.utils import fastjson
 
 
 class StatsStorage:
     """Класс для работы со статистикой"""
     
-    def __init__(self, stats_dir: Path):
+    def __init__(self, stats_dir: Path, writer: Optional[AutosaveWriter] = None, create_dir: bool = True):
         """
         Инициализация хранилища статистики
         
         Args:
             stats_dir: Путь к папке со статистикой
+            writer: Общий поток записи (по умолчанию создается собственный)
+            create_dir: Создать папку сразу (иначе ее создаст поток записи при первой записи)
         """
         self.stats_dir = Path(stats_dir)
-        self.stats_dir.mkdir(parents=True, exist_ok=True)
+        if create_dir:
+            self.stats_dir.mkdir(parents=True, exist_ok=True)
+        # Файл записывается атомарно в фоновом потоке, частые сохранения объединяются
+        self._owns_writer = writer is None
+        self.writer = writer or AutosaveWriter()
     
     def save_current_stats(self, metadata: ResponseMetadata) -> Path:
         """
@@ -31,10 +38,8 @@ class StatsStorage:
         """
         file_path = self.stats_dir / "current_stats.json"
         data = metadata.model_dump()
-        file_path.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding='utf-8'
-        )
+        # Файл читается только приложением: компактный JSON
+        self.writer.write(file_path, lambda: fastjson.dumps(data))
         return file_path
     
     def get_current_stats(self) -> Optional[Dict[str, Any]]:
@@ -45,11 +50,14 @@ class StatsStorage:
             Словарь с данными статистики или None если не найден
         """
         file_path = self.stats_dir / "current_stats.json"
-        if not file_path.exists():
-            return None
-        
         try:
-            return json.loads(file_path.read_text(encoding='utf-8'))
-        except (json.JSONDecodeError, IOError):
+            data = self.writer.read_bytes(file_path)
+            return fastjson.loads(data) if data is not None else None
+        except (fastjson.JSONDecodeError, IOError):
             return None
+    
+    def close(self):
+        """Записать незаписанные изменения и остановить поток записи (если он собственный)"""
+        if self._owns_writer:
+            self.writer.close()
 
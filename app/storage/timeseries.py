@@ -0,0 +1,332 @@
+"""История статистики ответов: бинарный журнал и агрегаты по интервалам времени"""
+import logging
+import math
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, BinaryIO
+
+from app.models.metadata import ResponseMetadata
+from app.observability.metrics import STORAGE_WRITE_DURATION
+from app.observability.tracing import tracer
+from app.storage.histogram import LogHistogram
+
+logger = logging.getLogger(__name__)
+
+# Папка журнала (в stats_dir): один файл на сутки (UTC)
+TIMESERIES_DIR_NAME = "timeseries"
+# Запись журнала: время, latency, ttft, total_time, tokens/sec, response_tokens, context_tokens,
+# флаги, длины имен модели и провайдера; за заголовком следуют имена в UTF-8
+RECORD_HEADER = struct.Struct("<dffffIIBBB")
+FLAG_CACHE_HIT = 1
+FLAG_HEDGED = 2
+FLAG_COALESCED = 4
+# Интервалы агрегатов: минутные за последние MINUTE_TIER_SPAN секунд, часовые за весь срок хранения
+MINUTE = 60
+HOUR = 3600
+MINUTE_TIER_SPAN = 3 * HOUR
+# Метрики с гистограммами (атрибуты записи)
+METRICS = ("latency", "time_to_first_token", "total_time", "tokens_per_second", "context_tokens")
+
+_WINDOW_UNITS = {"s": 1, "m": MINUTE, "h": HOUR, "d": 24 * HOUR}
+
+GroupKey = Tuple[str, str]
+
+
+def parse_window(window: str) -> int:
+    """
+    Разобрать длительность окна ("30s", "15m", "1h", "7d" или число секунд)
+
+    Raises:
+        ValueError: Если формат недопустим или окно короче секунды
+    """
+    text = window.strip().lower()
+    unit = _WINDOW_UNITS.get(text[-1:]) if text else None
+    number = text[:-1] if unit is not None else text
+    try:
+        seconds = float(number) * (unit or 1)
+    except ValueError:
+        raise ValueError(f"Недопустимое окно '{window}': ожидается число с единицей s, m, h или d (например 1h)")
+    if not math.isfinite(seconds) or seconds < 1:
+        raise ValueError(f"Окно должно быть конечным и не короче 1 секунды: '{window}'")
+    return int(seconds)
+
+
+class _Record:
+    """Запись журнала"""
+    __slots__ = (
+        "timestamp", "latency", "time_to_first_token", "total_time", "tokens_per_second",
+        "response_tokens", "context_tokens", "flags", "model", "provider"
+    )
+
+    def __init__(self, timestamp, latency, time_to_first_token, total_time, tokens_per_second,
+                 response_tokens, context_tokens, flags, model, provider):
+        self.timestamp = timestamp
+        self.latency = latency
+        self.time_to_first_token = time_to_first_token
+        self.total_time = total_time
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.context_tokens = context_tokens
+        self.flags = flags
+        self.model = model
+        self.provider = provider
+
+    @classmethod
+    def from_metadata(cls, metadata: ResponseMetadata, timestamp: float) -> "_Record":
+        """Построить запись из метаданных ответа"""
+        flags = (
+            (FLAG_CACHE_HIT if metadata.cache_hit else 0)
+            | (FLAG_HEDGED if metadata.hedged else 0)
+            | (FLAG_COALESCED if metadata.coalesced else 0)
+        )
+        return cls(
+            timestamp, metadata.latency, metadata.time_to_first_token, metadata.total_time,
+            metadata.inference_speed, max(metadata.response_tokens, 0), max(metadata.context_tokens, 0),
+            flags, metadata.model or "", metadata.provider or ""
+        )
+
+    def encode(self) -> bytes:
+        """Сериализовать запись"""
+        model = self.model.encode("utf-8")[:255]
+        provider = self.provider.encode("utf-8")[:255]
+        return RECORD_HEADER.pack(
+            self.timestamp, self.latency, self.time_to_first_token, self.total_time, self.tokens_per_second,
+            self.response_tokens, self.context_tokens, self.flags, len(model), len(provider)
+        ) + model + provider
+
+    @classmethod
+    def decode_all(cls, data: bytes) -> Tuple[List["_Record"], int]:
+        """
+        Разобрать записи журнала
+
+        Returns:
+            Кортеж (записи, длина корректной части данных)
+        """
+        records = []
+        offset = 0
+        size = RECORD_HEADER.size
+        while offset + size <= len(data):
+            fields = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + size + fields[8] + fields[9]
+            if end > len(data):
+                break  # Запись, оборванная при сбое
+            model = data[offset + size:offset + size + fields[8]].decode("utf-8", errors="replace")
+            provider = data[offset + size + fields[8]:end].decode("utf-8", errors="replace")
+            records.append(cls(*fields[:8], model, provider))
+            offset = end
+        return records, offset
+
+
+class _Aggregate:
+    """Агрегат записей одной модели и провайдера за интервал"""
+    __slots__ = ("requests", "cache_hits", "hedged", "coalesced", "response_tokens", "histograms")
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.hedged = 0
+        self.coalesced = 0
+        self.response_tokens = 0
+        self.histograms = {name: LogHistogram() for name in METRICS}
+
+    def add(self, record: _Record):
+        """Учесть запись (ответы из кэша не влияют на гистограммы задержек провайдера)"""
+        self.requests += 1
+        self.response_tokens += record.response_tokens
+        self.hedged += bool(record.flags & FLAG_HEDGED)
+        self.coalesced += bool(record.flags & FLAG_COALESCED)
+        if record.flags & FLAG_CACHE_HIT:
+            self.cache_hits += 1
+            return
+        for name in METRICS:
+            self.histograms[name].add(getattr(record, name))
+
+    def merge(self, other: "_Aggregate"):
+        """Добавить другой агрегат"""
+        self.requests += other.requests
+        self.cache_hits += other.cache_hits
+        self.hedged += other.hedged
+        self.coalesced += other.coalesced
+        self.response_tokens += other.response_tokens
+        for name in METRICS:
+            self.histograms[name].merge(other.histograms[name])
+
+    def summary(self, seconds: int) -> Dict[str, Any]:
+        """Сводка агрегата за окно длительностью seconds"""
+        return {
+            "requests": self.requests,
+            "requests_per_minute": self.requests * MINUTE / seconds,
+            "response_tokens": self.response_tokens,
+            "output_tokens_per_second": self.response_tokens / seconds,
+            "cache_hits": self.cache_hits,
+            "hedged": self.hedged,
+            "coalesced": self.coalesced,
+            **{name: self.histograms[name].summary() for name in METRICS},
+        }
+
+
+class StatsHistory:
+    """
+    История статистики ответов
+
+    Каждый ответ дописывается в компактный бинарный журнал (файл на сутки) и
+    учитывается в агрегатах по модели и провайдеру: минутных за последние 3 часа и
+    часовых за срок хранения. Сводка за окно объединяет гистограммы агрегатов и
+    не перечитывает записи. При запуске агрегаты восстанавливаются из журнала.
+    """
+
+    def __init__(self, directory: Path, retention_days: int = 7):
+        """
+        Инициализация истории
+
+        Args:
+            directory: Папка журнала
+            retention_days: Срок хранения агрегатов в памяти (дни)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.retention_days = retention_days
+        self._tiers: Dict[int, "OrderedDict[int, Dict[GroupKey, _Aggregate]]"] = {
+            MINUTE: OrderedDict(),
+            HOUR: OrderedDict(),
+        }
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._file_day: Optional[str] = None
+        self.records = 0
+        self._load()
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        """Имя суток (UTC) для файла журнала"""
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y%m%d")
+
+    def _path(self, day: str) -> Path:
+        """Путь к файлу журнала за сутки"""
+        return self.directory / f"{day}.bin"
+
+    def _retention(self, tier: int) -> int:
+        """Срок хранения агрегатов уровня (секунды)"""
+        return MINUTE_TIER_SPAN if tier == MINUTE else self.retention_days * 24 * HOUR
+
+    def _load(self):
+        """Восстановить агрегаты из файлов журнала за срок хранения"""
+        now = time.time()
+        start = datetime.fromtimestamp(now, tz=timezone.utc) - timedelta(days=self.retention_days)
+        oldest_day = start.strftime("%Y%m%d")
+        for path in sorted(self.directory.glob("*.bin")):
+            if path.stem < oldest_day:
+                continue
+            data = path.read_bytes()
+            records, valid = _Record.decode_all(data)
+            if valid < len(data):
+                logger.warning(f"Журнал статистики {path.name}: отброшена оборванная запись ({len(data) - valid} байт)")
+                with open(path, "r+b") as file:
+                    file.truncate(valid)
+            for record in records:
+                self._aggregate(record, now)
+        if self.records:
+            logger.info(f"История статистики восстановлена из журнала: {self.records} записей")
+
+    def _aggregate(self, record: _Record, now: float):
+        """Учесть запись в агрегатах всех уровней"""
+        key = (record.model, record.provider)
+        for tier, buckets in self._tiers.items():
+            if record.timestamp < now - self._retention(tier):
+                continue
+            start = int(record.timestamp // tier * tier)
+            groups = buckets.get(start)
+            if groups is None:
+                groups = buckets[start] = {}
+            aggregate = groups.get(key)
+            if aggregate is None:
+                aggregate = groups[key] = _Aggregate()
+            aggregate.add(record)
+            # Интервалы добавляются по возрастанию времени, старые удаляются с начала
+            while next(iter(buckets)) < now - self._retention(tier) - tier:
+                buckets.popitem(last=False)
+        self.records += 1
+
+    def record(self, metadata: ResponseMetadata):
+        """
+        Записать статистику ответа
+
+        Args:
+            metadata: Метаданные ответа
+        """
+        now = time.time()
+        entry = _Record.from_metadata(metadata, now)
+        with tracer.start_span("storage.stats_history.record"), self._lock, STORAGE_WRITE_DURATION.time("stats_history"):
+            self._aggregate(entry, now)
+            try:
+                day = self._day(now)
+                if self._file_day != day:
+                    if self._file is not None:
+                        self._file.close()
+                    self._file = open(self._path(day), "ab")
+                    self._file_day = day
+                self._file.write(entry.encode())
+                self._file.flush()
+            except OSError as e:
+                logger.error(f"Ошибка записи журнала статистики: {str(e)}")
+
+    def summary(
+        self,
+        window: int,
+        model: Optional[str] = None,
+        provider: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Сводка за окно по агрегатам
+
+        Окно до 3 часов считается по минутным агрегатам, длиннее - по часовым
+        (начало окна округляется вниз до начала интервала).
+
+        Args:
+            window: Длительность окна (секунды)
+            model: Только указанная модель
+            provider: Только указанный провайдер
+
+        Returns:
+            Общая сводка и сводки по парам модель/провайдер
+        """
+        now = time.time()
+        tier = MINUTE if window <= MINUTE_TIER_SPAN else HOUR
+        since = int((now - window) // tier * tier)
+        total = _Aggregate()
+        groups: Dict[GroupKey, _Aggregate] = {}
+        with self._lock:
+            for start, bucket in self._tiers[tier].items():
+                if start < since:
+                    continue
+                for key, aggregate in bucket.items():
+                    if (model is not None and key[0] != model) or (provider is not None and key[1] != provider):
+                        continue
+                    group = groups.get(key)
+                    if group is None:
+                        group = groups[key] = _Aggregate()
+                    group.merge(aggregate)
+                    total.merge(aggregate)
+        return {
+            "window_seconds": window,
+            "resolution_seconds": tier,
+            "model": model,
+            "provider": provider,
+            "total": total.summary(window),
+            "groups": [
+                {"model": key[0] or None, "provider": key[1] or None, **aggregate.summary(window)}
+                for key, aggregate in sorted(groups.items())
+            ],
+        }
+
+    def close(self):
+        """Закрыть файл журнала"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._file_day = None
@@ -0,0 +1,83 @@
+"""
+Быстрая сериализация JSON
+
+Используется orjson, если пакет установлен (необязательная зависимость), иначе
+стандартный модуль json с теми же параметрами вывода: UTF-8 без экранирования
+не-ASCII символов, компактные разделители или отступ в 2 пробела.
+"""
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Используемая реализация (для логов и бенчмарков)
+BACKEND = "orjson" if orjson is not None else "json"
+
+# Ошибка разбора JSON (orjson.JSONDecodeError - подкласс json.JSONDecodeError)
+JSONDecodeError = json.JSONDecodeError
+
+
+def _stdlib_dumps(obj: Any, indent: bool, sort_keys: bool, default: Optional[Callable[[Any], Any]]) -> str:
+    """Сериализация стандартным модулем json"""
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys, default=default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=default)
+
+
+def dumps(
+    obj: Any,
+    indent: bool = False,
+    sort_keys: bool = False,
+    default: Optional[Callable[[Any], Any]] = None
+) -> bytes:
+    """
+    Сериализовать объект в JSON (UTF-8)
+
+    Args:
+        obj: JSON-совместимый объект
+        indent: Отступ в 2 пробела (для файлов, которые читает человек)
+        sort_keys: Сортировать ключи словарей
+        default: Преобразование значений, не поддерживаемых JSON (например, str)
+
+    Returns:
+        JSON в кодировке UTF-8
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            # Значения, которые orjson не поддерживает (например, целые больше 64 бит)
+            pass
+    return _stdlib_dumps(obj, indent, sort_keys, default).encode("utf-8")
+
+
+def dumps_str(
+    obj: Any,
+    indent: bool = False,
+    sort_keys: bool = False,
+    default: Optional[Callable[[Any], Any]] = None
+) -> str:
+    """Сериализовать объект в JSON строку (параметры как у dumps)"""
+    if orjson is None:
+        return _stdlib_dumps(obj, indent, sort_keys, default)
+    return dumps(obj, indent=indent, sort_keys=sort_keys, default=default).decode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, str]) -> Any:
+    """
+    Разобрать JSON
+
+    Raises:
+        JSONDecodeError: Некорректный JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
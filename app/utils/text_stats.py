@@ -0,0 +1,145 @@
+"""Оценка токенов, слов и символов текста и сообщений с кэшем по хэшу содержимого"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+# Среднее количество символов на токен для оценки
+CHARS_PER_TOKEN = 4
+# Служебные токены на одно сообщение (роль, разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Служебные токены на один вызов инструмента (id, тип, разделители)
+TOOL_CALL_OVERHEAD_TOKENS = 8
+
+
+def estimate_text_tokens(text: Optional[str]) -> int:
+    """
+    Оценить количество токенов в тексте
+
+    Args:
+        text: Текст
+
+    Returns:
+        Оценка количества токенов (символы / CHARS_PER_TOKEN, с округлением вверх)
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def content_text(content: Any) -> Optional[str]:
+    """Текст content сообщения (строка или текстовые части списка в формате OpenAI)"""
+    if content is None or isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part.get("text") or "" for part in content if isinstance(part, dict))
+    return str(content)
+
+
+class TextCounts(NamedTuple):
+    """Оценка токенов, количество слов и символов"""
+    tokens: int = 0
+    words: int = 0
+    characters: int = 0
+
+    def __add__(self, other: "TextCounts") -> "TextCounts":
+        return TextCounts(self.tokens + other.tokens, self.words + other.words, self.characters + other.characters)
+
+    def as_dict(self) -> Dict[str, int]:
+        """Словарь для JSON (tokens, words, characters)"""
+        return {"tokens": self.tokens, "words": self.words, "characters": self.characters}
+
+
+class TextCountCache:
+    """
+    Кэш подсчета токенов, слов и символов по хэшу текста
+
+    Один и тот же текст считается один раз: content ответа при вычислении метаданных,
+    затем то же сообщение в текущем и сохраненном контексте и в бюджете контекста
+    следующих запросов. Кэш общий для потока записи и event loop, поэтому защищен
+    блокировкой.
+    """
+
+    def __init__(self, max_entries: int = 8192):
+        """
+        Args:
+            max_entries: Максимальное количество текстов в кэше (вытесняются самые старые)
+        """
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[bytes, TextCounts]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def text(self, text: Optional[str]) -> TextCounts:
+        """Подсчет для текста (пустой текст - нули)"""
+        if not text:
+            return TextCounts()
+        key = hashlib.sha1(text.encode("utf-8", "surrogatepass")).digest()
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return counts
+            self.misses += 1
+        counts = TextCounts(estimate_text_tokens(text), len(text.split()), len(text))
+        with self._lock:
+            self._counts[key] = counts
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return counts
+
+    def message(self, message: Any) -> TextCounts:
+        """
+        Подсчет для сообщения (Message, ChatCompletionMessage или словарь в формате OpenAI)
+
+        Слова и символы - по тексту content; оценка токенов дополнительно учитывает
+        служебные токены сообщения, name и вызовы инструментов.
+        """
+        if isinstance(message, dict):
+            content, name = message.get("content"), message.get("name")
+            calls = [call.get("function") or {} for call in message.get("tool_calls") or ()]
+            functions = [(function.get("name"), function.get("arguments")) for function in calls]
+        else:
+            content, name = message.content, message.name
+            functions = [(call.function.name, call.function.arguments) for call in message.tool_calls or ()]
+        counts = self.text(content_text(content))
+        tokens = MESSAGE_OVERHEAD_TOKENS + counts.tokens + estimate_text_tokens(name)
+        for function_name, arguments in functions:
+            tokens += (
+                TOOL_CALL_OVERHEAD_TOKENS
+                + estimate_text_tokens(function_name)
+                + self.text(arguments if isinstance(arguments, str) else None).tokens
+            )
+        return TextCounts(tokens, counts.words, counts.characters)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша"""
+        return {"entries": len(self._counts), "hits": self.hits, "misses": self.misses}
+
+
+# Общий кэш процесса
+text_counts = TextCountCache()
+
+
+def message_stats(messages: Iterable[Any]) -> List[Dict[str, int]]:
+    """
+    Подсчеты сообщений для хранения рядом с контекстом
+
+    Args:
+        messages: Сообщения (Message)
+
+    Returns:
+        Список словарей (tokens, words, characters) в порядке сообщений
+    """
+    return [text_counts.message(message).as_dict() for message in messages]
+
+
+def totals(stats: Iterable[Dict[str, Any]], message_count: int) -> Dict[str, int]:
+    """Итоги контекста по подсчетам сообщений"""
+    result = TextCounts()
+    for item in stats:
+        result += TextCounts(item["tokens"], item["words"], item["characters"])
+    return {"messages": message_count, **result.as_dict()}
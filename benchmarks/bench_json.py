@@ -0,0 +1,163 @@
+"""
+Бенчмарк сериализации JSON на пути запроса chat completion
+
+Сравнивает прежний путь на стандартном модуле json с app.utils.fastjson на
+большом контексте (много сообщений с не-ASCII текстом и tool calls):
+
+- request: тело запроса к провайдеру (httpx json= против content=fastjson.dumps)
+- response: разбор ответа провайдера и валидация ChatCompletionResponse
+- api_response: ответ клиенту (jsonable_encoder + JSONResponse против FastJSONResponse)
+- storage_context / storage_stats: файлы текущих данных (json.dumps indent=2 против компактного JSON)
+- sse_chunk: разбор чанков streaming ответа
+
+Запуск из корня репозитория:
+    python benchmarks/bench_json.py --messages 400 --message-size 4000
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.api.responses import FastJSONResponse  # noqa: E402
+from app.models.chat import ChatCompletionRequest, ChatCompletionResponse  # noqa: E402
+from app.models.metadata import ResponseMetadata  # noqa: E402
+from app.utils import fastjson  # noqa: E402
+
+URL = "http://provider.local/v1/chat/completions"
+
+
+def make_request(messages: int, message_size: int) -> ChatCompletionRequest:
+    """Запрос с большим контекстом"""
+    text = ("Пример текста контекста с юникодом — ünïcødé 🚀 and some ASCII words. " * (message_size // 70 + 1))[:message_size]
+    data: List[Dict[str, Any]] = [{"role": "system", "content": text}]
+    for index in range(messages):
+        if index % 10 == 9:
+            data.append({
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{index}",
+                    "type": "function",
+                    "function": {"name": "search", "arguments": json.dumps({"query": text[:200], "limit": 10})}
+                }]
+            })
+            data.append({"role": "tool", "tool_call_id": f"call_{index}", "content": text})
+        else:
+            data.append({"role": "user" if index % 2 == 0 else "assistant", "content": text})
+    return ChatCompletionRequest(model="bench-model", messages=data, temperature=0.7, max_tokens=1024)
+
+
+def make_response(message_size: int) -> bytes:
+    """Тело ответа провайдера"""
+    text = ("Ответ модели с юникодом — ünïcødé. " * (message_size // 35 + 1))[:message_size]
+    return json.dumps({
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 1700000000,
+        "model": "bench-model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 120000, "completion_tokens": 900, "total_tokens": 120900}
+    }).encode("utf-8")
+
+
+def measure(function: Callable[[], Any], repeat: int) -> float:
+    """Медиана времени выполнения (секунды)"""
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run(messages: int, message_size: int, repeat: int) -> List[Dict[str, Any]]:
+    """Выполнить все сценарии"""
+    request = make_request(messages, message_size)
+    response_body = make_response(message_size)
+    response = ChatCompletionResponse.model_validate(json.loads(response_body))
+    context = {"name": "bench", "messages": [message.model_dump(exclude_none=True) for message in request.messages]}
+    stats = ResponseMetadata(
+        timestamp="2024-01-01T00:00:00", latency=0.8, time_to_first_token=0.8, total_time=12.5,
+        response_tokens=900, response_words=600, response_characters=4000, avg_token_length=4.4,
+        avg_word_tokens=1.5, context_tokens=120000, inference_speed=72.0, provider="bench", model="bench-model"
+    ).model_dump()
+    chunk = json.dumps({
+        "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1700000000, "model": "bench-model",
+        "choices": [{"index": 0, "delta": {"content": "токен "}, "finish_reason": None}]
+    }, ensure_ascii=False)
+    chunks = [chunk] * 1000
+
+    scenarios = {
+        "request": (
+            lambda: httpx.Request("POST", URL, json=request.model_dump(exclude_none=True)),
+            lambda: httpx.Request("POST", URL, content=fastjson.dumps(request.model_dump(exclude_none=True))),
+        ),
+        "response": (
+            lambda: ChatCompletionResponse(**json.loads(response_body)),
+            lambda: ChatCompletionResponse.model_validate(fastjson.loads(response_body)),
+        ),
+        "api_response": (
+            lambda: JSONResponse(jsonable_encoder(response)),
+            lambda: FastJSONResponse(response),
+        ),
+        "storage_context": (
+            lambda: json.dumps(context, ensure_ascii=False, indent=2).encode("utf-8"),
+            lambda: fastjson.dumps(context),
+        ),
+        "storage_stats": (
+            lambda: json.dumps(stats, ensure_ascii=False, indent=2).encode("utf-8"),
+            lambda: fastjson.dumps(stats),
+        ),
+        "sse_chunk": (
+            lambda: [json.loads(data) for data in chunks],
+            lambda: [fastjson.loads(data) for data in chunks],
+        ),
+    }
+
+    results = []
+    for name, (baseline, fast) in scenarios.items():
+        baseline_time = measure(baseline, repeat)
+        fast_time = measure(fast, repeat)
+        results.append({
+            "scenario": name,
+            "stdlib_ms": baseline_time * 1000,
+            "fastjson_ms": fast_time * 1000,
+            "speedup": baseline_time / fast_time if fast_time else float("inf"),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение стандартного json и app.utils.fastjson")
+    parser.add_argument("--messages", type=int, default=400, help="Количество сообщений контекста")
+    parser.add_argument("--message-size", type=int, default=4000, help="Размер сообщения (символы)")
+    parser.add_argument("--repeat", type=int, default=20, help="Количество повторов каждого сценария")
+    parser.add_argument("--json", action="store_true", help="Вывести результаты в JSON")
+    args = parser.parse_args()
+
+    results = run(args.messages, args.message_size, args.repeat)
+    if args.json:
+        print(json.dumps({"backend": fastjson.BACKEND, "results": results}, indent=2))
+        return
+
+    print(f"fastjson backend: {fastjson.BACKEND}; messages={args.messages}, message_size={args.message_size}")
+    print(f"{'scenario':<18}{'stdlib, ms':>12}{'fastjson, ms':>14}{'speedup':>10}")
+    for result in results:
+        print(
+            f"{result['scenario']:<18}{result['stdlib_ms']:>12.3f}"
+            f"{result['fastjson_ms']:>14.3f}{result['speedup']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Нагрузочный бенчмарк прокси app.main:app с mock провайдером
+
+Запускает mock провайдер (benchmarks/mock_provider.py) в фоновом потоке и
+приложение в отдельном процессе uvicorn с временной конфигурацией, указывающей
+на mock, затем отправляет запросы в /v1/chat/completions с фиксированным
+количеством одновременных запросов.
+
+Время ответа провайдера для каждого запроса известно заранее (план mock
+провайдера детерминирован для содержимого сообщения), поэтому накладные
+расходы прокси считаются по каждому запросу: наблюдаемая задержка минус время
+провайдера (включает и накладные расходы HTTP клиента бенчмарка; с --baseline
+та же нагрузка отправляется напрямую в mock, и разница перцентилей дает
+накладные расходы собственно прокси).
+
+Результаты:
+- overhead_ms / ttft_overhead_ms: накладные расходы p50/p90/p99 (для streaming - и до первого чанка)
+- rps: запросов в секунду
+- cpu_ms_per_request: процессорное время процесса приложения на запрос
+- rss_mb: память процесса приложения до и после нагрузки, пик и прирост
+
+Отчет сохраняется в JSON (--output) вместе с коммитом, чтобы сравнивать
+результаты разных коммитов (--compare).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_load.py --concurrency 32 --requests 2000 --stream --output load.json
+    python benchmarks/bench_load.py --latency lognormal:0.05:0.5 --error-rate 0.01 --compare load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+import yaml  # noqa: E402
+
+from mock_provider import MockProvider, MockSettings  # noqa: E402
+
+# Метрики, выводимые при сравнении отчетов: (путь в results, меньше - лучше)
+COMPARED_METRICS = [
+    ("rps", False),
+    ("latency_ms.p50", True),
+    ("latency_ms.p99", True),
+    ("overhead_ms.p50", True),
+    ("overhead_ms.p99", True),
+    ("ttft_overhead_ms.p50", True),
+    ("ttft_overhead_ms.p99", True),
+    ("cpu_ms_per_request", True),
+    ("rss_mb.growth", True),
+]
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """Перцентили p50/p90/p99, среднее и максимум в миллисекундах (значения - в секундах)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {
+        "p50": round(at(50), 3),
+        "p90": round(at(90), 3),
+        "p99": round(at(99), 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3)
+    }
+
+
+def free_port() -> int:
+    """Свободный TCP порт на 127.0.0.1"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_usage(pid: int) -> Optional[Dict[str, float]]:
+    """
+    Процессорное время и память процесса
+
+    Args:
+        pid: Идентификатор процесса
+
+    Returns:
+        Словарь cpu (секунды user + system) и rss (байты) или None, если недоступно
+        (используется /proc, иначе psutil, если установлен)
+    """
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        rss_pages = int(Path(f"/proc/{pid}/statm").read_text().split()[1])
+        return {
+            "cpu": (int(stat[11]) + int(stat[12])) / ticks,
+            "rss": rss_pages * os.sysconf("SC_PAGE_SIZE")
+        }
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        process = psutil.Process(pid)
+        times = process.cpu_times()
+        return {"cpu": times.user + times.system, "rss": process.memory_info().rss}
+    except psutil.Error:
+        return None
+
+
+def git_commit() -> Dict[str, Any]:
+    """Текущий коммит репозитория и наличие незакоммиченных изменений"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def write_config(directory: Path, provider_url: str, max_tokens: int):
+    """Временная конфигурация приложения с mock провайдером"""
+    for name in ("config", "prompts", "contexts"):
+        (directory / name).mkdir()
+    (directory / "prompts" / "system.txt").write_text("You are a benchmark assistant.", encoding="utf-8")
+    model_config = {
+        "provider_url": provider_url,
+        "api_key": "mock",
+        "model_name": "mock-model",
+        "temperature": 0.7,
+        "max_tokens": max_tokens,
+        "system_prompt_path": "prompts/system.txt"
+    }
+    app_config = {
+        "model_config_path": "config/model_config.yaml",
+        "contexts_dir": "contexts",
+        "stats_dir": "contexts",
+        "prompts_dir": "prompts",
+        "system_prompt_path": "prompts/system.txt",
+        "config_watch_interval": 0,
+        "logging": {"level": "WARNING", "console": False}
+    }
+    (directory / "config" / "model_config.yaml").write_text(yaml.safe_dump(model_config), encoding="utf-8")
+    (directory / "config" / "config.yaml").write_text(yaml.safe_dump(app_config), encoding="utf-8")
+
+
+class AppProcess:
+    """Приложение app.main:app в отдельном процессе uvicorn"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 30.0):
+        """Запустить процесс и дождаться ответа /health"""
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))}
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=self.directory, env=env
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Процесс приложения завершился с кодом {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("Приложение не запустилось")
+
+    def stop(self):
+        """Остановить процесс"""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+async def one_request(
+    client: httpx.AsyncClient,
+    url: str,
+    settings: MockSettings,
+    key: str,
+    stream: bool
+) -> Dict[str, Any]:
+    """
+    Отправить запрос и измерить задержку
+
+    Returns:
+        Словарь status, latency, ttft (streaming), overhead и ttft_overhead
+        (задержка минус время провайдера по плану mock), секунды
+    """
+    plan = settings.plan(key, stream)
+    body = {"model": "mock-model", "messages": [{"role": "user", "content": key}], "stream": stream}
+    started = time.perf_counter()
+    ttft = None
+    try:
+        if stream:
+            async with client.stream("POST", url, json=body) as response:
+                async for line in response.aiter_lines():
+                    if ttft is None and line.startswith("data:"):
+                        ttft = time.perf_counter() - started
+        else:
+            response = await client.post(url, json=body)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    latency = time.perf_counter() - started
+    result = {"status": status, "latency": latency, "ttft": ttft}
+    if status == 200 and not plan["error"]:
+        result["overhead"] = latency - plan["duration"]
+        if ttft is not None:
+            result["ttft_overhead"] = ttft - plan["latency"]
+    return result
+
+
+async def run_load(
+    url: str,
+    settings: MockSettings,
+    concurrency: int,
+    requests: int,
+    stream: bool,
+    prefix: str
+) -> Dict[str, Any]:
+    """
+    Отправить requests запросов с concurrency одновременными запросами
+
+    Returns:
+        Словарь results (результаты запросов) и duration (общее время, секунды)
+    """
+    counter = iter(range(requests))
+    results: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(120.0)) as client:
+        async def worker():
+            for index in counter:
+                results.append(await one_request(client, url, settings, f"{prefix}-{index}", stream))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+    return {"results": results, "duration": duration}
+
+
+def summarize(load: Dict[str, Any]) -> Dict[str, Any]:
+    """Сводка результатов нагрузки"""
+    results = load["results"]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result["status"] != 200:
+            errors[str(result["status"])] = errors.get(str(result["status"]), 0) + 1
+    summary = {
+        "requests": len(results),
+        "ok": len(results) - sum(errors.values()),
+        "errors": errors,
+        "duration_s": round(load["duration"], 3),
+        "rps": round(len(results) / load["duration"], 2) if load["duration"] else None,
+        "latency_ms": percentiles([r["latency"] for r in results if r["status"] == 200]),
+        "overhead_ms": percentiles([r["overhead"] for r in results if "overhead" in r])
+    }
+    ttft = [r["ttft_overhead"] for r in results if "ttft_overhead" in r]
+    if ttft:
+        summary["ttft_overhead_ms"] = percentiles(ttft)
+    return summary
+
+
+async def sample_rss(pid: int, stop: asyncio.Event, peak: List[int]):
+    """Отслеживать пиковый объем памяти процесса"""
+    while not stop.is_set():
+        usage = process_usage(pid)
+        if usage:
+            peak[0] = max(peak[0], usage["rss"])
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def measure_app(app: AppProcess, settings: MockSettings, args: argparse.Namespace) -> Dict[str, Any]:
+    """Прогрев, затем нагрузка на приложение с замером CPU и памяти процесса"""
+    url = f"{app.url}/v1/chat/completions"
+    if args.warmup:
+        await run_load(url, settings, args.concurrency, args.warmup, args.stream, "warmup")
+
+    pid = app.process.pid
+    before = process_usage(pid)
+    peak = [before["rss"] if before else 0]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pid, stop, peak))
+    load = await run_load(url, settings, args.concurrency, args.requests, args.stream, "bench")
+    stop.set()
+    await sampler
+    after = process_usage(pid)
+
+    summary = summarize(load)
+    if before and after:
+        megabyte = 1024 * 1024
+        summary["cpu_ms_per_request"] = round((after["cpu"] - before["cpu"]) / max(1, len(load["results"])) * 1000, 3)
+        summary["cpu_utilization"] = round((after["cpu"] - before["cpu"]) / load["duration"], 3)
+        summary["rss_mb"] = {
+            "start": round(before["rss"] / megabyte, 2),
+            "end": round(after["rss"] / megabyte, 2),
+            "peak": round(max(peak[0], after["rss"]) / megabyte, 2),
+            "growth": round((after["rss"] - before["rss"]) / megabyte, 2)
+        }
+    return summary
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Запустить mock провайдер и приложение, выполнить нагрузку и собрать отчет"""
+    settings = MockSettings(
+        latency=args.latency,
+        chunk_interval=args.chunk_interval,
+        chunks=args.chunks,
+        tool_call_rate=args.tool_call_rate,
+        tool_arguments_size=args.tool_arguments_size,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    mock = MockProvider(settings).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-load-") as directory:
+            write_config(Path(directory), mock.url, max_tokens=args.chunks * 4)
+            app = AppProcess(Path(directory))
+            app.start()
+            try:
+                results = asyncio.run(measure_app(app, settings, args))
+            finally:
+                app.stop()
+            baseline = None
+            if args.baseline:
+                baseline = summarize(asyncio.run(run_load(
+                    f"{mock.url}/chat/completions", settings, args.concurrency, args.requests, args.stream, "bench"
+                )))
+    finally:
+        mock.stop()
+
+    if baseline:
+        results["baseline"] = baseline
+        for name in ("overhead_ms", "ttft_overhead_ms"):
+            if results.get(name) and baseline.get(name):
+                results[f"net_{name}"] = {
+                    key: round(results[name][key] - baseline[name][key], 3) for key in ("p50", "p90", "p99")
+                }
+    return {
+        "benchmark": "load",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "stream": args.stream,
+            "mock": settings.as_dict()
+        },
+        "results": results
+    }
+
+
+def metric(results: Dict[str, Any], path: str) -> Optional[float]:
+    """Значение метрики по пути вида "overhead_ms.p99" """
+    value: Any = results
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def print_report(report: Dict[str, Any], base: Optional[Dict[str, Any]] = None):
+    """Вывести основные метрики (и сравнение с отчетом base)"""
+    params = report["params"]
+    results = report["results"]
+    commit = (report["commit"] or "unknown")[:12] + (" (dirty)" if report["dirty"] else "")
+    print(
+        f"commit {commit}; concurrency={params['concurrency']}, requests={params['requests']}, "
+        f"stream={params['stream']}, latency={params['mock']['latency']}"
+    )
+    print(f"ok={results['ok']}, errors={results['errors'] or 0}, duration={results['duration_s']} s")
+    if base:
+        base_commit = (base.get("commit") or "unknown")[:12]
+        print(f"{'metric':<24}{'value':>12}{base_commit:>16}{'change':>10}")
+    else:
+        print(f"{'metric':<24}{'value':>12}")
+    for path, _ in COMPARED_METRICS:
+        value = metric(results, path)
+        if value is None:
+            continue
+        line = f"{path:<24}{value:>12.3f}"
+        if base:
+            base_value = metric(base["results"], path)
+            if base_value is not None:
+                change = f"{(value - base_value) / base_value * 100:+.1f}%" if base_value else "-"
+                line += f"{base_value:>16.3f}{change:>10}"
+        print(line)
+    for name in ("net_overhead_ms", "net_ttft_overhead_ms"):
+        if results.get(name):
+            print(f"{name}: p50={results[name]['p50']}, p99={results[name]['p99']} (относительно прямых запросов в mock)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк прокси с mock провайдером")
+    defaults = MockSettings()
+    parser.add_argument("--concurrency", type=int, default=16, help="Количество одновременных запросов")
+    parser.add_argument("--requests", type=int, default=1000, help="Количество запросов")
+    parser.add_argument("--warmup", type=int, default=50, help="Количество запросов прогрева (не учитываются)")
+    parser.add_argument("--stream", action="store_true", help="Streaming запросы")
+    parser.add_argument("--baseline", action="store_true", help="Отправить ту же нагрузку напрямую в mock для сравнения")
+    parser.add_argument("--latency", default=defaults.latency, help="Задержка провайдера (fixed:S, uniform:MIN:MAX, normal:MEAN:STD, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--chunk-interval", default=defaults.chunk_interval, help="Интервал между чанками (распределение)")
+    parser.add_argument("--chunks", type=int, default=defaults.chunks, help="Количество чанков (слов) в ответе")
+    parser.add_argument("--tool-call-rate", type=float, default=defaults.tool_call_rate, help="Доля ответов с tool_calls")
+    parser.add_argument("--tool-arguments-size", type=int, default=defaults.tool_arguments_size, help="Размер аргументов tool call")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Доля ответов провайдера с ошибкой")
+    parser.add_argument("--error-status", type=int, default=defaults.error_status, help="HTTP статус ошибки провайдера")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Начальное значение генератора mock провайдера")
+    parser.add_argument("--output", type=Path, help="Сохранить отчет в JSON файл")
+    parser.add_argument("--compare", type=Path, help="Сравнить с сохраненным отчетом")
+    parser.add_argument("--json", action="store_true", help="Вывести отчет в JSON")
+    args = parser.parse_args()
+
+    base = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    report = run(args)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    print_report(report, base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Mock OpenAI-совместимого провайдера для нагрузочных тестов и отладки
+
+Реализует POST /v1/chat/completions (и /chat/completions) без обращения к
+настоящей модели:
+
+- задержка до ответа (до первого чанка при streaming) по распределению:
+  fixed:0.05, uniform:0.02:0.2, normal:0.1:0.02, lognormal:0.1:0.5
+  (lognormal - медиана и sigma);
+- streaming: количество чанков и интервал между ними (тоже распределение);
+- ответы с tool_calls с заданной долей и размером аргументов;
+- ошибки с заданной долей и статусом (429/503 с Retry-After: 0).
+
+План ответа (задержка, интервалы, ошибка, tool call) детерминирован для
+содержимого последнего сообщения, поэтому генератор нагрузки может вычислить
+время провайдера для каждого запроса (MockSettings.plan) и вычесть его из
+наблюдаемой задержки.
+
+Отдельный сервер (из корня репозитория):
+    python benchmarks/mock_provider.py --port 8999 --latency lognormal:0.1:0.5 --error-rate 0.01
+    MOCK_LATENCY=fixed:0.05 uvicorn benchmarks.mock_provider:create_app --factory --port 8999
+
+В процессе (фоновый поток):
+    server = MockProvider(MockSettings(latency="fixed:0.05")).start()
+    ...
+    server.stop()
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import Response, StreamingResponse  # noqa: E402
+
+from app.utils import fastjson  # noqa: E402
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog while proxy forwards tokens "
+    "быстрый ответ модели проходит через прокси без лишних задержек"
+).split()
+
+
+def parse_distribution(spec: str) -> List[Any]:
+    """
+    Разобрать описание распределения
+
+    Args:
+        spec: Строка вида "fixed:0.05", "uniform:min:max", "normal:mean:std", "lognormal:median:sigma"
+
+    Returns:
+        Список [тип, параметр1, параметр2]
+
+    Raises:
+        ValueError: Некорректное описание
+    """
+    kind, _, rest = spec.partition(":")
+    try:
+        params = [float(value) for value in rest.split(":")] if rest else []
+    except ValueError:
+        raise ValueError(f"Некорректные параметры распределения: {spec}")
+    expected = 1 if kind == "fixed" else 2
+    if kind not in DISTRIBUTIONS or len(params) != expected or any(value < 0 for value in params):
+        raise ValueError(
+            f"Некорректное распределение: {spec} "
+            "(fixed:S, uniform:MIN:MAX, normal:MEAN:STD, lognormal:MEDIAN:SIGMA)"
+        )
+    return [kind, *params]
+
+
+def sample(distribution: List[Any], rng: random.Random) -> float:
+    """Значение распределения в секундах (не меньше нуля)"""
+    kind = distribution[0]
+    if kind == "fixed":
+        return distribution[1]
+    if kind == "uniform":
+        return rng.uniform(distribution[1], distribution[2])
+    if kind == "normal":
+        return max(0.0, rng.gauss(distribution[1], distribution[2]))
+    median = distribution[1]
+    return median * math.exp(rng.gauss(0.0, distribution[2])) if median > 0 else 0.0
+
+
+@dataclass
+class MockSettings:
+    """Параметры mock провайдера"""
+    latency: str = "fixed:0.05"  # Задержка до ответа / первого чанка
+    chunk_interval: str = "fixed:0.005"  # Интервал между чанками streaming ответа
+    chunks: int = 20  # Количество чанков content (слов) в ответе
+    tool_call_rate: float = 0.0  # Доля ответов с tool_calls
+    tool_arguments_size: int = 200  # Размер аргументов tool call (символы)
+    error_rate: float = 0.0  # Доля ответов с ошибкой
+    error_status: int = 503  # Статус ошибки
+    seed: int = 0  # Начальное значение генератора (план ответа зависит от seed и запроса)
+    _latency: List[Any] = field(default=None, init=False, repr=False)
+    _chunk_interval: List[Any] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self._latency = parse_distribution(self.latency)
+        self._chunk_interval = parse_distribution(self.chunk_interval)
+
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        """Параметры из переменных окружения MOCK_* (для запуска через uvicorn)"""
+        defaults = cls()
+        return cls(
+            latency=os.environ.get("MOCK_LATENCY", defaults.latency),
+            chunk_interval=os.environ.get("MOCK_CHUNK_INTERVAL", defaults.chunk_interval),
+            chunks=int(os.environ.get("MOCK_CHUNKS", defaults.chunks)),
+            tool_call_rate=float(os.environ.get("MOCK_TOOL_CALL_RATE", defaults.tool_call_rate)),
+            tool_arguments_size=int(os.environ.get("MOCK_TOOL_ARGUMENTS_SIZE", defaults.tool_arguments_size)),
+            error_rate=float(os.environ.get("MOCK_ERROR_RATE", defaults.error_rate)),
+            error_status=int(os.environ.get("MOCK_ERROR_STATUS", defaults.error_status)),
+            seed=int(os.environ.get("MOCK_SEED", defaults.seed))
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Параметры для JSON отчета"""
+        return {key: value for key, value in asdict(self).items() if not key.startswith("_")}
+
+    def plan(self, key: str, stream: bool) -> Dict[str, Any]:
+        """
+        План ответа для запроса
+
+        Args:
+            key: Содержимое последнего сообщения запроса
+            stream: Streaming ответ
+
+        Returns:
+            Словарь: error (статус или None), latency, intervals (интервалы между
+            чанками), tool_call, duration - полное время ответа провайдера в секундах
+        """
+        rng = random.Random(zlib.crc32(f"{self.seed}:{key}".encode("utf-8")))
+        error = self.error_status if rng.random() < self.error_rate else None
+        latency = sample(self._latency, rng)
+        tool_call = rng.random() < self.tool_call_rate
+        intervals = [sample(self._chunk_interval, rng) for _ in range(self.chunks - 1)] if stream and not error else []
+        return {
+            "error": error,
+            "latency": latency,
+            "intervals": intervals,
+            "tool_call": tool_call,
+            "duration": latency + sum(intervals)
+        }
+
+
+def _last_content(body: Dict[str, Any]) -> str:
+    """Содержимое последнего сообщения запроса (ключ плана ответа)"""
+    messages = body.get("messages") or []
+    content = messages[-1].get("content") if messages and isinstance(messages[-1], dict) else None
+    return content if isinstance(content, str) else ""
+
+
+def _tool_call(index: int, size: int) -> Dict[str, Any]:
+    """Вызов инструмента с аргументами заданного размера"""
+    arguments = '{"query": "' + ("x" * max(0, size - 14)) + '"}'
+    return {"id": f"call_mock_{index}", "type": "function", "function": {"name": "search", "arguments": arguments}}
+
+
+def create_app(settings: Optional[MockSettings] = None) -> FastAPI:
+    """
+    Создать приложение mock провайдера
+
+    Args:
+        settings: Параметры (по умолчанию - из переменных окружения MOCK_*)
+
+    Returns:
+        FastAPI приложение; счетчики запросов - в app.state.stats и GET /mock/stats
+    """
+    settings = settings or MockSettings.from_env()
+    mock = FastAPI(title="Mock LLM provider")
+    mock.state.settings = settings
+    stats = mock.state.stats = {"requests": 0, "streams": 0, "errors": 0, "tool_calls": 0}
+
+    def usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, Any]:
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in body.get("messages") or []) // 4 + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    async def chat_completions(request: Request):
+        body = fastjson.loads(await request.body())
+        stream = bool(body.get("stream"))
+        plan = settings.plan(_last_content(body), stream)
+        stats["requests"] += 1
+        model = body.get("model") or "mock-model"
+        completion_id = f"chatcmpl-mock-{stats['requests']}"
+        created = int(time.time())
+
+        if plan["error"]:
+            stats["errors"] += 1
+            await asyncio.sleep(plan["latency"])
+            return Response(
+                fastjson.dumps({"error": {"message": "Injected mock error", "type": "mock_error"}}),
+                status_code=plan["error"],
+                media_type="application/json",
+                headers={"Retry-After": "0"}
+            )
+
+        words = [WORDS[index % len(WORDS)] for index in range(settings.chunks)]
+        tool_calls = [_tool_call(stats["requests"], settings.tool_arguments_size)] if plan["tool_call"] else None
+        if tool_calls:
+            stats["tool_calls"] += 1
+
+        if not stream:
+            await asyncio.sleep(plan["latency"])
+            message: Dict[str, Any] = {"role": "assistant", "content": " ".join(words)}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return Response(
+                fastjson.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                    "usage": usage(body, len(words))
+                }),
+                media_type="application/json"
+            )
+
+        stats["streams"] += 1
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> bytes:
+            choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else []
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": model, "choices": choices, **extra}
+            return b"data: " + fastjson.dumps(data) + b"\n\n"
+
+        async def events():
+            await asyncio.sleep(plan["latency"])
+            for index, word in enumerate(words):
+                if index:
+                    await asyncio.sleep(plan["intervals"][index - 1])
+                delta = {"role": "assistant", "content": word} if index == 0 else {"content": " " + word}
+                yield chunk(delta)
+            if tool_calls:
+                yield chunk({"tool_calls": [{"index": 0, **tool_calls[0]}]})
+            yield chunk({}, "tool_calls" if tool_calls else "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage=usage(body, len(words)))
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    mock.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    mock.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+    @mock.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @mock.get("/mock/stats")
+    async def mock_stats():
+        return {"settings": settings.as_dict(), **stats}
+
+    return mock
+
+
+class MockProvider:
+    """Mock провайдер в фоновом потоке (uvicorn на 127.0.0.1)"""
+
+    def __init__(self, settings: Optional[MockSettings] = None, port: int = 0):
+        """
+        Args:
+            settings: Параметры mock провайдера
+            port: Порт (0 - свободный порт)
+        """
+        self.settings = settings or MockSettings()
+        self.app = create_app(self.settings)
+        self._server = uvicorn.Server(uvicorn.Config(
+            self.app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+        ))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """Порт запущенного сервера"""
+        return self._server.servers[0].sockets[0].getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        """URL провайдера (включая /v1) для provider_url конфигурации модели"""
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self, timeout: float = 10.0) -> "MockProvider":
+        """Запустить сервер и дождаться готовности"""
+        self._thread = threading.Thread(target=self._server.run, name="mock-provider", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("Не удалось запустить mock провайдер")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        """Остановить сервер"""
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-совместимого провайдера")
+    defaults = MockSettings()
+    parser.add_argument("--host", default="127.0.0.1", help="Хост")
+    parser.add_argument("--port", type=int, default=8999, help="Порт")
+    parser.add_argument("--latency", default=defaults.latency, help="Задержка до ответа / первого чанка (распределение)")
+    parser.add_argument("--chunk-interval", default=defaults.chunk_interval, help="Интервал между чанками (распределение)")
+    parser.add_argument("--chunks", type=int, default=defaults.chunks, help="Количество чанков (слов) в ответе")
+    parser.add_argument("--tool-call-rate", type=float, default=defaults.tool_call_rate, help="Доля ответов с tool_calls")
+    parser.add_argument("--tool-arguments-size", type=int, default=defaults.tool_arguments_size, help="Размер аргументов tool call")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Доля ответов с ошибкой")
+    parser.add_argument("--error-status", type=int, default=defaults.error_status, help="HTTP статус ошибки")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Начальное значение генератора")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency,
+        chunk_interval=args.chunk_interval,
+        chunks=args.chunks,
+        tool_call_rate=args.tool_call_rate,
+        tool_arguments_size=args.tool_arguments_size,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
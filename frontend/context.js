@@ -2,6 +2,8 @@
 
 let messages = [];
 let currentContextName = '';
+// Итоги контекста, подсчитанные сервером (tokens, words, characters, messages)
+let contextTotals = null;
 
 // Делаем messages доступным глобально для getContextMessages
 window.messages = messages;
@@ -299,6 +301,11 @@ async function initContextTab() {
                 path = 'новый_контекст';
             }
             
+            // Размер контекста показываем, пока сообщения не изменены локально
+            if (contextTotals && contextTotals.messages === messages.length && messages.length > 0) {
+                path += ` (~${contextTotals.tokens} токенов, ${contextTotals.words} слов)`;
+            }
+            
             if (contextPathDisplay) {
                 contextPathDisplay.textContent = `Путь: ${path}`;
             }
@@ -519,6 +526,7 @@ async function initContextTab() {
                     editableRole: false
                 }));
                 currentContextName = currentContext.name || '';
+                contextTotals = currentContext.totals || null;
                 // Обновляем глобальную ссылку на messages
                 window.messages = messages;
                 renderMessages();
@@ -215,6 +215,11 @@ function initMetadataTab() {
                     <span class="metadata-label">Токены контекста:</span>
                     <span class="metadata-value">${stats.context_tokens || 0}</span>
                 </div>
+                ${stats.cached_tokens != null ? `
+                <div class="metadata-item">
+                    <span class="metadata-label">Токены контекста из кэша провайдера:</span>
+                    <span class="metadata-value">${stats.cached_tokens}</span>
+                </div>` : ''}
                 <div class="metadata-item">
                     <span class="metadata-label">Скорость инференса:</span>
                     <span class="metadata-value">${(stats.inference_speed || 0).toFixed(2)} токенов/сек</span>
@@ -11,11 +11,13 @@ if __name__ == "__main__":
     # Получаем настройки сервера из конфигурации
     host = config_manager.app_config.host if config_manager.app_config.host else "0.0.0.0"
     port = config_manager.app_config.port if config_manager.app_config.port else 8080
+    # Изменения конфигурации подхватываются без перезапуска, reload нужен только при разработке
+    reload = bool(config_manager.app_config.reload)
     
     uvicorn.run(
         "app.main:app",
         host=host,
         port=port,
-        reload=True
+        reload=reload
     )
 
@@ -0,0 +1,92 @@
+"""
+Общие фикстуры тестов: mock провайдер и приложение с временной конфигурацией
+
+Приложение app.main:app читает config/config.yaml относительно текущей папки,
+поэтому тест переходит во временную папку с конфигурацией, указывающей на mock
+провайдер (benchmarks/mock_provider.py), запущенный в фоновом потоке.
+"""
+import sys
+from pathlib import Path
+from typing import Callable
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.mock_provider import MockProvider, MockSettings  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def mock_provider():
+    """Mock провайдер: короткая задержка, 5 чанков в streaming ответе"""
+    provider = MockProvider(MockSettings(latency="fixed:0.05", chunk_interval="fixed:0.001", chunks=5)).start()
+    yield provider
+    provider.stop()
+
+
+@pytest.fixture
+def app_dir(tmp_path: Path, mock_provider: MockProvider) -> Path:
+    """Временная папка приложения: конфигурация, промпты, контексты"""
+    for name in ("config", "prompts", "contexts"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "prompts" / "system.txt").write_text("You are a test assistant.", encoding="utf-8")
+    model_config = {
+        "provider_url": mock_provider.url,
+        "api_key": "test",
+        "model_name": "mock-model",
+        "temperature": 0.7,
+        "max_tokens": 64,
+        "system_prompt_path": "prompts/system.txt",
+    }
+    app_config = {
+        "model_config_path": "config/model_config.yaml",
+        "contexts_dir": "contexts",
+        "stats_dir": "contexts",
+        "prompts_dir": "prompts",
+        "system_prompt_path": "prompts/system.txt",
+        "config_watch_interval": 0,
+        "logging": {"level": "WARNING", "console": False},
+    }
+    (tmp_path / "config" / "model_config.yaml").write_text(yaml.safe_dump(model_config), encoding="utf-8")
+    (tmp_path / "config" / "config.yaml").write_text(yaml.safe_dump(app_config), encoding="utf-8")
+    return tmp_path
+
+
+@pytest.fixture
+def make_client(app_dir: Path, monkeypatch) -> Callable[[], TestClient]:
+    """
+    Фабрика клиентов приложения
+
+    Каждый клиент (with make_client() as client) - отдельный запуск приложения
+    с новым контейнером сервисов, например для проверки продолжения после перезапуска.
+    Конфигурация читается при создании клиента, поэтому изменения update_config
+    в тесте применяются.
+    """
+    monkeypatch.chdir(app_dir)
+    import app.main as main
+    from app.api.dependencies import CONFIG_PATH
+    from app.config.manager import ConfigManager
+
+    def client() -> TestClient:
+        monkeypatch.setattr(main, "config_manager", ConfigManager(CONFIG_PATH))
+        return TestClient(main.app)
+    return client
+
+
+@pytest.fixture
+def update_config(app_dir: Path) -> Callable[..., None]:
+    """
+    Изменение конфигурации перед запуском клиента
+
+    update_config("model_config.yaml", retry={...}) заменяет параметры верхнего уровня
+    файла config/<name>; новый файл (например, конфигурация второго провайдера) создается.
+    """
+    def update(name: str = "config.yaml", **values):
+        path = app_dir / "config" / name
+        data = yaml.safe_load(path.read_text(encoding="utf-8")) if path.exists() else {}
+        data.update(values)
+        path.write_text(yaml.safe_dump(data), encoding="utf-8")
+    return update
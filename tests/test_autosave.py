@@ -0,0 +1,74 @@
+"""Фоновая запись автосохранения: объединение записей, атомарность и удаление во время записи"""
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.storage.autosave import AutosaveWriter
+
+
+@pytest.fixture
+def writer():
+    writer = AutosaveWriter(delay=0.05)
+    yield writer
+    writer.close()
+
+
+def _wait_written(writer: AutosaveWriter, count: int, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while writer.written < count:
+        assert time.monotonic() < deadline, "файл не записан"
+        time.sleep(0.005)
+
+
+def test_writes_are_coalesced_and_atomic(writer, tmp_path: Path):
+    path = tmp_path / "session" / "current_context.json"
+    for index in range(10):
+        writer.write(path, f"version {index}")
+        # Незаписанная версия видна при чтении сразу
+        assert writer.read(path) == f"version {index}"
+
+    _wait_written(writer, 1)
+    writer.flush()
+    assert writer.requested == 10
+    assert writer.written == 1
+    assert path.read_text(encoding="utf-8") == "version 9"
+    # Временные файлы атомарной записи не остаются
+    assert [file.name for file in path.parent.iterdir()] == ["current_context.json"]
+
+
+def test_delete_does_not_wait_for_write_in_progress(writer, tmp_path: Path):
+    path = tmp_path / "current_context.json"
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_content() -> bytes:
+        started.set()
+        release.wait(5)
+        return b"stale"
+
+    writer.write(path, slow_content)
+    assert started.wait(5)
+
+    # Поток записи удерживает блокировку записи: удаление только отмечается и возвращается сразу
+    start = time.monotonic()
+    assert writer.delete(path) is True
+    assert time.monotonic() - start < 0.1
+    assert writer.read(path) is None
+
+    release.set()
+    _wait_written(writer, 1)
+    writer.flush()
+    # Завершившаяся запись не восстанавливает удаленный файл
+    assert not path.exists()
+    assert writer.read(path) is None
+    assert writer.delete(path) is False
+
+    # Запись после удаления снова создает файл
+    writer.write(path, "fresh")
+    writer.flush()
+    assert path.read_text(encoding="utf-8") == "fresh"
+    assert writer.delete(path) is True
+    writer.flush()
+    assert not path.exists()
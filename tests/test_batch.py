@@ -0,0 +1,65 @@
+"""Пакетное выполнение: прерывание задания, поврежденная строка журнала и продолжение"""
+import json
+import time
+from pathlib import Path
+
+ITEMS = 20
+
+
+def _requests_jsonl() -> bytes:
+    return "".join(
+        json.dumps({"messages": [{"role": "user", "content": f"batch item {index}"}]}) + "\n"
+        for index in range(ITEMS)
+    ).encode("utf-8")
+
+
+def test_batch_resume_after_interruption_and_torn_line(make_client, app_dir: Path):
+    # Первый запуск: задание выполняется по одному запросу и прерывается остановкой приложения
+    with make_client() as client:
+        response = client.post(
+            "/api/batch?stream=false&concurrency=1",
+            content=_requests_jsonl(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200
+        job_id = response.json()["id"]
+        deadline = time.monotonic() + 10
+        while client.get(f"/api/batch/{job_id}").json()["succeeded"] < 3:
+            assert time.monotonic() < deadline, "задание не выполняется"
+            time.sleep(0.01)
+
+    results_path = app_dir / "contexts" / "batches" / job_id / "results.ndjson"
+    lines = results_path.read_bytes().splitlines(keepends=True)
+    assert 3 <= len(lines) < ITEMS
+    # Сбой во время записи: последняя строка записана наполовину, без перевода строки
+    torn_index = json.loads(lines[-1])["index"]
+    results_path.write_bytes(b"".join(lines[:-1]) + lines[-1][: len(lines[-1]) // 2])
+
+    # Второй запуск: задание загружается с диска и продолжается
+    with make_client() as client:
+        summary = client.get(f"/api/batch/{job_id}").json()
+        assert summary["status"] == "interrupted"
+        assert summary["remaining"] == ITEMS - (len(lines) - 1)
+
+        with client.stream("POST", f"/api/batch/{job_id}/resume") as response:
+            assert response.status_code == 200
+            events = [json.loads(line) for line in response.iter_lines() if line]
+        resumed = {event["index"] for event in events if event["type"] == "result"}
+        assert torn_index in resumed
+        assert events[-1]["type"] == "summary"
+        assert events[-1]["status"] == "completed"
+        assert events[-1]["succeeded"] == ITEMS
+
+        response = client.get(f"/api/batch/{job_id}/results")
+        assert response.status_code == 200
+        results = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [result["index"] for result in results] == list(range(ITEMS))
+    assert all(result["status"] == "ok" for result in results)
+    assert all(result["response"]["choices"][0]["message"]["content"] for result in results)
+
+    # Журнал: каждая строка - целый JSON, каждый запрос записан ровно один раз
+    data = results_path.read_bytes()
+    assert data.endswith(b"\n")
+    logged = [json.loads(line)["index"] for line in data.splitlines()]
+    assert sorted(logged) == list(range(ITEMS))
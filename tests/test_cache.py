@@ -0,0 +1,70 @@
+"""Кэш ответов: ключ по содержимому запроса, попадания и промахи, дисковый уровень"""
+from app.models.chat import ChatCompletionRequest
+from app.services.canonical import request_key
+
+MESSAGES = [{"role": "user", "content": "cache check"}]
+
+
+def test_request_key_ignores_transport_fields_and_key_order():
+    base = request_key(ChatCompletionRequest(model="mock-model", temperature=0, messages=MESSAGES))
+    reordered = ChatCompletionRequest(**{"messages": MESSAGES, "temperature": 0, "model": "mock-model"})
+    streaming = ChatCompletionRequest(
+        model="mock-model", temperature=0, messages=MESSAGES, stream=True,
+        stream_options={"include_usage": True}, user="someone"
+    )
+    assert request_key(reordered) == base
+    assert request_key(streaming) == base
+
+    assert request_key(ChatCompletionRequest(model="mock-model", temperature=0.5, messages=MESSAGES)) != base
+    assert request_key(ChatCompletionRequest(model="other-model", temperature=0, messages=MESSAGES)) != base
+    other_messages = [{"role": "user", "content": "cache check!"}]
+    assert request_key(ChatCompletionRequest(model="mock-model", temperature=0, messages=other_messages)) != base
+
+
+def _post(client, **body):
+    response = client.post("/v1/chat/completions", json={"messages": MESSAGES, **body})
+    assert response.status_code == 200
+    return response.json(), client.get("/api/current/stats").json()
+
+
+def test_cache_hits_and_misses(make_client, update_config, mock_provider):
+    update_config(cache={"enabled": True, "disk": True})
+    requests = mock_provider.app.state.stats
+
+    with make_client() as client:
+        before = requests["requests"]
+        first, stats = _post(client, temperature=0)
+        assert stats["cache_hit"] is False
+        assert requests["requests"] == before + 1
+
+        # Явная модель совпадает с моделью по умолчанию - тот же ключ
+        second, stats = _post(client, temperature=0, model="mock-model")
+        assert stats["cache_hit"] is True
+        assert stats["attempts"] == 0
+        assert second["choices"] == first["choices"]
+        assert requests["requests"] == before + 1
+
+        # Streaming запрос воспроизводится из записи обычного ответа
+        with client.stream("POST", "/v1/chat/completions", json={"messages": MESSAGES, "temperature": 0, "stream": True}) as response:
+            events = [line for line in response.iter_lines() if line.startswith("data:")]
+        assert events[-1] == "data: [DONE]"
+        assert requests["requests"] == before + 1
+
+        # Другое содержимое - промах; температура выше max_temperature - кэш не используется
+        _, stats = _post(client, temperature=0, messages=[{"role": "user", "content": "another"}])
+        assert stats["cache_hit"] is False
+        _, stats = _post(client, temperature=0.7)
+        assert stats["cache_hit"] is None
+        assert requests["requests"] == before + 3
+
+        cache = client.get("/api/stats/cache").json()
+        assert cache["hits"] == 2
+        assert cache["misses"] == 2
+        assert cache["stores"] == 2
+
+    # После перезапуска запись находится в дисковом уровне
+    with make_client() as client:
+        _, stats = _post(client, temperature=0)
+        assert stats["cache_hit"] is True
+        assert client.get("/api/stats/cache").json()["disk_hits"] == 1
+    assert requests["requests"] == before + 3
@@ -0,0 +1,87 @@
+"""Стабильная форма запроса к провайдеру: тот же смысл, одинаковые байты"""
+import copy
+import json
+
+from app.services.canonical import shape_request_data
+from app.utils import fastjson
+
+
+def _tool(name: str, properties: dict) -> dict:
+    return {
+        "type": "function",
+        "function": {
+            "parameters": {"type": "object", "properties": properties, "required": list(properties)},
+            "name": name,
+            "description": f"{name} tool",
+        },
+    }
+
+
+def _request() -> dict:
+    return {
+        "model": "mock-model",
+        "messages": [
+            {"role": "system", "content": "  System prompt\r\nwith CRLF  \n"},
+            {"role": "user", "content": "find it"},
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "search", "arguments": '{"query": "x",  "limit": 5}'},
+                }],
+            },
+            {"role": "tool", "tool_call_id": "call_1", "content": "result"},
+        ],
+        "tools": [
+            _tool("search", {"query": {"type": "string"}, "limit": {"type": "integer"}}),
+            _tool("fetch", {"url": {"type": "string"}, "headers": {"type": "object"}}),
+        ],
+    }
+
+
+def _tools_by_name(data: dict) -> dict:
+    return {tool["function"]["name"]: tool for tool in data["tools"]}
+
+
+def test_shaped_request_is_equivalent_to_original():
+    original = _request()
+    shaped = shape_request_data(copy.deepcopy(original))
+
+    # Сообщения (системный промпт, аргументы tool_calls) передаются побайтно без изменений
+    assert fastjson.dumps(shaped["messages"]) == fastjson.dumps(original["messages"])
+    assert {key: value for key, value in shaped.items() if key != "tools"} == {
+        key: value for key, value in original.items() if key != "tools"
+    }
+
+    # Инструменты: тот же набор с теми же описаниями, изменен только порядок
+    assert _tools_by_name(shaped) == _tools_by_name(original)
+    assert [tool["function"]["name"] for tool in shaped["tools"]] == ["fetch", "search"]
+    for name, tool in _tools_by_name(shaped).items():
+        original_tool = _tools_by_name(original)[name]
+        properties = tool["function"]["parameters"]["properties"]
+        original_properties = original_tool["function"]["parameters"]["properties"]
+        assert list(properties) == list(original_properties)
+        assert tool["function"]["parameters"]["required"] == original_tool["function"]["parameters"]["required"]
+        assert list(tool["function"]) == sorted(original_tool["function"])
+
+
+def test_reordered_tools_produce_identical_bytes():
+    first = _request()
+    second = _request()
+    second["tools"] = [
+        {key: tool[key] for key in reversed(list(tool))} for tool in reversed(second["tools"])
+    ]
+    for tool in second["tools"]:
+        tool["function"] = {key: tool["function"][key] for key in reversed(list(tool["function"]))}
+    assert fastjson.dumps(first) != fastjson.dumps(second)
+
+    assert fastjson.dumps(shape_request_data(first)) == fastjson.dumps(shape_request_data(second))
+
+
+def test_shaping_without_tools_changes_nothing():
+    request = _request()
+    del request["tools"]
+    original = json.dumps(request)
+    assert json.dumps(shape_request_data(request)) == original
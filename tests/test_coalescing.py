@@ -0,0 +1,133 @@
+"""Объединение одинаковых одновременных запросов (single-flight) и общий streaming поток"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.coalescing import SingleFlight, StreamFanout
+
+MESSAGES = [{"role": "user", "content": "coalescing check"}]
+
+
+def test_single_flight_runs_one_call_per_key():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def call(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        results = await asyncio.gather(
+            *[flight.run("a", lambda: call("a")) for _ in range(4)],
+            flight.run("b", lambda: call("b")),
+        )
+        assert calls == ["a", "b"]
+        assert results == [("a", False), ("a", True), ("a", True), ("a", True), ("b", False)]
+        assert flight.shared == 3 and flight.in_flight == 0
+
+        # Отмена одного ожидающего не прерывает вызов для остальных
+        first = asyncio.create_task(flight.run("c", lambda: call("c")))
+        second = asyncio.create_task(flight.run("c", lambda: call("c")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == ("c", True)
+
+        # Ошибка вызова получают все ожидающие; следующий запрос выполняется заново
+        async def fail():
+            calls.append("error")
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        outcomes = await asyncio.gather(flight.run("d", fail), flight.run("d", fail), return_exceptions=True)
+        assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+        assert await flight.run("d", lambda: call("d")) == ("d", False)
+        assert calls == ["a", "b", "c", "error", "d"]
+
+    asyncio.run(scenario())
+
+
+class _Source:
+    """Бесконечный исходный поток провайдера"""
+    headers_time = 0.0
+    completed = False
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+
+    async def __aiter__(self):
+        while True:
+            await asyncio.sleep(0.01)
+            yield b""
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_fanout_closes_when_last_subscriber_leaves():
+    async def scenario():
+        source = _Source()
+
+        async def open_source():
+            return source
+
+        fanout = StreamFanout(open_source)
+        dropped = []
+        fanout.add_finish_callback(lambda: dropped.append(fanout))
+        first = await fanout.subscribe(0.0, lambda *args: None, False, False)
+        second = await fanout.subscribe(0.0, lambda *args: None, False, True)
+        await asyncio.sleep(0.02)
+
+        await first.aclose()
+        assert not fanout.closed and not dropped
+        await second.aclose()
+        # Поток закрыт и удален сразу, не дожидаясь остановки чтения
+        assert fanout.closed and dropped == [fanout]
+        assert await fanout.subscribe(0.0, lambda *args: None, False, True) is None
+
+        await asyncio.sleep(0.02)
+        assert source.closed
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def slow_provider(mock_provider, monkeypatch):
+    """Mock провайдер с задержкой ответа 0.3 с: одновременные запросы успевают объединиться"""
+    monkeypatch.setattr(mock_provider.settings, "_latency", ["fixed", 0.3])
+    return mock_provider
+
+
+def test_identical_concurrent_requests_reach_provider_once(make_client, slow_provider):
+    stats = slow_provider.app.state.stats
+
+    def post(body):
+        return client.post("/v1/chat/completions", json=body)
+
+    def stream(body):
+        with client.stream("POST", "/v1/chat/completions", json={**body, "stream": True}) as response:
+            return [line for line in response.iter_lines() if line.startswith("data:")]
+
+    with make_client() as client, ThreadPoolExecutor(max_workers=4) as pool:
+        body = {"messages": MESSAGES, "temperature": 0}
+        before = stats["requests"]
+        responses = list(pool.map(post, [body] * 4))
+        assert [response.status_code for response in responses] == [200] * 4
+        assert len({response.json()["choices"][0]["message"]["content"] for response in responses}) == 1
+        assert stats["requests"] == before + 1
+
+        streams = list(pool.map(stream, [body] * 4))
+        assert all(events == streams[0] and events[-1] == "data: [DONE]" for events in streams)
+        assert stats["requests"] == before + 2
+
+        # Недетерминированные запросы не объединяются
+        list(pool.map(post, [{"messages": MESSAGES, "temperature": 1.0}] * 2))
+        assert stats["requests"] == before + 4
+
+        coalescing = client.get("/api/stats/coalescing").json()
+    assert coalescing["coalesced_requests"] == 3
+    assert coalescing["coalesced_streams"] == 3
+    assert coalescing["in_flight_requests"] == 0
+    assert coalescing["in_flight_streams"] == 0
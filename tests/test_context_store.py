@@ -0,0 +1,113 @@
+"""SQLite хранилище контекстов: запись только измененного хвоста, итоги и повторное открытие"""
+import json
+from pathlib import Path
+
+import pytest
+
+from app.models.message import Message
+from app.storage.context_store import SQLiteContextStorage
+
+
+def _messages(count: int, prefix: str = "message") -> list:
+    roles = ("user", "assistant")
+    return [Message(role=roles[index % 2], content=f"{prefix} {index} " + "word " * index) for index in range(count)]
+
+
+@pytest.fixture
+def storage(tmp_path: Path):
+    storage = SQLiteContextStorage(tmp_path / "contexts")
+    yield storage
+    storage.close()
+
+
+def _changes(storage: SQLiteContextStorage, save) -> int:
+    """Количество строк базы, измененных при сохранении"""
+    before = storage._conn.total_changes
+    save()
+    return storage._conn.total_changes - before
+
+
+def _assert_totals_match(context: dict):
+    stats = context["message_stats"]
+    totals = context["totals"]
+    assert totals["messages"] == len(context["messages"])
+    for key in ("tokens", "words", "characters"):
+        assert totals[key] == sum(message[key] for message in stats)
+
+
+def test_save_writes_only_changed_tail(storage):
+    messages = _messages(10)
+    # Новый контекст: вставка и обновление итогов строки индекса, 10 сообщений
+    assert _changes(storage, lambda: storage.save_context("dialog", messages)) == 2 + 10
+
+    # Добавлено сообщение: одна новая строка и обновление индекса
+    messages.append(Message(role="user", content="appended"))
+    assert _changes(storage, lambda: storage.save_context("dialog", messages)) == 2
+    # Без изменений: только индекс
+    assert _changes(storage, lambda: storage.save_context("dialog", messages)) == 1
+
+    # Изменено сообщение 8: удаляются и записываются заново позиции 8-10
+    messages[8] = Message(role="user", content="edited")
+    assert _changes(storage, lambda: storage.save_context("dialog", messages)) == 3 + 3 + 1
+
+    # Диалог сокращен: удаляются последние сообщения
+    del messages[5:]
+    assert _changes(storage, lambda: storage.save_context("dialog", messages)) == 6 + 1
+
+    context = storage.get_context("dialog")
+    assert [Message(**message) for message in context["messages"]] == messages
+    _assert_totals_match(context)
+    info = storage.list_context_info()[0]
+    assert info["message_count"] == 5
+    assert info["size_bytes"] == sum(len(m.model_dump_json(exclude_none=True).encode("utf-8")) for m in messages)
+
+
+def test_contexts_survive_reopen(tmp_path: Path):
+    directory = tmp_path / "contexts"
+    storage = SQLiteContextStorage(directory)
+    storage.save_context("first", _messages(3))
+    storage.save_context("second", _messages(4, "other"))
+    assert storage.rename_context("second", "renamed")
+    assert not storage.rename_context("first", "renamed")
+    expected = storage.get_context("renamed")
+    storage.close()
+
+    storage = SQLiteContextStorage(directory)
+    try:
+        assert storage.list_contexts() == ["first", "renamed"]
+        assert storage.get_context("renamed") == expected
+        _assert_totals_match(expected)
+        # Продолжение диалога после перезапуска дописывает только новое сообщение
+        messages = [Message(**message) for message in expected["messages"]] + [Message(role="user", content="next")]
+        assert _changes(storage, lambda: storage.save_context("renamed", messages)) == 2
+        assert storage.delete_context("first")
+        assert storage.get_context("first") is None
+    finally:
+        storage.close()
+
+
+def test_json_import_copies_files_once(tmp_path: Path):
+    directory = tmp_path / "contexts"
+    directory.mkdir()
+    source = directory / "legacy.json"
+    source.write_text(json.dumps({"name": "legacy", "messages": [{"role": "user", "content": "hi"}]}), encoding="utf-8")
+    (directory / "current_context.json").write_text(json.dumps({"messages": []}), encoding="utf-8")
+
+    # Без import_json файлы не импортируются
+    storage = SQLiteContextStorage(directory)
+    assert storage.list_contexts() == []
+    storage.close()
+
+    storage = SQLiteContextStorage(directory, import_json=True)
+    assert storage.list_contexts() == ["legacy"]
+    assert storage.get_context("legacy")["messages"] == [{"role": "user", "content": "hi"}]
+    assert source.exists()
+    storage.delete_context("legacy")
+    storage.close()
+
+    # Импорт выполняется один раз для базы: удаленный контекст не возвращается
+    storage = SQLiteContextStorage(directory, import_json=True)
+    try:
+        assert storage.list_contexts() == []
+    finally:
+        storage.close()
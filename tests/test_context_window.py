@@ -0,0 +1,120 @@
+"""Бюджет токенов контекста: удаление старых сообщений и замена их кратким содержанием"""
+import asyncio
+
+from app.models.chat import ChatCompletionMessage, ChatCompletionRequest
+from app.models.config import ContextWindowConfig
+from app.services.context_window import SUMMARY_HEADER, ContextWindowManager
+from app.utils.text_stats import text_counts
+
+
+def _dialog(turns: int) -> list:
+    messages = [{"role": "system", "content": "You are a test assistant."}]
+    for index in range(turns):
+        messages.append({"role": "user", "content": f"question {index} " + "lorem ipsum " * 20})
+        messages.append({"role": "assistant", "content": f"answer {index} " + "dolor sit amet " * 20})
+    return messages
+
+
+def _with_tool_call(messages: list) -> list:
+    """Вставить после системного сообщения вызов инструмента с двумя результатами"""
+    call = {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {"id": "call_1", "type": "function", "function": {"name": "search", "arguments": '{"q": "a"}'}},
+            {"id": "call_2", "type": "function", "function": {"name": "search", "arguments": '{"q": "b"}'}},
+        ],
+    }
+    results = [{"role": "tool", "tool_call_id": f"call_{index}", "content": "found " * 30} for index in (1, 2)]
+    return messages[:1] + [call, *results] + messages[1:]
+
+
+def _request(messages: list) -> ChatCompletionRequest:
+    return ChatCompletionRequest(messages=messages)
+
+
+def _tokens(request: ChatCompletionRequest) -> int:
+    return sum(text_counts.message(message).tokens for message in request.messages)
+
+
+def test_context_within_budget_is_unchanged():
+    request = _request(_dialog(3))
+    manager = ContextWindowManager(ContextWindowConfig(max_context_tokens=_tokens(request)))
+    original = list(request.messages)
+    fit = asyncio.run(manager.fit(request))
+    assert fit.trimmed == 0 and fit.estimated_tokens == _tokens(request)
+    assert request.messages == original
+    assert manager.trimmed_requests == 0
+
+
+def test_drop_oldest_keeps_system_recent_and_tool_groups():
+    request = _request(_with_tool_call(_dialog(6)))
+    original = list(request.messages)
+    budget = _tokens(request) // 2
+    manager = ContextWindowManager(ContextWindowConfig(max_context_tokens=budget, min_recent_messages=2))
+    fit = asyncio.run(manager.fit(request))
+
+    messages = request.messages
+    assert fit.estimated_tokens == _tokens(request) <= budget
+    assert messages[0] == original[0]
+    # Удалены самые старые сообщения: оставшиеся - непрерывный хвост диалога
+    assert messages[1:] == original[len(original) - len(messages) + 1:]
+    assert fit.trimmed == len(original) - len(messages)
+    # Вызов инструментов удален вместе с результатами: они не остаются без вызова
+    assert fit.trimmed >= 3
+    assert messages[1].role != "tool"
+    assert messages[-2:] == original[-2:]
+
+    # Удаляется минимум: с последним удаленным сообщением бюджет был бы превышен
+    restored = [messages[0], original[len(original) - len(messages)], *messages[1:]]
+    assert _tokens(_request(restored)) > budget
+
+
+def test_summarize_replaces_old_messages_and_reuses_summary():
+    calls = []
+
+    async def summarizer(prompt, max_tokens):
+        calls.append(prompt[-1].content)
+        return f"summary {len(calls)}"
+
+    messages = _dialog(10)
+    config = ContextWindowConfig(max_context_tokens=_tokens(_request(messages)) // 2, policy="summarize", summary_max_tokens=32)
+    manager = ContextWindowManager(config, summarizer)
+
+    request = _request(messages)
+    fit = asyncio.run(manager.fit(request))
+    assert fit.summarized and fit.trimmed > 0
+    assert fit.estimated_tokens <= config.max_context_tokens
+    # Удаленная часть не помещается в один запрос краткого содержания: следующая порция
+    # передается вместе с предыдущим кратким содержанием
+    created = len(calls)
+    assert created >= 1 and "question 0" in calls[0]
+    assert all(call.startswith(f"{SUMMARY_HEADER}\nsummary {index}") for index, call in enumerate(calls[1:], 1))
+    assert request.messages[0].content == messages[0]["content"]
+    assert request.messages[1] == ChatCompletionMessage(role="system", content=f"{SUMMARY_HEADER}\nsummary {created}")
+    assert [message.content for message in request.messages[2:]] == [m["content"] for m in messages[fit.trimmed + 1:]]
+
+    # Следующий запрос диалога использует то же краткое содержание без нового запроса к модели
+    longer = _request(messages + [{"role": "user", "content": "one more question"}])
+    fit = asyncio.run(manager.fit(longer))
+    assert fit.summarized
+    assert len(calls) == created
+    assert longer.messages[1].content.endswith(f"summary {created}")
+    assert manager.stats()["summary_cache_hits"] == 1
+    assert manager.stats()["summaries_created"] == created
+
+
+def test_summarize_failure_falls_back_to_drop_oldest():
+    async def summarizer(prompt, max_tokens):
+        raise RuntimeError("provider unavailable")
+
+    messages = _dialog(10)
+    budget = _tokens(_request(messages)) // 2
+    manager = ContextWindowManager(ContextWindowConfig(max_context_tokens=budget, policy="summarize"), summarizer)
+    request = _request(messages)
+    fit = asyncio.run(manager.fit(request))
+
+    assert not fit.summarized and fit.trimmed > 0
+    assert all(SUMMARY_HEADER not in (message.content or "") for message in request.messages)
+    assert _tokens(request) <= budget
+    assert manager.summary_failures == 1
@@ -0,0 +1,70 @@
+"""Ограничение одновременных запросов: FIFO очередь, переполнение и время ожидания"""
+import asyncio
+
+import pytest
+
+from app.models.config import ConcurrencyConfig
+from app.services.limiter import AdmissionController, AdmissionRejectedError
+
+
+def test_full_queue_rejects_and_slot_passes_in_fifo_order():
+    async def scenario():
+        controller = AdmissionController(ConcurrencyConfig(max_concurrency=1, max_queue=2, queue_timeout=5))
+        assert await controller.acquire() == 0.0
+
+        admitted = []
+
+        async def wait(name: str):
+            await controller.acquire()
+            admitted.append(name)
+
+        first = asyncio.create_task(wait("first"))
+        second = asyncio.create_task(wait("second"))
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 2
+
+        # Очередь заполнена: запрос отклоняется сразу, с оценкой Retry-After не меньше секунды
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            await controller.acquire()
+        assert rejected.value.retry_after >= 1
+
+        controller.release(hold_time=0.01)
+        await first
+        # Новый запрос не обгоняет очередь, пока в ней есть ожидающие
+        late = asyncio.create_task(wait("late"))
+        await asyncio.sleep(0)
+        controller.release()
+        await second
+        controller.release()
+        await late
+
+        assert admitted == ["first", "second", "late"]
+        assert controller.active == 1
+        stats = controller.stats()
+        assert stats["rejected_queue_full"] == 1
+        assert stats["total_admitted"] == 4
+        assert stats["total_queued"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_and_frees_place():
+    async def scenario():
+        controller = AdmissionController(ConcurrencyConfig(max_concurrency=1, max_queue=1, queue_timeout=0.05))
+        await controller.acquire()
+        with pytest.raises(AdmissionRejectedError):
+            await controller.acquire()
+        assert controller.queue_depth == 0
+        assert controller.stats()["rejected_timeout"] == 1
+
+        # Отмененный ожидающий тоже освобождает место в очереди
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.queue_depth == 0
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""Метрики /metrics после запросов через mock провайдер"""
+import re
+from typing import Dict, Tuple
+
+PREFIX = "llm_debugger_"
+UPSTREAM = {"provider": "model_config", "model": "mock-model"}
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+Samples = Dict[Tuple[str, frozenset], float]
+
+
+def _samples(text: str) -> Samples:
+    """Значения метрик формата Prometheus: (имя, метки) -> значение"""
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[(name, frozenset(_LABEL.findall(labels or "")))] = float(value)
+    return samples
+
+
+def _value(samples: Samples, name: str, **labels: str) -> float:
+    return samples.get((PREFIX + name, frozenset(labels.items())), 0.0)
+
+
+def _delta(before: Samples, after: Samples, name: str, **labels: str) -> float:
+    return _value(after, name, **labels) - _value(before, name, **labels)
+
+
+def test_metrics_after_requests_through_mock_provider(make_client, mock_provider, monkeypatch):
+    message = {"messages": [{"role": "user", "content": "metrics check"}]}
+    with make_client() as client:
+        before = _samples(client.get("/metrics").text)
+
+        assert client.post("/v1/chat/completions", json=message).status_code == 200
+        with client.stream("POST", "/v1/chat/completions", json={**message, "stream": True}) as response:
+            assert response.status_code == 200
+            chunks = [line for line in response.iter_lines() if line.startswith("data:")]
+        assert chunks[-1] == "data: [DONE]"
+        assert client.post("/v1/chat/completions", json={"messages": "invalid"}).status_code == 422
+        monkeypatch.setattr(mock_provider.settings, "error_rate", 1.0)
+        error_status = client.post("/v1/chat/completions", json=message).status_code
+        assert error_status >= 500
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        after = _samples(response.text)
+
+    route = {"method": "POST", "route": "/v1/chat/completions"}
+    assert _delta(before, after, "http_requests_total", **route, status="200") == 2
+    assert _delta(before, after, "http_requests_total", **route, status="422") == 1
+    assert _delta(before, after, "http_requests_total", **route, status=str(error_status)) == 1
+
+    for stream in ("false", "true"):
+        labels = {**UPSTREAM, "stream": stream}
+        assert _delta(before, after, "upstream_latency_seconds_count", **labels) == 1
+        assert _delta(before, after, "upstream_time_to_first_token_seconds_count", **labels) == 1
+        assert _delta(before, after, "upstream_total_time_seconds_count", **labels) == 1
+        # Mock провайдер отвечает (отправляет первый чанк) через 50 мс: корзина 10 мс пуста, корзина 1 с - нет
+        assert _delta(before, after, "upstream_time_to_first_token_seconds_bucket", **labels, le="0.01") == 0
+        assert _delta(before, after, "upstream_time_to_first_token_seconds_bucket", **labels, le="1") == 1
+        assert _delta(before, after, "upstream_time_to_first_token_seconds_sum", **labels) >= 0.05
+
+    # Mock провайдер возвращает 5 слов (completion_tokens=5) в каждом ответе
+    assert _delta(before, after, "tokens_total", **UPSTREAM, direction="out") == 10
+    assert _delta(before, after, "tokens_total", **UPSTREAM, direction="in") > 0
+    assert _delta(before, after, "responses_total", **UPSTREAM, source="upstream") == 2
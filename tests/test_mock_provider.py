@@ -0,0 +1,85 @@
+"""Mock провайдер и вспомогательные функции нагрузочного бенчмарка"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+from benchmarks.mock_provider import MockSettings, parse_distribution
+
+# bench_load импортирует mock_provider из своей папки (запуск как скрипта)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+import bench_load  # noqa: E402
+
+
+def test_parse_distribution():
+    assert parse_distribution("fixed:0.05") == ["fixed", 0.05]
+    assert parse_distribution("lognormal:0.1:0.5") == ["lognormal", 0.1, 0.5]
+    for spec in ("fixed", "fixed:1:2", "uniform:1", "gamma:1:2", "normal:-1:1", "uniform:a:b"):
+        with pytest.raises(ValueError):
+            parse_distribution(spec)
+
+
+def test_plan_is_deterministic_per_message():
+    settings = MockSettings(latency="uniform:0.01:0.5", chunk_interval="uniform:0:0.01", chunks=8, error_rate=0.5)
+    plan = settings.plan("hello", stream=True)
+    assert settings.plan("hello", stream=True) == plan
+    assert MockSettings(**settings.as_dict()).plan("hello", stream=True) == plan
+    assert MockSettings(**{**settings.as_dict(), "seed": 1}).plan("hello", stream=True) != plan
+
+    plans = [settings.plan(f"message {index}", stream=True) for index in range(200)]
+    assert 0 < sum(1 for p in plans if p["error"]) < 200
+    for p in plans:
+        assert len(p["intervals"]) == (0 if p["error"] else 7)
+        assert p["duration"] == pytest.approx(p["latency"] + sum(p["intervals"]))
+    assert MockSettings(error_rate=1.0).plan("any", stream=False)["error"] == 503
+
+
+def test_mock_responses(mock_provider):
+    url = f"{mock_provider.url}/chat/completions"
+    messages = [{"role": "user", "content": "mock check"}]
+    with httpx.Client(timeout=10) as client:
+        data = client.post(url, json={"messages": messages}).json()
+        assert data["choices"][0]["message"]["content"].count(" ") == mock_provider.settings.chunks - 1
+        assert data["usage"]["completion_tokens"] == mock_provider.settings.chunks
+
+        with client.stream("POST", url, json={"messages": messages, "stream": True,
+                                              "stream_options": {"include_usage": True}}) as response:
+            events = [line[len("data: "):] for line in response.iter_lines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(event) for event in events[:-1]]
+        content = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks if chunk["choices"])
+        assert content == data["choices"][0]["message"]["content"]
+        assert chunks[-1]["choices"] == [] and chunks[-1]["usage"] == data["usage"]
+
+
+def test_mock_error_has_retry_after(mock_provider, monkeypatch):
+    monkeypatch.setattr(mock_provider.settings, "error_rate", 1.0)
+    response = httpx.post(f"{mock_provider.url}/chat/completions", json={"messages": []}, timeout=10)
+    assert response.status_code == mock_provider.settings.error_status
+    assert response.headers["Retry-After"] == "0"
+
+
+def test_percentiles_and_metric():
+    assert bench_load.percentiles([]) is None
+    result = bench_load.percentiles([index / 1000 for index in range(1, 101)])
+    assert result == {"p50": 50.0, "p90": 90.0, "p99": 99.0, "mean": 50.5, "max": 100.0}
+    assert bench_load.metric({"overhead_ms": result}, "overhead_ms.p99") == 99.0
+    assert bench_load.metric({"overhead_ms": result}, "overhead_ms.p75") is None
+    assert bench_load.metric({}, "rps") is None
+
+
+def test_run_load_measures_overhead_against_plan(mock_provider):
+    settings = mock_provider.settings
+    load = asyncio.run(bench_load.run_load(
+        f"{mock_provider.url}/chat/completions", settings, concurrency=4, requests=12, stream=True, prefix="test"
+    ))
+    summary = bench_load.summarize(load)
+    assert summary["requests"] == summary["ok"] == 12
+    assert summary["errors"] == {}
+    # Задержка не меньше времени ответа провайдера по плану
+    assert all(result["overhead"] >= 0 and result["ttft_overhead"] >= 0 for result in load["results"])
+    assert summary["overhead_ms"]["p50"] <= summary["latency_ms"]["p50"]
+    assert summary["ttft_overhead_ms"]["max"] >= summary["ttft_overhead_ms"]["p50"]
@@ -0,0 +1,92 @@
+"""Квоты RPM/TPM: пополнение ведра токенов, ожидание и уточнение расхода"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.config import RateLimitConfig
+from app.services import rate_limit
+from app.services.limiter import AdmissionRejectedError
+from app.services.rate_limit import RateLimiter, TokenBucket
+
+
+class Clock:
+    """Управляемое время time.monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_bucket_refills_at_quota_rate_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.advance(30)
+    assert bucket.wait_time(30) == 0.0
+    assert bucket.wait_time(40) == pytest.approx(10.0)
+
+    # Пополнение не превышает емкость
+    clock.advance(600)
+    assert bucket.wait_time(60) == 0.0
+    assert bucket.tokens == 60
+
+    # Баланс может уйти в минус: следующий запрос ждет восстановления долга
+    bucket.consume(90)
+    assert bucket.wait_time(1) == pytest.approx(31.0)
+    # Запрос больше емкости ждет только полного ведра
+    assert bucket.wait_time(1000) == pytest.approx(90.0)
+
+
+def test_configure_keeps_balance_within_new_capacity(clock):
+    bucket = TokenBucket(per_minute=120)
+    bucket.consume(20)
+    bucket.configure(60)
+    assert bucket.tokens == 60
+    assert bucket.rate == pytest.approx(1.0)
+    bucket.consume(60)
+    clock.advance(5)
+    bucket.configure(600)
+    assert bucket.tokens == pytest.approx(5.0)
+
+
+def test_limiter_rejects_long_waits_and_settles_by_usage(clock):
+    async def scenario():
+        limiter = RateLimiter(RateLimitConfig(tokens_per_minute=600, max_wait=5))
+        reservation = await limiter.acquire(500)
+        assert limiter.tpm.tokens == pytest.approx(100)
+
+        # Фактический расход меньше оценки - разница возвращается в ведро
+        reservation.settle(200)
+        assert limiter.tpm.tokens == pytest.approx(400)
+        assert limiter.estimate_error == -300
+
+        # До пополнения 600 токенов ждать (600 - 400) / 10 = 20s > max_wait
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            await limiter.acquire(600)
+        assert rejected.value.retry_after == pytest.approx(20.0)
+
+        # 429 от провайдера обнуляет баланс
+        limiter.on_rate_limited()
+        assert limiter.tpm.tokens == 0
+        clock.advance(2)
+        assert limiter.tpm.wait_time(20) == 0.0
+        stats = limiter.stats()
+        assert stats["total_requests"] == 1
+        assert stats["total_rejected"] == 1
+
+    asyncio.run(scenario())
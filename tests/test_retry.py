@@ -0,0 +1,94 @@
+"""Повторы запросов: задержка по Retry-After и учет попыток при переключении провайдера"""
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from app.models.config import ModelConfig, RetryConfig
+from app.services.llm_client import LLMClient, parse_retry_after
+from benchmarks.mock_provider import MockProvider, MockSettings
+
+
+def _status_error(status_code: int, retry_after: str = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://provider/v1/chat/completions")
+    headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status_code}", request=request, response=response)
+
+
+def _client(**retry) -> LLMClient:
+    return LLMClient(ModelConfig(
+        provider_url="http://provider/v1",
+        api_key="test",
+        model_name="mock-model",
+        temperature=0.7,
+        max_tokens=64,
+        system_prompt_path="prompts/system.txt",
+        retry=RetryConfig(**retry),
+    ))
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_retry_delay_uses_retry_after_over_backoff():
+    client = _client(backoff_base=0.1, backoff_multiplier=2.0, jitter="none", retry_after_max=5.0)
+
+    # Без заголовка - экспоненциальная задержка
+    assert client._retry_delay(1, _status_error(503)) == pytest.approx(0.1)
+    assert client._retry_delay(3, _status_error(503)) == pytest.approx(0.4)
+    # Retry-After больше расчетной задержки - ждем сколько просит провайдер, но не дольше retry_after_max
+    assert client._retry_delay(1, _status_error(429, "2")) == pytest.approx(2.0)
+    assert client._retry_delay(1, _status_error(429, "120")) == pytest.approx(5.0)
+    # Retry-After меньше расчетной задержки не сокращает ее
+    assert client._retry_delay(3, _status_error(429, "0")) == pytest.approx(0.4)
+
+    ignoring = _client(backoff_base=0.1, jitter="none", respect_retry_after=False)
+    assert ignoring._retry_delay(1, _status_error(429, "2")) == pytest.approx(0.1)
+
+
+@pytest.fixture
+def failing_provider():
+    """Провайдер, отвечающий 503 (Retry-After: 0) на каждый запрос"""
+    provider = MockProvider(MockSettings(latency="fixed:0.01", error_rate=1.0, error_status=503)).start()
+    yield provider
+    provider.stop()
+
+
+def test_failover_counts_attempts_of_all_providers(make_client, update_config, mock_provider, failing_provider):
+    update_config(
+        "model_config.yaml",
+        provider_url=failing_provider.url,
+        retry={"max_attempts": 3, "backoff_base": 0.01, "jitter": "none"},
+    )
+    update_config(
+        "backup.yaml",
+        provider_url=mock_provider.url,
+        api_key="test",
+        model_name="mock-model",
+        temperature=0.7,
+        max_tokens=64,
+        system_prompt_path="prompts/system.txt",
+    )
+    update_config(providers=[{"model_config_path": "config/backup.yaml", "name": "backup"}])
+
+    with make_client() as client:
+        response = client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "failover"}]})
+        assert response.status_code == 200
+        stats = client.get("/api/current/stats").json()
+        upstreams = {upstream["name"]: upstream for upstream in client.get("/api/stats/upstreams").json()["upstreams"]}
+
+    # Три попытки основного провайдера и одна успешная у резервного
+    assert failing_provider.app.state.stats["requests"] == 3
+    assert stats["provider"] == "backup"
+    assert stats["attempts"] == 4
+    assert upstreams["model_config"]["total_failures"] == 1
+    assert upstreams["backup"]["total_failures"] == 0
@@ -0,0 +1,81 @@
+"""Выбор провайдера в пуле: задержка, нагрузка, здоровье и имена моделей"""
+import time
+
+from app.models.config import ModelConfig, ProviderConfig, RoutingConfig
+from app.services.llm_client import LLMClient
+from app.services.router import ProviderRouter, Upstream
+
+
+def _upstream(name: str, model: str = "mock-model", weight: float = 1.0, aliases=()) -> Upstream:
+    client = LLMClient(ModelConfig(
+        provider_url=f"http://{name}/v1",
+        api_key="test",
+        model_name=model,
+        temperature=0.7,
+        max_tokens=64,
+        system_prompt_path="prompts/system.txt",
+    ))
+    return Upstream(
+        ProviderConfig(model_config_path=f"config/{name}.yaml", name=name, weight=weight, aliases=list(aliases)),
+        client
+    )
+
+
+def test_latency_strategy_prefers_fast_and_unmeasured_upstreams():
+    primary, fast, fresh = _upstream("primary"), _upstream("fast"), _upstream("fresh")
+    router = ProviderRouter([primary, fast])
+    routing = router.routing
+    primary.record_success(0.5, routing.ewma_alpha)
+    fast.record_success(0.1, routing.ewma_alpha)
+    assert router.select(None) is fast
+
+    # Провайдер без истории задержек выбирается первым, чтобы собрать статистику
+    router = ProviderRouter([primary, fast, fresh])
+    assert router.select(None) is fresh
+
+    # Нагрузка увеличивает оценку: быстрый, но занятый провайдер уступает
+    router = ProviderRouter([primary, fast])
+    fast.client.in_flight = 9
+    assert router.select(None) is primary
+
+
+def test_least_inflight_strategy_uses_weight():
+    light, heavy = _upstream("light"), _upstream("heavy", weight=4.0)
+    router = ProviderRouter([light, heavy], RoutingConfig(strategy="least_inflight"))
+    light.client.in_flight = 1
+    heavy.client.in_flight = 3
+    # (3 + 1) / 4 < (1 + 1) / 1
+    assert router.select(None) is heavy
+
+
+def test_failed_upstream_is_excluded_for_cooldown():
+    primary, backup = _upstream("primary"), _upstream("backup")
+    routing = RoutingConfig(failure_threshold=2, cooldown=60)
+    router = ProviderRouter([primary, backup], routing)
+    primary.record_failure(routing)
+    assert primary.is_healthy(time.monotonic()) and router.select(None) is primary
+    primary.record_failure(routing)
+    assert router.select(None) is backup
+    assert router.select(None, exclude=[backup]) is primary
+
+    # Все исключены - выбирается провайдер, который раньше вернется в строй
+    backup.record_failure(routing)
+    backup.record_failure(routing)
+    assert router.select(None) is primary
+
+    primary.record_success(0.1, routing.ewma_alpha)
+    assert primary.is_healthy(time.monotonic())
+    assert router.select(None) is primary
+
+
+def test_candidates_by_model_name_provider_name_and_alias():
+    primary = _upstream("primary")
+    other = _upstream("other", model="other-model", aliases=["mock-model-alias"])
+    router = ProviderRouter([primary, other])
+
+    assert router.candidates(None) == [primary]
+    assert router.candidates("mock-model") == [primary]
+    assert router.candidates("other") == [other]
+    assert router.candidates("mock-model-alias") == [other]
+    # Неизвестная модель передается основному провайдеру
+    assert router.candidates("unknown") == [primary]
@@ -0,0 +1,94 @@
+"""История статистики: окна, перцентили гистограмм, журнал и восстановление после перезапуска"""
+from pathlib import Path
+
+import pytest
+
+from app.models.metadata import ResponseMetadata
+from app.storage.histogram import LogHistogram
+from app.storage.timeseries import StatsHistory, parse_window
+
+
+@pytest.mark.parametrize("window, seconds", [
+    ("30s", 30), ("15m", 900), ("1h", 3600), (" 2H ", 7200), ("7d", 7 * 86400), ("90", 90), ("1.5m", 90),
+])
+def test_parse_window(window, seconds):
+    assert parse_window(window) == seconds
+
+
+@pytest.mark.parametrize("window", ["", "h", "abc", "10w", "0.5s", "0", "-1h", "infh", "nan"])
+def test_parse_window_rejects_invalid(window):
+    with pytest.raises(ValueError):
+        parse_window(window)
+
+
+def test_histogram_percentiles_and_merge():
+    first, second, combined = LogHistogram(), LogHistogram(), LogHistogram()
+    for value in range(1, 1001):
+        (first if value % 2 else second).add(value / 1000)
+        combined.add(value / 1000)
+    first.merge(second)
+
+    assert first.buckets == combined.buckets
+    assert first.summary() == pytest.approx(combined.summary())
+    assert first.count == 1000
+    assert first.percentile(50) == pytest.approx(0.5, rel=0.01)
+    assert first.percentile(99) == pytest.approx(0.99, rel=0.01)
+    assert first.percentile(100) == 1.0
+    assert LogHistogram().summary() == {"count": 0}
+
+
+def _metadata(latency: float, model: str = "mock-model", **flags) -> ResponseMetadata:
+    return ResponseMetadata(
+        timestamp="2026-01-01T00:00:00", latency=latency, time_to_first_token=latency, total_time=latency * 2,
+        response_tokens=10, response_words=8, response_characters=40, avg_token_length=4.0, avg_word_tokens=1.25,
+        context_tokens=100, inference_speed=50.0, provider="primary", model=model, **flags
+    )
+
+
+def test_history_summary_and_reload(tmp_path: Path):
+    directory = tmp_path / "timeseries"
+    history = StatsHistory(directory)
+    for index in range(1, 11):
+        history.record(_metadata(index / 10))
+    history.record(_metadata(0.2, model="other-model"))
+    # Ответ из кэша учитывается в счетчиках, но не в задержках провайдера
+    history.record(_metadata(0.0001, cache_hit=True))
+    history.close()
+
+    summary = history.summary(parse_window("1h"))
+    assert summary["resolution_seconds"] == 60
+    assert summary["total"]["requests"] == 12
+    assert summary["total"]["cache_hits"] == 1
+    assert [(group["model"], group["requests"]) for group in summary["groups"]] == [
+        ("mock-model", 11), ("other-model", 1)
+    ]
+    only = history.summary(3600, model="mock-model")
+    assert only["total"]["latency"]["count"] == 10
+    assert only["total"]["latency"]["min"] == pytest.approx(0.1)
+    assert only["total"]["latency"]["p50"] == pytest.approx(0.5, rel=0.01)
+    # Окно длиннее 3 часов считается по часовым агрегатам
+    assert history.summary(parse_window("1d"))["resolution_seconds"] == 3600
+
+    # Оборванная при сбое запись отбрасывается, остальные восстанавливаются из журнала
+    journal = next(directory.glob("*.bin"))
+    journal.write_bytes(journal.read_bytes() + b"\x01\x02\x03")
+    restored = StatsHistory(directory)
+    try:
+        assert restored.records == 12
+        reloaded = restored.summary(3600)
+        assert [group["requests"] for group in reloaded["groups"]] == [11, 1]
+        # Значения в журнале хранятся как float32
+        for name in ("latency", "time_to_first_token", "total_time", "context_tokens"):
+            assert reloaded["total"][name] == pytest.approx(summary["total"][name], rel=1e-6)
+        assert not journal.read_bytes().endswith(b"\x01\x02\x03")
+    finally:
+        restored.close()
+
+
+def test_summary_endpoint_validates_window(make_client):
+    with make_client() as client:
+        assert client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "history"}]}).status_code == 200
+        response = client.get("/api/stats/summary", params={"window": "15m"})
+        assert response.status_code == 200
+        assert response.json()["total"]["requests"] == 1
+        assert client.get("/api/stats/summary", params={"window": "soon"}).status_code == 400